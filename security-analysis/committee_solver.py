@@ -0,0 +1,56 @@
+import numpy as np
+from scipy.special import betainc
+
+# Numeric solver for the committee-size threshold of plot_eqn.py.
+#
+# For N clients with adversarial stake s, the probability that more than k/2 of
+# them collude is
+#
+#   P(k) = sum_{i = k/2 + 1}^{N} C(N, i) * s^i * (1 - s)^(N - i)
+#        = I_s(k/2 + 1, N - k/2)
+#
+# where I_s is the regularized incomplete beta function, which also extends the
+# sum to non-integer lower limits. P(k) decreases in k, so p < P(k) holds
+# exactly for k below the root of log P(k) = log p, which is found by
+# bisection on [0, 2 * (N - 1)] for a whole grid of (p, s, N) at once.
+
+# Bisection steps; enough to shrink the bracket to machine precision.
+BISECTION_STEPS = 64
+
+def logCollusionProb(committee_sizes, stake_values, num_clients):
+
+	lower_limit = np.divide(committee_sizes, 2.0) + 1
+
+	with np.errstate(divide='ignore'):
+		return np.log(betainc(lower_limit, num_clients - lower_limit + 1, stake_values))
+
+# Returns the committee-size threshold k for every broadcast (p, s, N): the
+# inequality p < P(k) holds for committee sizes below k. Returns 0 where it
+# holds for no size and inf where it holds for every size up to 2 * (N - 1).
+
+def solveCommitteeThreshold(prob_values, stake_values, num_clients):
+
+	prob_values, stake_values, num_clients = np.broadcast_arrays(
+		*[np.asarray(arg, dtype=float) for arg in (prob_values, stake_values, num_clients)])
+
+	log_probs = np.log(prob_values)
+
+	lo = np.zeros(prob_values.shape)
+	hi = 2 * (num_clients - 1)
+
+	holds_lo = logCollusionProb(lo, stake_values, num_clients) > log_probs
+	holds_hi = logCollusionProb(hi, stake_values, num_clients) > log_probs
+
+	for _ in range(BISECTION_STEPS):
+
+		mid = (lo + hi) / 2
+		holds = logCollusionProb(mid, stake_values, num_clients) > log_probs
+
+		lo = np.where(holds, mid, lo)
+		hi = np.where(holds, hi, mid)
+
+	thresholds = (lo + hi) / 2
+	thresholds = np.where(holds_lo, thresholds, 0.0)
+	thresholds = np.where(holds_hi, np.inf, thresholds)
+
+	return thresholds
@@ -0,0 +1,108 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for committee_solver.py against direct binomial tail sums."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import math
+import os
+import sys
+
+from absl.testing import absltest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import committee_solver  # pylint: disable=g-import-not-at-top
+
+_PROB_VALUES = [0.001, 0.05, 0.3, 0.7]
+_STAKE_VALUES = [0.05, 0.2, 0.45, 0.6]
+_NUM_CLIENTS = [3, 8, 25, 60]
+
+
+def _binomial_tail(committee_size, stake_value, num_clients):
+  """P(more than committee_size / 2 of num_clients clients collude)."""
+  return sum(
+      math.comb(num_clients, i) * stake_value**i *
+      (1 - stake_value)**(num_clients - i)
+      for i in range(committee_size // 2 + 1, num_clients + 1))
+
+
+class CommitteeSolverTest(absltest.TestCase):
+
+  def test_log_collusion_prob(self):
+    # For even committee sizes the lower limit of the sum is an integer.
+    for num_clients in _NUM_CLIENTS:
+      for stake_value in _STAKE_VALUES:
+        for committee_size in range(0, 2 * num_clients - 1, 2):
+          expected = _binomial_tail(committee_size, stake_value, num_clients)
+          prob = np.exp(committee_solver.logCollusionProb(
+              committee_size, stake_value, num_clients))
+          self.assertAlmostEqual(prob / expected, 1.0, places=9)
+
+  def test_threshold_matches_binomial_tail(self):
+    prob_values, stake_values, num_clients = np.meshgrid(
+        _PROB_VALUES, _STAKE_VALUES, _NUM_CLIENTS, indexing='ij')
+    thresholds = committee_solver.solveCommitteeThreshold(
+        prob_values, stake_values, num_clients)
+    self.assertEqual(thresholds.shape, prob_values.shape)
+
+    for index in np.ndindex(thresholds.shape):
+      prob_value = prob_values[index]
+      stake_value = stake_values[index]
+      n = int(num_clients[index])
+      holds = [
+          prob_value < _binomial_tail(committee_size, stake_value, n)
+          for committee_size in range(0, 2 * n - 1, 2)
+      ]
+      # The inequality holds exactly for the sizes below the threshold.
+      self.assertEqual(
+          holds,
+          [committee_size < thresholds[index]
+           for committee_size in range(0, 2 * n - 1, 2)],
+          msg='p={}, s={}, N={}'.format(prob_value, stake_value, n))
+
+  def test_threshold_is_a_root(self):
+    thresholds = committee_solver.solveCommitteeThreshold(0.5, 0.1, 100)
+    self.assertTrue(np.isfinite(thresholds) and thresholds > 0)
+    self.assertAlmostEqual(
+        committee_solver.logCollusionProb(thresholds, 0.1, 100), np.log(0.5),
+        places=9)
+
+  def test_no_committee_size(self):
+    # P(0) = 1 - (1 - s)^N is the largest collusion probability; no committee
+    # size reaches a probability at or above it.
+    largest = _binomial_tail(0, 0.2, 8)
+    np.testing.assert_array_equal(
+        committee_solver.solveCommitteeThreshold(
+            [largest * 1.01, 0.999, 1.0], 0.2, 8), [0.0, 0.0, 0.0])
+
+  def test_every_committee_size(self):
+    # P(2 * (N - 1)) = s^N is the smallest; probabilities below it hold for
+    # every committee size in the bracket.
+    smallest = _binomial_tail(2 * (3 - 1), 0.9, 3)
+    self.assertAlmostEqual(smallest, 0.9**3)
+    np.testing.assert_array_equal(
+        committee_solver.solveCommitteeThreshold(
+            [smallest * 0.99, 0.5], 0.9, 3), [np.inf, np.inf])
+    # Just above it, the threshold is finite.
+    self.assertTrue(np.isfinite(
+        committee_solver.solveCommitteeThreshold(smallest * 1.01, 0.9, 3)))
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -1,4 +1,6 @@
-from sympy import *
+import sys
+
+from committee_solver import solveCommitteeThreshold
 
 # committee size is k
 # stake is s
@@ -8,11 +10,19 @@ p = 0.5
 s = 0.1
 N = 100
 
-k, i = symbols("k, i")
+# p < P(k) for every committee size k below the threshold.
+print(solveCommitteeThreshold(p, s, N))
+
+# Symbolic cross-check (pass --sympy); slow, and may not return for large N.
+
+if '--sympy' in sys.argv:
+
+	from sympy import *
 
-# eq = p - summation(((binomial(N, i) )* (s**i) * (1-s)**(N-i)) , (i, ((k/2)+1), N))
+	k, i = symbols("k, i")
 
-eq = p < summation((binomial(N,i)* (s**i) * (1-s)**(N-i)) , (i, ((k/2)+1), N))
+	# eq = p - summation(((binomial(N, i) )* (s**i) * (1-s)**(N-i)) , (i, ((k/2)+1), N))
 
+	eq = p < summation((binomial(N,i)* (s**i) * (1-s)**(N-i)) , (i, ((k/2)+1), N))
 
-print(str(solve(eq, [k])))
\ No newline at end of file
+	print(str(solve(eq, [k])))
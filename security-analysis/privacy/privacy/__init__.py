@@ -13,32 +13,70 @@
 # limitations under the License.
 """TensorFlow Privacy library."""
 
+import importlib
 import sys
 
-# pylint: disable=g-import-not-at-top
-
-if hasattr(sys, 'skip_tf_privacy_import'):  # Useful for standalone scripts.
-  pass
-else:
-  from privacy.analysis.privacy_ledger import DummyLedger
-  from privacy.analysis.privacy_ledger import GaussianSumQueryEntry
-  from privacy.analysis.privacy_ledger import PrivacyLedger
-  from privacy.analysis.privacy_ledger import QueryWithLedger
-  from privacy.analysis.privacy_ledger import SampleEntry
-
-  from privacy.dp_query.dp_query import DPQuery
-  from privacy.dp_query.gaussian_query import GaussianAverageQuery
-  from privacy.dp_query.gaussian_query import GaussianSumQuery
-  from privacy.dp_query.nested_query import NestedQuery
-  from privacy.dp_query.no_privacy_query import NoPrivacyAverageQuery
-  from privacy.dp_query.no_privacy_query import NoPrivacySumQuery
-  from privacy.dp_query.normalized_query import NormalizedQuery
-  from privacy.dp_query.quantile_adaptive_clip_sum_query import QuantileAdaptiveClipSumQuery
-  from privacy.dp_query.quantile_adaptive_clip_sum_query import QuantileAdaptiveClipAverageQuery
-
-  from privacy.optimizers.dp_optimizer import DPAdagradGaussianOptimizer
-  from privacy.optimizers.dp_optimizer import DPAdagradOptimizer
-  from privacy.optimizers.dp_optimizer import DPAdamGaussianOptimizer
-  from privacy.optimizers.dp_optimizer import DPAdamOptimizer
-  from privacy.optimizers.dp_optimizer import DPGradientDescentGaussianOptimizer
-  from privacy.optimizers.dp_optimizer import DPGradientDescentOptimizer
+# The public symbols, by the module that defines them. They depend on
+# TensorFlow, so on Python 3.7+ they are imported on first attribute access
+# (PEP 562) and importing a pure-NumPy module such as
+# privacy.analysis.rdp_accountant does not load TensorFlow.
+_LAZY_SYMBOLS = {
+    'privacy.analysis.privacy_ledger': [
+        'DummyLedger',
+        'GaussianSumQueryEntry',
+        'HostPrivacyLedger',
+        'PrivacyLedger',
+        'QueryWithLedger',
+        'SampleEntry',
+        'StreamingRdpLedger',
+    ],
+    'privacy.dp_query.dp_query': ['DPQuery'],
+    'privacy.dp_query.gaussian_query': [
+        'GaussianAverageQuery',
+        'GaussianSumQuery',
+    ],
+    'privacy.dp_query.nested_query': ['NestedQuery'],
+    'privacy.dp_query.no_privacy_query': [
+        'NoPrivacyAverageQuery',
+        'NoPrivacySumQuery',
+    ],
+    'privacy.dp_query.normalized_query': ['NormalizedQuery'],
+    'privacy.dp_query.quantile_adaptive_clip_sum_query': [
+        'QuantileAdaptiveClipSumQuery',
+        'QuantileAdaptiveClipAverageQuery',
+    ],
+    'privacy.optimizers.dp_optimizer': [
+        'DPAdagradGaussianOptimizer',
+        'DPAdagradOptimizer',
+        'DPAdamGaussianOptimizer',
+        'DPAdamOptimizer',
+        'DPGradientDescentGaussianOptimizer',
+        'DPGradientDescentOptimizer',
+    ],
+}
+
+_SYMBOL_MODULES = {symbol: module
+                   for module, symbols in _LAZY_SYMBOLS.items()
+                   for symbol in symbols}
+
+__all__ = sorted(_SYMBOL_MODULES)
+
+
+def __getattr__(name):
+  if name not in _SYMBOL_MODULES:
+    raise AttributeError('module {!r} has no attribute {!r}'.format(
+        __name__, name))
+  value = getattr(importlib.import_module(_SYMBOL_MODULES[name]), name)
+  globals()[name] = value
+  return value
+
+
+def __dir__():
+  return sorted(set(globals()) | set(__all__))
+
+
+# Python versions without module __getattr__ import everything eagerly, unless
+# a standalone script opted out with sys.skip_tf_privacy_import.
+if sys.version_info < (3, 7) and not hasattr(sys, 'skip_tf_privacy_import'):
+  for _name in __all__:
+    __getattr__(_name)
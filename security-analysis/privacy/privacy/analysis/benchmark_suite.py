@@ -0,0 +1,238 @@
+# Copyright 2019 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Benchmark suite for the accountant, committee and VRF analysis hot paths.
+
+Every benchmark is a name and a setup function that returns the callable to
+time; parameterized benchmarks are registered once per parameter value, as
+'<name>/<parameter>'. Each callable is run enough times per repeat to take
+about 0.2 s (once if a single call takes longer), and the per-call min and
+median over at least three repeats are reported.
+
+Results are written as JSON with --output. With --baseline, the min time of
+every benchmark is compared against its stored min and the script fails if one
+of them got slower than --tolerance times its baseline.
+
+Example:
+  python benchmark_suite.py --output=results.json \\
+    --baseline=benchmark_baseline.json
+  python benchmark_suite.py --filter='compute_rdp|committee'
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import json
+import os
+import platform
+import re
+import sys
+import timeit
+
+from absl import app
+from absl import flags
+import numpy as np
+
+# Opting out of loading all sibling packages and their dependencies.
+sys.skip_tf_privacy_import = True
+
+_ANALYSIS_DIR = os.path.dirname(os.path.abspath(__file__))
+_SECURITY_ANALYSIS_DIR = os.path.dirname(os.path.dirname(os.path.dirname(
+    _ANALYSIS_DIR)))
+# The PAL scripts import their siblings as top-level modules.
+sys.path[:0] = [_ANALYSIS_DIR, _SECURITY_ANALYSIS_DIR]
+
+import committee_analysis  # pylint: disable=g-import-not-at-top
+import compute_fed_biscotti_sgd_privacy
+from privacy.analysis import rdp_accountant
+import stake_map
+import vrf_security
+
+FLAGS = flags.FLAGS
+
+# A single repeat of a slow benchmark is one call, so its time is as noisy as
+# that call; the baseline comparison needs the minimum of several.
+_MIN_REPEATS = 3
+
+flags.DEFINE_string('output', None, 'File to write the JSON results to')
+flags.DEFINE_string('baseline', None, 'JSON results to compare against')
+flags.DEFINE_float('tolerance', 1.25,
+                   'Slowdown (ratio of min times) that counts as a regression')
+flags.DEFINE_string('filter', None,
+                    'Only run benchmarks whose name matches this regex')
+flags.DEFINE_integer('repeats', 5, 'Number of timing repeats',
+                     lower_bound=_MIN_REPEATS)
+
+# Field names of privacy_ledger.SampleEntry and GaussianSumQueryEntry, which
+# compute_rdp_from_ledger reads; privacy_ledger itself needs TensorFlow.
+SampleEntry = collections.namedtuple(
+    'SampleEntry', ['population_size', 'selection_probability', 'queries'])
+GaussianSumQueryEntry = collections.namedtuple(
+    'GaussianSumQueryEntry', ['l2_norm_bound', 'noise_stddev'])
+
+DEFAULT_ORDERS = ([1.25, 1.5, 1.75, 2., 2.25, 2.5, 3., 3.5, 4., 4.5] +
+                  list(range(5, 64)) + [128, 256, 512])
+
+ORDER_RANGES = {
+    'default': DEFAULT_ORDERS,
+    'int_64': list(range(2, 65)),
+    'int_1024': list(range(2, 1025)),
+    'fractional': list(np.linspace(1.1, 10.9, 50)),
+}
+
+_BENCHMARKS = collections.OrderedDict()
+
+
+def benchmark(name, params=None):
+  """Registers a setup function, once per parameter value if params is set."""
+  def register(setup):
+    if params is None:
+      _BENCHMARKS[name] = setup
+    else:
+      for param in params:
+        _BENCHMARKS['{}/{}'.format(name, param)] = (
+            lambda param=param: setup(param))
+    return setup
+  return register
+
+
+@benchmark('compute_rdp', params=sorted(ORDER_RANGES))
+def _compute_rdp(order_range):
+  orders = ORDER_RANGES[order_range]
+  return lambda: rdp_accountant.compute_rdp(0.01, 1.1, 10000, orders)
+
+
+@benchmark('get_privacy_spent', params=['delta', 'eps'])
+def _get_privacy_spent(target):
+  rdp = rdp_accountant.compute_rdp(0.01, 1.1, 10000, DEFAULT_ORDERS)
+  if target == 'delta':
+    return lambda: rdp_accountant.get_privacy_spent(DEFAULT_ORDERS, rdp,
+                                                    target_delta=1e-5)
+  return lambda: rdp_accountant.get_privacy_spent(DEFAULT_ORDERS, rdp,
+                                                  target_eps=1.)
+
+
+@benchmark('compute_rdp_from_ledger', params=[100, 1000, 100000, 1000000])
+def _compute_rdp_from_ledger(num_samples):
+  # A training run that changes its noise a few times, two queries per sample.
+  # Samples with the same noise share their query list, which keeps the
+  # million-sample ledger small.
+  rng = np.random.RandomState(0)
+  queries = {
+      stddev: [GaussianSumQueryEntry(1., stddev),
+               GaussianSumQueryEntry(2., 2. * stddev)]
+      for stddev in [1., 1.1, 1.2, 1.5]}
+  noise_stddevs = rng.choice(sorted(queries), size=num_samples)
+  ledger = [SampleEntry(60000, 0.01, queries[stddev])
+            for stddev in noise_stddevs]
+  return lambda: rdp_accountant.compute_rdp_from_ledger(ledger, DEFAULT_ORDERS)
+
+
+@benchmark('get_prob_observe_majority', params=[100, 10000, 1000000])
+def _get_prob_observe_majority(total_nodes):
+  committee_sizes = np.arange(1, 101)
+  return lambda: committee_analysis.get_prob_observe_majority(
+      0.3, committee_sizes, total_nodes)
+
+
+@benchmark('binomialWithoutReplacement', params=[100, 1000])
+def _binomial_without_replacement(num_clients):
+  stake_values = [0.05, 0.1, 0.15, 0.2, 0.3, 0.35, 0.4, 0.45]
+  prob_thresholds = [0.001, 0.01, 0.05]
+  return lambda: vrf_security.binomialWithoutReplacement(
+      num_clients, stake_values, prob_thresholds)
+
+
+@benchmark('select_committee', params=[10000, 1000000])
+def _select_committee(num_nodes):
+  stakes = stake_map.pareto_stakes(num_nodes, 1.5, seed=0)
+  sampler = compute_fed_biscotti_sgd_privacy.get_committee_sampler(stakes,
+                                                                   seed=0)
+  return lambda: compute_fed_biscotti_sgd_privacy.select_committee(
+      sampler, 30, num_committees=100)
+
+
+@benchmark('get_privacy_adversarial_guarantee', params=[100, 1000])
+def _get_privacy_adversarial_guarantee(steps):
+  return lambda: (compute_fed_biscotti_sgd_privacy
+                  .get_privacy_adversarial_guarantee(
+                      1000, 100., steps, 1., 1e-6, 30, 300.))
+
+
+def run_benchmarks(name_filter=None, repeats=5):
+  """Runs the registered benchmarks.
+
+  Args:
+    name_filter: Optional regex; only matching benchmarks are run.
+    repeats: The number of timing repeats; raised to _MIN_REPEATS if smaller.
+
+  Returns:
+    A dict from benchmark name to a dict with the per-call 'min' and 'median'
+    seconds, and the 'number' of calls per repeat.
+  """
+  results = collections.OrderedDict()
+  for name, setup in _BENCHMARKS.items():
+    if name_filter and not re.search(name_filter, name):
+      continue
+    timer = timeit.Timer(setup())
+    elapsed = timer.timeit(number=1)
+    number = max(1, int(0.2 / max(elapsed, 1e-9)))
+    times = np.array(timer.repeat(repeat=max(repeats, _MIN_REPEATS),
+                                  number=number)) / number
+    results[name] = {'min': float(np.min(times)),
+                     'median': float(np.median(times)),
+                     'number': number}
+    print('{:45s} {:12.6f} ms (median {:.6f} ms)'.format(
+        name, 1e3 * results[name]['min'], 1e3 * results[name]['median']))
+  return results
+
+
+def compare_to_baseline(results, baseline, tolerance):
+  """Returns the names of benchmarks slower than tolerance times baseline."""
+  regressions = []
+  for name, result in results.items():
+    if name not in baseline:
+      continue
+    ratio = result['min'] / baseline[name]['min']
+    marker = ' REGRESSION' if ratio > tolerance else ''
+    print('{:45s} {:6.2f}x baseline{}'.format(name, ratio, marker))
+    if ratio > tolerance:
+      regressions.append(name)
+  return regressions
+
+
+def main(argv):
+  del argv  # argv is not used.
+
+  results = run_benchmarks(FLAGS.filter, FLAGS.repeats)
+
+  if FLAGS.output:
+    with open(FLAGS.output, 'w') as output:
+      json.dump({'python': platform.python_version(),
+                 'numpy': np.__version__,
+                 'machine': platform.machine(),
+                 'benchmarks': results}, output, indent=2)
+
+  if FLAGS.baseline:
+    with open(FLAGS.baseline) as baseline_file:
+      baseline = json.load(baseline_file)['benchmarks']
+    regressions = compare_to_baseline(results, baseline, FLAGS.tolerance)
+    if regressions:
+      sys.exit('Regressions: {}'.format(', '.join(regressions)))
+
+
+if __name__ == '__main__':
+  app.run(main)
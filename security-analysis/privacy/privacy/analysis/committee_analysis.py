@@ -1,88 +1,160 @@
-import math
-from scipy.special import comb
+import numpy as np
+from scipy import special
+from scipy import stats
 import sys
 
+# Committees of committee_size are drawn uniformly without replacement from
+# total_nodes nodes, prob_adversary * total_nodes of which are adversarial. The
+# number of adversaries on a committee is therefore hypergeometric. All
+# probabilities are evaluated in log space and broadcast over array-valued
+# arguments.
 
-def get_prob_observe_one_round(prob_adversary, committee_size, total_nodes):
 
-	# print(prob_adversary)
-	prob_no_adversary_chosen = 1
+# Number of pmf terms added per vectorized step when summing a tail.
+TAIL_CHUNK = 64
+
+# A tail sum stops once its newest terms are below exp(-TAIL_CUTOFF) of it.
+TAIL_CUTOFF = 40.0
+
+
+def get_log_hypergeom_sf(x, total_nodes, num_adversary, committee_size):
+
+	# log P(X > x) for X ~ Hypergeom(total_nodes, num_adversary, committee_size).
+	# scipy.stats.hypergeom.logsf sums the whole support element by element,
+	# which is slow for large committees. Here every tail is summed from x away
+	# from the mode, where the pmf decays geometrically, in vectorized chunks
+	# that stop once the remaining terms are negligible. Tails that contain the
+	# mode are computed from the (small) opposite tail as log(1 - cdf).
+	x, total_nodes, num_adversary, committee_size = np.broadcast_arrays(
+		*[np.asarray(arg, dtype=float) for arg in (x, total_nodes, num_adversary, committee_size)])
+	shape = x.shape
+	x, total_nodes, num_adversary, committee_size = [arg.ravel() for arg in (x, total_nodes, num_adversary, committee_size)]
+
+	min_support = np.maximum(0, committee_size - (total_nodes - num_adversary))
+	max_support = np.minimum(num_adversary, committee_size)
+	mode = np.floor((committee_size + 1) * (num_adversary + 1) / (total_nodes + 2))
+
+	upper = x + 1 > mode
+	start = np.where(upper, x + 1, x)
+	direction = np.where(upper, 1, -1)
+	limit = np.where(upper, max_support, min_support)
+
+	log_tail = np.full(x.shape, -np.inf)
+	active = np.flatnonzero(np.where(upper, start <= limit, start >= limit))
+	offset = 0
+
+	while active.size:
+
+		j = start[active, None] + direction[active, None] * (offset + np.arange(TAIL_CHUNK))
+		in_support = np.where(upper[active, None], j <= limit[active, None], j >= limit[active, None])
+
+		with np.errstate(invalid='ignore', divide='ignore'):
+			log_pmf = stats.hypergeom.logpmf(j, total_nodes[active, None], num_adversary[active, None], committee_size[active, None])
+		log_pmf = np.where(in_support, log_pmf, -np.inf)
+
+		log_tail[active] = np.logaddexp(log_tail[active], special.logsumexp(log_pmf, axis=1))
+
+		finished = ~in_support[:, -1] | (log_pmf[:, -1] < log_tail[active] - TAIL_CUTOFF)
+		active = active[~finished]
+		offset += TAIL_CHUNK
+
+	with np.errstate(divide='ignore'):
+		log_sf = np.where(upper, log_tail, np.log(-np.expm1(np.minimum(log_tail, 0))))
+
+	return log_sf.reshape(shape)
 
-	prob_no_adversary = 1 - prob_adversary
-	prob_one_client_chosen = 1.0/total_nodes
 
-	for x in xrange(0,committee_size):
+def get_num_adversary_nodes(prob_adversary, total_nodes):
 
-		prob_no_adversary_chosen = prob_no_adversary_chosen * prob_no_adversary
+	return np.rint(np.multiply(prob_adversary, total_nodes))
 
-		prob_no_adversary = prob_no_adversary - prob_one_client_chosen
 
-	prob_adversary_chosen = 1 - prob_no_adversary_chosen
+def get_majority_size(committee_size):
 
-	return prob_adversary_chosen
+	return np.ceil(np.divide(committee_size, 2.0))
+
+
+def get_log_prob_observe_one_round(prob_adversary, committee_size, total_nodes):
+
+	num_adversary = get_num_adversary_nodes(prob_adversary, total_nodes)
+
+	log_prob_no_adversary_chosen = stats.hypergeom.logpmf(0, total_nodes, num_adversary, committee_size)
+
+	# logpmf can round slightly above 0 when there are no adversaries, which
+	# would make the log below NaN instead of -inf.
+	log_prob_no_adversary_chosen = np.minimum(log_prob_no_adversary_chosen, 0.)
+
+	# log(1 - P(no adversary)), accurate when P(no adversary) is close to 1.
+	with np.errstate(divide='ignore'):
+		return np.log(-np.expm1(log_prob_no_adversary_chosen))
+
+
+def get_prob_observe_one_round(prob_adversary, committee_size, total_nodes):
+
+	return np.exp(get_log_prob_observe_one_round(prob_adversary, committee_size, total_nodes))
 
 
 def get_num_rounds_adversary_observes(num_rounds, prob_adversary, committee_size, total_nodes):
 
 	prob_adversary_chosen = get_prob_observe_one_round(prob_adversary, committee_size, total_nodes)
 
-
-	return int(round(num_rounds*prob_adversary_chosen))
+	return _to_num_rounds(np.multiply(num_rounds, prob_adversary_chosen))
 
 def get_num_rounds_adversary_majority(num_rounds, num_adversary, committee_size, total_nodes):
 
-	prob_adversary = float(num_adversary)/total_nodes
+	prob_adversary = np.divide(num_adversary, total_nodes, dtype=float)
 
 	prob_adversary_majority = get_prob_observe_majority(prob_adversary, committee_size, total_nodes)
 
-	# print(prob_adversary_majority)
+	return _to_num_rounds(np.multiply(num_rounds, prob_adversary_majority))
 
-	return int(round(num_rounds*prob_adversary_majority))
+def _to_num_rounds(expected_rounds):
 
-def get_prob_observe_majority(prob_adversary, committee_size, total_nodes):
+	num_rounds = np.rint(expected_rounds).astype(int)
 
-	majority_nodes = int(math.ceil(committee_size/2.0))
-	
-	prob_select_client = 1/total_nodes
+	if num_rounds.ndim == 0:
+		return int(num_rounds)
 
-	prob_majority = 0
+	return num_rounds
 
-	for num_adversaries in xrange(majority_nodes,committee_size+1):
-		
-		prob_num_adversaries_committee= get_prob_num_adversary_committee(num_adversaries, committee_size, prob_adversary, prob_select_client)
+def get_log_prob_observe_majority(prob_adversary, committee_size, total_nodes):
 
-		prob_majority = prob_num_adversaries_committee + prob_majority
+	num_adversary = get_num_adversary_nodes(prob_adversary, total_nodes)
 
+	majority_nodes = get_majority_size(committee_size)
 
+	# P(X >= majority_nodes) = P(X > majority_nodes - 1)
+	return get_log_hypergeom_sf(majority_nodes - 1, total_nodes, num_adversary, committee_size)
 
-	return prob_majority
+def get_prob_observe_majority(prob_adversary, committee_size, total_nodes):
+
+	return np.exp(get_log_prob_observe_majority(prob_adversary, committee_size, total_nodes))
 
 def get_prob_num_adversary_committee(num_adversary, committee_size,prob_adversary, prob_select_client):
 
-	# print(get_prob_k_of_n_adversary(num_adversary, committee_size, prob_adversary, prob_select_client))
+	# Probability that exactly num_adversary members of the committee are adversarial.
+	total_nodes = np.rint(np.divide(1.0, prob_select_client))
 
-	committee_probability = comb(committee_size, num_adversary, exact=True) * get_prob_k_of_n_adversary(num_adversary, committee_size, prob_adversary, prob_select_client)
+	num_adversary_nodes = get_num_adversary_nodes(prob_adversary, total_nodes)
 
-	return committee_probability
+	return stats.hypergeom.pmf(num_adversary, total_nodes, num_adversary_nodes, committee_size)
 
 
 def get_prob_k_of_n_adversary(num_adversary, committee_size, prob_adversary, prob_select_client):
 
-	prob_k_adversary_chosen = 1
-	prob_no_adversary = 1 - prob_adversary
-	prob_adversary_1 = prob_adversary * 1
+	# Probability of one particular ordered draw in which the first num_adversary
+	# members are adversarial and the rest are not.
+	total_nodes = np.rint(np.divide(1.0, prob_select_client))
+
+	num_adversary_nodes = get_num_adversary_nodes(prob_adversary, total_nodes)
 
-	for idx in xrange(1,committee_size+1):
+	log_committee_probability = stats.hypergeom.logpmf(num_adversary, total_nodes, num_adversary_nodes, committee_size)
 
-		if idx <= num_adversary:
+	log_num_orderings = _log_comb(committee_size, num_adversary)
 
-			prob_k_adversary_chosen = prob_k_adversary_chosen * prob_adversary
-			prob_adversary_1 = prob_adversary_1 - prob_select_client
-					
-		else:
+	return np.exp(log_committee_probability - log_num_orderings)
 
-			prob_k_adversary_chosen = prob_k_adversary_chosen * prob_no_adversary
-			prob_no_adversary = prob_no_adversary - prob_select_client
 
+def _log_comb(n, k):
 
-	return prob_k_adversary_chosen
\ No newline at end of file
+	return special.gammaln(np.add(n, 1)) - special.gammaln(np.add(k, 1)) - special.gammaln(np.subtract(n, k) + 1)
@@ -0,0 +1,68 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for committee_analysis.py."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from absl.testing import absltest
+from absl.testing import parameterized
+import numpy as np
+from scipy import stats
+
+from privacy.analysis import committee_analysis
+
+
+class CommitteeAnalysisTest(parameterized.TestCase):
+
+  def test_no_adversary_never_observes(self):
+    # hypergeom.logpmf(0, 100, 0, 10) is slightly positive.
+    log_prob = committee_analysis.get_log_prob_observe_one_round(0., 10, 100)
+    self.assertEqual(log_prob, -np.inf)
+    self.assertEqual(
+        committee_analysis.get_prob_observe_one_round(0., 10, 100), 0.)
+    self.assertEqual(
+        committee_analysis.get_num_rounds_adversary_observes(
+            1000, 0., 10, 100), 0)
+    self.assertEqual(
+        committee_analysis.get_prob_observe_majority(0., 10, 100), 0.)
+
+  def test_prob_observe_one_round(self):
+    prob_adversary = np.array([0.01, 0.1, 0.5])
+    prob = committee_analysis.get_prob_observe_one_round(
+        prob_adversary, 10, 100)
+    expected = 1 - stats.hypergeom.pmf(0, 100, prob_adversary * 100, 10)
+    self.assertSequenceAlmostEqual(prob, expected)
+
+  @parameterized.named_parameters(
+      ('no_adversary', 0, 100, 0, 10),
+      ('lower_tail', 2, 100, 30, 10),
+      ('upper_tail', 8, 100, 30, 10),
+      ('past_support', 10, 100, 30, 10),
+      ('large', 260, 10000, 3000, 500))
+  def test_hypergeom_sf(self, x, total_nodes, num_adversary, committee_size):
+    log_sf = committee_analysis.get_log_hypergeom_sf(
+        x, total_nodes, num_adversary, committee_size)
+    expected = stats.hypergeom.logsf(x, total_nodes, num_adversary,
+                                     committee_size)
+    if np.isneginf(expected):
+      self.assertEqual(log_sf, -np.inf)
+    else:
+      self.assertAlmostEqual(log_sf, expected, delta=1e-9 * abs(expected))
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -0,0 +1,105 @@
+"""Stake-weighted committee sampling.
+
+A CommitteeSampler is built once from a stake map and then draws committees in
+which every seat goes to a node with probability proportional to its stake.
+Seats are drawn either with replacement (a node can hold several seats), by
+binary search of uniform draws in the cumulative stake distribution, or
+without replacement, via Gumbel top-k keys (equivalent to filling seats one by
+one among the nodes not chosen yet). Many committees can be drawn in one call.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+# Upper bound on the number of Gumbel keys materialized at once.
+_MAX_KEYS_PER_BATCH = 2**24
+
+
+class CommitteeSampler(object):
+  """Draws stake-weighted committees from a fixed stake map."""
+
+  def __init__(self, stake_map, seed=None):
+    """Initializes the CommitteeSampler.
+
+    Args:
+      stake_map: Either a dict mapping node ids to stakes, or a sequence of
+        stakes for nodes 0..len(stake_map) - 1.
+      seed: Seed (or np.random.Generator) for the draws.
+
+    Raises:
+      ValueError: If there is no node with positive stake, or a stake is
+        negative.
+    """
+    if isinstance(stake_map, dict):
+      self._nodes = np.array(list(stake_map.keys()))
+      stakes = np.array(list(stake_map.values()), dtype=float)
+    else:
+      stakes = np.asarray(stake_map, dtype=float)
+      self._nodes = None
+
+    if np.any(stakes < 0) or not np.any(stakes > 0):
+      raise ValueError('Stakes must be non-negative and not all zero.')
+
+    self._cum_prob = np.cumsum(stakes) / np.sum(stakes)
+    self._cum_prob[-1] = 1.0
+    with np.errstate(divide='ignore'):
+      self._log_stakes = np.log(stakes)
+    self._num_positive = int(np.count_nonzero(stakes))
+    self._rng = np.random.default_rng(seed)
+
+  @property
+  def num_nodes(self):
+    return len(self._cum_prob)
+
+  def sample(self, committee_size, num_committees=None, replace=True):
+    """Draws committees.
+
+    Args:
+      committee_size: The number of seats per committee.
+      num_committees: The number of committees, or None for a single one.
+      replace: Whether a node can hold several seats of one committee.
+
+    Returns:
+      The node ids of the committee, as an array of shape [committee_size], or
+      [num_committees, committee_size] if num_committees is given. Without
+      replacement, seats are in the order in which they were filled.
+
+    Raises:
+      ValueError: If a committee without replacement is larger than the
+        number of nodes with positive stake.
+    """
+    batch = 1 if num_committees is None else num_committees
+    if replace:
+      idx = self._sample_with_replacement(batch, committee_size)
+    else:
+      if committee_size > self._num_positive:
+        raise ValueError('Committee is larger than the number of nodes with '
+                         'positive stake.')
+      idx = self._sample_without_replacement(batch, committee_size)
+
+    committees = idx if self._nodes is None else self._nodes[idx]
+    return committees[0] if num_committees is None else committees
+
+  def _sample_with_replacement(self, batch, committee_size):
+    # Draws are in [0, 1). The first node whose cumulative probability exceeds
+    # the draw holds the seat, so nodes without stake (which do not raise the
+    # cumulative probability) are never seated, even for a draw of exactly 0.
+    draws = self._rng.random((batch, committee_size))
+    idx = np.searchsorted(self._cum_prob, draws, side='right')
+    return np.minimum(idx, self.num_nodes - 1)
+
+  def _sample_without_replacement(self, batch, committee_size):
+    committees = np.empty((batch, committee_size), dtype=np.intp)
+    rows_per_chunk = max(1, _MAX_KEYS_PER_BATCH // self.num_nodes)
+    for start in range(0, batch, rows_per_chunk):
+      rows = min(rows_per_chunk, batch - start)
+      keys = self._log_stakes + self._rng.gumbel(size=(rows, self.num_nodes))
+      top = np.argpartition(-keys, committee_size - 1,
+                            axis=1)[:, :committee_size]
+      top_keys = np.take_along_axis(keys, top, axis=1)
+      order = np.argsort(-top_keys, axis=1)
+      committees[start:start + rows] = np.take_along_axis(top, order, axis=1)
+    return committees
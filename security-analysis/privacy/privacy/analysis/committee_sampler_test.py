@@ -0,0 +1,99 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for committee_sampler.py."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from absl.testing import absltest
+from absl.testing import parameterized
+import numpy as np
+
+from privacy.analysis import committee_sampler
+
+
+class CommitteeSamplerTest(parameterized.TestCase):
+
+  def test_single_committee_uses_node_ids(self):
+    sampler = committee_sampler.CommitteeSampler({'a': 1., 'b': 2.}, seed=0)
+    committee = sampler.sample(5)
+    self.assertEqual(committee.shape, (5,))
+    self.assertTrue(set(committee) <= {'a', 'b'})
+
+  @parameterized.named_parameters(
+      ('with_replacement', True),
+      ('without_replacement', False))
+  def test_first_seat_proportional_to_stake(self, replace):
+    stakes = [1., 3., 0., 6.]
+    sampler = committee_sampler.CommitteeSampler(stakes, seed=1)
+    committees = sampler.sample(2, 100000, replace=replace)
+    self.assertEqual(committees.shape, (100000, 2))
+    freq = np.bincount(committees[:, 0], minlength=4) / 100000.
+    self.assertSequenceAlmostEqual(freq, [.1, .3, 0., .6], delta=0.01)
+
+  def test_without_replacement_has_distinct_seats(self):
+    sampler = committee_sampler.CommitteeSampler(np.ones(10), seed=2)
+    committees = sampler.sample(10, 100, replace=False)
+    self.assertTrue(np.all(np.sort(committees, axis=1) == np.arange(10)))
+
+  def test_without_replacement_second_seat(self):
+    # After node 1 (stake 3) takes the first seat, node 3 gets the second
+    # with probability 6 / 7.
+    sampler = committee_sampler.CommitteeSampler([1., 3., 0., 6.], seed=3)
+    committees = sampler.sample(2, 200000, replace=False)
+    second = committees[committees[:, 0] == 1, 1]
+    self.assertAlmostEqual(np.mean(second == 3), 6. / 7., delta=0.01)
+
+  @parameterized.named_parameters(
+      ('with_replacement', True),
+      ('without_replacement', False))
+  def test_seed_makes_committees_reproducible(self, replace):
+    stakes = [1., 3., 0., 6.]
+    first = committee_sampler.CommitteeSampler(stakes, seed=4)
+    second = committee_sampler.CommitteeSampler(
+        stakes, seed=np.random.default_rng(4))
+    self.assertTrue(np.array_equal(first.sample(2, 10, replace=replace),
+                                   second.sample(2, 10, replace=replace)))
+
+  def test_zero_stake_nodes_are_never_seated(self):
+    stakes = [0., 0., 1., 0., 3., 0.]
+    sampler = committee_sampler.CommitteeSampler(stakes, seed=5)
+    committees = sampler.sample(3, 10000)
+    self.assertTrue(np.all(np.isin(committees, [2, 4])))
+
+    # Draws on the cumulative probabilities themselves, including 0.
+    class BoundaryDraws(object):
+
+      def random(self, shape):
+        return np.resize([0., 0.25, 0.5], shape)
+
+    sampler._rng = BoundaryDraws()  # pylint: disable=protected-access
+    self.assertEqual(sampler.sample(3).tolist(), [2, 4, 4])
+
+  def test_invalid_stakes(self):
+    with self.assertRaises(ValueError):
+      committee_sampler.CommitteeSampler([0., 0.])
+    with self.assertRaises(ValueError):
+      committee_sampler.CommitteeSampler([1., -1.])
+
+  def test_committee_too_large(self):
+    sampler = committee_sampler.CommitteeSampler([1., 0., 1.])
+    with self.assertRaises(ValueError):
+      sampler.sample(3, replace=False)
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -0,0 +1,192 @@
+"""Monte Carlo simulation of adversarial committee selection.
+
+Simulates many rounds of committee selection and reports in how many rounds the
+adversary observes the committee (holds at least one seat) and in how many it
+holds a majority, with confidence intervals. Used to cross-check the analytic
+probabilities in committee_analysis.py.
+
+Every round draws an actual committee with committee_sampler and counts the
+seats held by the adversary, which controls the first num_adversary nodes. By
+default committees are drawn uniformly without replacement; with stakes and
+replace=True seats are drawn stake-weighted with replacement, as biscotti
+selects its committees. Work is split into independent Generator streams seeded
+through one SeedSequence, so results only depend on the seed and the number of
+workers.
+
+Example:
+  python committee_simulation.py --total_nodes=100 --num_adversary=30 \
+    --committee_size=10 --num_rounds=10000000 --num_workers=4
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import math
+import multiprocessing
+
+from absl import app
+from absl import flags
+import numpy as np
+from scipy import stats
+
+import committee_analysis
+import committee_sampler
+
+# Number of committee seats drawn per batch in one worker.
+BATCH_SEATS = 2**22
+
+SimulationResult = collections.namedtuple(  # pylint: disable=invalid-name
+	'SimulationResult', ['num_rounds', 'rounds_observed', 'rounds_majority',
+	                     'prob_observe', 'prob_observe_ci', 'prob_majority', 'prob_majority_ci'])
+
+
+def get_majority_size(committee_size):
+
+	# Same threshold as committee_analysis.get_prob_observe_majority.
+	return int(math.ceil(committee_size/2.0))
+
+
+def simulate_rounds(sampler, num_rounds, num_adversary, committee_size, replace=False):
+
+	majority_nodes = get_majority_size(committee_size)
+
+	rounds_observed = 0
+	rounds_majority = 0
+
+	batch_rounds = max(1, BATCH_SEATS // committee_size)
+
+	for start in range(0, num_rounds, batch_rounds):
+
+		batch = min(batch_rounds, num_rounds - start)
+
+		committees = sampler.sample(committee_size, batch, replace=replace)
+
+		# A node holding several seats (with replacement) counts once per seat.
+		num_adversaries_committee = np.count_nonzero(committees < num_adversary, axis=1)
+
+		rounds_observed += int(np.count_nonzero(num_adversaries_committee))
+		rounds_majority += int(np.count_nonzero(num_adversaries_committee >= majority_nodes))
+
+	return rounds_observed, rounds_majority
+
+
+def _simulate_worker(args):
+
+	seed_sequence, num_rounds, num_adversary, committee_size, stakes, replace = args
+
+	sampler = committee_sampler.CommitteeSampler(stakes, seed=seed_sequence)
+
+	return simulate_rounds(sampler, num_rounds, num_adversary, committee_size, replace)
+
+
+def simulate_committee_rounds(num_rounds, num_adversary, committee_size, total_nodes, seed=None, num_workers=1, confidence=0.95, stakes=None, replace=False):
+
+	# stakes: optional per-node stakes (uniform by default); the adversary
+	# controls nodes 0..num_adversary-1. replace: whether a node can hold
+	# several seats of one committee.
+
+	num_adversary = int(round(num_adversary))
+
+	if num_rounds <= 0:
+		raise ValueError('num_rounds must be positive.')
+
+	if not 0 <= num_adversary <= total_nodes:
+		raise ValueError('num_adversary must be between 0 and total_nodes.')
+
+	if not 0 < committee_size <= total_nodes:
+		raise ValueError('committee_size must be between 1 and total_nodes.')
+
+	if stakes is None:
+		stakes = np.ones(total_nodes)
+	elif len(stakes) != total_nodes:
+		raise ValueError('stakes must have one entry per node.')
+
+	# One independent stream per worker, each simulating an equal share of rounds.
+	child_seeds = np.random.SeedSequence(seed).spawn(num_workers)
+	shares = [num_rounds // num_workers + (idx < num_rounds % num_workers) for idx in range(num_workers)]
+
+	tasks = [(child_seed, share, num_adversary, committee_size, stakes, replace) for child_seed, share in zip(child_seeds, shares)]
+
+	if num_workers == 1:
+		counts = [_simulate_worker(tasks[0])]
+	else:
+		pool = multiprocessing.Pool(num_workers)
+		try:
+			counts = pool.map(_simulate_worker, tasks)
+		finally:
+			pool.close()
+			pool.join()
+
+	rounds_observed = sum(observed for observed, _ in counts)
+	rounds_majority = sum(majority for _, majority in counts)
+
+	return SimulationResult(num_rounds, rounds_observed, rounds_majority,
+		rounds_observed / num_rounds, get_wilson_interval(rounds_observed, num_rounds, confidence),
+		rounds_majority / num_rounds, get_wilson_interval(rounds_majority, num_rounds, confidence))
+
+
+def get_wilson_interval(successes, trials, confidence=0.95):
+
+	# Wilson score interval for a binomial proportion; well behaved when the
+	# proportion is close to 0 or 1.
+	if trials <= 0:
+		raise ValueError('trials must be positive.')
+
+	z = stats.norm.ppf(0.5 + confidence / 2.0)
+
+	p = successes / trials
+	denominator = 1 + z**2 / trials
+	center = (p + z**2 / (2 * trials)) / denominator
+	half_width = z * math.sqrt(p * (1 - p) / trials + z**2 / (4 * trials**2)) / denominator
+
+	# The bounds are exactly 0 (1) when there are no successes (failures), but
+	# do not round to it.
+	low = 0.0 if successes == 0 else max(0.0, center - half_width)
+	high = 1.0 if successes == trials else min(1.0, center + half_width)
+
+	return low, high
+
+
+def cross_check(num_rounds, num_adversary, committee_size, total_nodes, seed=None, num_workers=1, confidence=0.95):
+
+	result = simulate_committee_rounds(num_rounds, num_adversary, committee_size, total_nodes, seed, num_workers, confidence)
+
+	prob_adversary = float(num_adversary)/total_nodes
+
+	analytic_observe = committee_analysis.get_prob_observe_one_round(prob_adversary, committee_size, total_nodes)
+	analytic_majority = committee_analysis.get_prob_observe_majority(prob_adversary, committee_size, total_nodes)
+
+	return result, analytic_observe, analytic_majority
+
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_integer('total_nodes', 100, 'Total number of nodes')
+flags.DEFINE_integer('num_adversary', 30, 'Number of nodes controlled by the adversary')
+flags.DEFINE_integer('committee_size', 10, 'Committee size')
+flags.DEFINE_integer('num_rounds', 10**6, 'Number of simulated rounds')
+flags.DEFINE_integer('num_workers', 1, 'Number of worker processes')
+flags.DEFINE_integer('seed', None, 'Seed of the root SeedSequence')
+flags.DEFINE_float('confidence', 0.95, 'Confidence level of the intervals')
+
+
+def main(argv):
+
+	del argv  # argv is not used.
+
+	result, analytic_observe, analytic_majority = cross_check(FLAGS.num_rounds, FLAGS.num_adversary, FLAGS.committee_size, FLAGS.total_nodes, FLAGS.seed, FLAGS.num_workers, FLAGS.confidence)
+
+	print('Simulated {} rounds: adversary observes {} and has a majority in {}.'.format(
+		result.num_rounds, result.rounds_observed, result.rounds_majority))
+
+	print('P(observe) = {:.6g}, {:g}% CI [{:.6g}, {:.6g}], analytic {:.6g}'.format(
+		result.prob_observe, 100 * FLAGS.confidence, result.prob_observe_ci[0], result.prob_observe_ci[1], analytic_observe))
+
+	print('P(majority) = {:.6g}, {:g}% CI [{:.6g}, {:.6g}], analytic {:.6g}'.format(
+		result.prob_majority, 100 * FLAGS.confidence, result.prob_majority_ci[0], result.prob_majority_ci[1], analytic_majority))
+
+
+if __name__ == '__main__':
+	app.run(main)
@@ -0,0 +1,127 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for committee_simulation.py."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+
+from absl.testing import absltest
+from absl.testing import parameterized
+import numpy as np
+from scipy import stats
+
+# The PAL scripts import their siblings as top-level modules.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import committee_sampler  # pylint: disable=g-import-not-at-top
+import committee_simulation
+
+
+class CommitteeSimulationTest(parameterized.TestCase):
+
+  @parameterized.named_parameters(
+      ('no_adversary', 0, 10, 100),
+      ('minority', 30, 10, 100),
+      ('large_committee', 45, 51, 100),
+      ('single_seat', 5, 1, 1000))
+  def test_simulation_agrees_with_analysis(self, num_adversary,
+                                           committee_size, total_nodes):
+    result, analytic_observe, analytic_majority = (
+        committee_simulation.cross_check(
+            10**5, num_adversary, committee_size, total_nodes, seed=0,
+            confidence=0.999))
+    self.assertBetween(analytic_observe, *result.prob_observe_ci)
+    self.assertBetween(analytic_majority, *result.prob_majority_ci)
+
+  @parameterized.named_parameters(
+      ('uniform', [1.] * 20, 6, 5),
+      ('stake_weighted', [4., 1., 1., 2.] + [1.] * 16, 3, 7))
+  def test_stake_weighted_with_replacement(self, stakes, num_adversary,
+                                           committee_size):
+    # Every seat independently goes to the adversary with probability equal to
+    # its share of the stake, so its seat count is binomial.
+    result = committee_simulation.simulate_committee_rounds(
+        10**5, num_adversary, committee_size, len(stakes), seed=0,
+        confidence=0.999, stakes=stakes, replace=True)
+    stake_share = sum(stakes[:num_adversary]) / sum(stakes)
+    majority = committee_simulation.get_majority_size(committee_size)
+    self.assertBetween(stats.binom.sf(0, committee_size, stake_share),
+                       *result.prob_observe_ci)
+    self.assertBetween(stats.binom.sf(majority - 1, committee_size,
+                                      stake_share),
+                       *result.prob_majority_ci)
+
+  def test_draws_committees(self):
+    # Counts the adversarial seats of the sampled committees.
+    sampler = committee_sampler.CommitteeSampler(np.ones(10), seed=0)
+    expected_sampler = committee_sampler.CommitteeSampler(np.ones(10), seed=0)
+    committees = expected_sampler.sample(4, 1000, replace=False)
+    num_adversaries = np.sum(committees < 3, axis=1)
+    self.assertEqual(
+        committee_simulation.simulate_rounds(sampler, 1000, 3, 4),
+        (np.sum(num_adversaries > 0), np.sum(num_adversaries >= 2)))
+
+  def test_no_adversary(self):
+    result, analytic_observe, analytic_majority = (
+        committee_simulation.cross_check(1000, 0, 10, 100, seed=0))
+    self.assertEqual(result.rounds_observed, 0)
+    self.assertEqual(result.rounds_majority, 0)
+    self.assertEqual(analytic_observe, 0.)
+    self.assertEqual(analytic_majority, 0.)
+
+  def test_seeded_results_repeat(self):
+    first = committee_simulation.simulate_committee_rounds(
+        10**4, 30, 10, 100, seed=1, num_workers=2)
+    second = committee_simulation.simulate_committee_rounds(
+        10**4, 30, 10, 100, seed=1, num_workers=2)
+    self.assertEqual(first, second)
+    self.assertEqual(first.num_rounds, 10**4)
+
+  def test_wilson_interval(self):
+    low, high = committee_simulation.get_wilson_interval(0, 100)
+    self.assertEqual(low, 0.)
+    self.assertAlmostEqual(high, 0.037, places=3)
+
+    # Symmetric around one half, and containing the proportion.
+    low, high = committee_simulation.get_wilson_interval(50, 100)
+    self.assertAlmostEqual(low + high, 1.)
+    self.assertBetween(0.5, low, high)
+
+    # Close to the normal approximation for many trials.
+    low, high = committee_simulation.get_wilson_interval(3000, 10000)
+    half_width = stats.norm.ppf(0.975) * (0.3 * 0.7 / 10000)**0.5
+    self.assertAlmostEqual(low, 0.3 - half_width, places=3)
+    self.assertAlmostEqual(high, 0.3 + half_width, places=3)
+
+  def test_invalid_arguments(self):
+    with self.assertRaises(ValueError):
+      committee_simulation.simulate_committee_rounds(10, 101, 10, 100)
+    with self.assertRaises(ValueError):
+      committee_simulation.simulate_committee_rounds(10, 10, 0, 100)
+    with self.assertRaises(ValueError):
+      committee_simulation.simulate_committee_rounds(0, 10, 10, 100)
+    with self.assertRaises(ValueError):
+      committee_simulation.simulate_committee_rounds(10, 10, 10, 100,
+                                                     stakes=[1.] * 10)
+    with self.assertRaises(ValueError):
+      committee_simulation.get_wilson_interval(0, 0)
+
+
+if __name__ == '__main__':
+  absltest.main()
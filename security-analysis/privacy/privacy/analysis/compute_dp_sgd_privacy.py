@@ -28,13 +28,24 @@ Example:
     --delta=1e-5
 
 The output states that DP-SGD with these parameters satisfies (2.92, 1e-5)-DP.
+
+Many configurations can be evaluated in one process with --batch, which reads
+them as CSV (with a header row) or JSON lines from a file, or from stdin if
+given '-'. Each configuration has the fields N, batch_size, noise_multiplier,
+delta and either epochs or steps; missing fields fall back to the flags. One
+JSON line is written to stdout per configuration, as soon as it is evaluated:
+
+  compute_dp_sgd_privacy --batch=configs.csv --num_workers=8
 """
 
 from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import csv
+import json
 import math
+import multiprocessing
 import sys
 
 from absl import app
@@ -45,6 +56,8 @@ sys.skip_tf_privacy_import = True
 
 from privacy.analysis.rdp_accountant import compute_rdp  # pylint: disable=g-import-not-at-top
 from privacy.analysis.rdp_accountant import get_privacy_spent
+from privacy.analysis.rdp_accountant import RdpCache
+from privacy.analysis.rdp_accountant import set_rdp_cache
 
 FLAGS = flags.FLAGS
 
@@ -55,12 +68,34 @@ flags.DEFINE_integer('steps', 0, 'Steps')
 flags.DEFINE_float('noise_multiplier', None, 'Noise multiplier for DP-SGD')
 flags.DEFINE_float('epochs', None, 'Number of epochs (may be fractional)')
 flags.DEFINE_float('delta', 1e-6, 'Target delta')
+flags.DEFINE_string('rdp_cache', None,
+                    'Optional SQLite file caching RDP values across runs')
+flags.DEFINE_string('batch', None,
+                    'File of configurations to evaluate, or - for stdin')
+flags.DEFINE_enum('batch_format', None, ['csv', 'jsonl'],
+                  'Format of --batch; inferred from the file extension if '
+                  'not set (jsonl for stdin)')
+flags.DEFINE_integer('num_workers', 1,
+                     'Number of processes evaluating --batch configurations')
 
-flags.mark_flag_as_required('N')
-flags.mark_flag_as_required('batch_size')
-flags.mark_flag_as_required('noise_multiplier')
+# N, batch_size and noise_multiplier are required unless --batch is set.
 # flags.mark_flag_as_required('epochs')
 
+ORDERS = ([1.25, 1.5, 1.75, 2., 2.25, 2.5, 3., 3.5, 4., 4.5] +
+          list(range(5, 64)) + [128, 256, 512])
+
+ORDERS_WARNING = ('The privacy estimate is likely to be improved by expanding '
+                  'the set of orders.')
+
+_CONFIG_FIELDS = {
+    'N': int,
+    'batch_size': int,
+    'noise_multiplier': float,
+    'epochs': float,
+    'steps': int,
+    'delta': float,
+}
+
 
 def apply_dp_sgd_analysis(q, sigma, steps, orders, delta):
   """Compute and print results of DP-SGD analysis."""
@@ -80,16 +115,156 @@ def apply_dp_sgd_analysis(q, sigma, steps, orders, delta):
           'the set of orders.')
 
 
+def evaluate_config(config, orders=ORDERS):
+  """Computes the privacy of one DP-SGD configuration.
+
+  Args:
+    config: A dict with the fields N, batch_size, noise_multiplier, delta and
+      either epochs or steps (a positive number of steps takes precedence).
+    orders: The RDP orders to optimize over.
+
+  Returns:
+    A dict with the configuration, the sampling ratio q, the number of steps,
+    eps, opt_order and a list of warnings. Configurations that cannot be
+    evaluated get an error message instead of eps and opt_order.
+  """
+  result = dict(config)
+  result['warnings'] = []
+  try:
+    q = config['batch_size'] / config['N']
+    if q > 1:
+      raise ValueError('N must be larger than the batch size.')
+    steps = config.get('steps') or 0
+    if steps == 0:
+      steps = int(math.ceil(config['epochs'] * config['N'] /
+                            config['batch_size']))
+    rdp = compute_rdp(q, config['noise_multiplier'], steps, orders)
+    eps, _, opt_order = get_privacy_spent(orders, rdp,
+                                          target_delta=config['delta'])
+  except (KeyError, TypeError, ValueError, ZeroDivisionError) as e:
+    result['error'] = '{}: {}'.format(type(e).__name__, e)
+    return result
+
+  result.update(q=q, steps=steps, eps=float(eps), opt_order=opt_order)
+  if opt_order == max(orders) or opt_order == min(orders):
+    result['warnings'].append(ORDERS_WARNING)
+  return result
+
+
+def read_configs(stream, batch_format, defaults=None):
+  """Yields configuration dicts read from CSV or JSON lines.
+
+  Args:
+    stream: A file object.
+    batch_format: 'csv' (with a header row) or 'jsonl'.
+    defaults: Optional dict of values for fields a configuration leaves out.
+
+  Yields:
+    Configuration dicts. Fields are converted to their types; empty or
+    unparseable values are left for evaluate_config to report.
+  """
+  if batch_format == 'csv':
+    rows = csv.DictReader(stream)
+  else:
+    rows = (json.loads(line) for line in stream if line.strip())
+
+  for row in rows:
+    config = dict(defaults or {})
+    for field, value in row.items():
+      if value is None or value == '':
+        continue
+      convert = _CONFIG_FIELDS.get(field)
+      try:
+        config[field] = convert(float(value)) if convert else value
+      except (TypeError, ValueError):
+        config[field] = value
+    yield config
+
+
+def _init_worker(rdp_cache_path):
+  set_rdp_cache(RdpCache(rdp_cache_path))
+
+
+def run_batch(configs, num_workers=1, rdp_cache_path=None):
+  """Evaluates configurations, yielding results as they complete.
+
+  Args:
+    configs: An iterable of configuration dicts.
+    num_workers: The number of worker processes; 1 evaluates in-process.
+    rdp_cache_path: Optional SQLite file for the RDP cache. Without it every
+      process still caches RDP values in memory.
+
+  Yields:
+    evaluate_config results, each with the 0-based index of its configuration.
+    With several workers they come in completion order.
+  """
+  indexed = enumerate(configs)
+  if num_workers <= 1:
+    previous = set_rdp_cache(RdpCache(rdp_cache_path))
+    try:
+      for result in map(_evaluate_indexed, indexed):
+        yield result
+    finally:
+      set_rdp_cache(previous)
+    return
+
+  pool = multiprocessing.Pool(num_workers, _init_worker, (rdp_cache_path,))
+  try:
+    for result in pool.imap_unordered(_evaluate_indexed, indexed, chunksize=16):
+      yield result
+  finally:
+    pool.terminate()
+
+
+def _evaluate_indexed(indexed_config):
+  index, config = indexed_config
+  result = evaluate_config(config)
+  result['index'] = index
+  return result
+
+
+def _flag_defaults():
+  return {field: FLAGS[field].value for field in _CONFIG_FIELDS
+          if FLAGS[field].value is not None}
+
+
+def _batch_main():
+  batch_format = FLAGS.batch_format
+  if batch_format is None:
+    batch_format = 'csv' if FLAGS.batch.endswith('.csv') else 'jsonl'
+
+  stream = sys.stdin if FLAGS.batch == '-' else open(FLAGS.batch)
+  try:
+    configs = read_configs(stream, batch_format, _flag_defaults())
+    for result in run_batch(configs, FLAGS.num_workers, FLAGS.rdp_cache):
+      sys.stdout.write(json.dumps(result) + '\n')
+      sys.stdout.flush()
+  finally:
+    if stream is not sys.stdin:
+      stream.close()
+
+
 def main(argv):
 
   del argv  # argv is not used.
+
+  if FLAGS.batch:
+    _batch_main()
+    return
+
+  for flag in ('N', 'batch_size', 'noise_multiplier'):
+    if FLAGS[flag].value is None:
+      raise app.UsageError('--{} is required without --batch.'.format(flag))
+
   q = FLAGS.batch_size / FLAGS.N  # q - the sampling ratio.
 
+  if FLAGS.rdp_cache:
+    set_rdp_cache(RdpCache(FLAGS.rdp_cache))
+
   if q > 1:
     raise app.UsageError('N must be larger than the batch size.')
 
-  orders = ([1.25, 1.5, 1.75, 2., 2.25, 2.5, 3., 3.5, 4., 4.5] +
-            list(range(5, 64)) + [128, 256, 512])
+  orders = ORDERS
 
   steps = FLAGS.steps
 
@@ -0,0 +1,125 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the batch mode of compute_dp_sgd_privacy.py."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import io
+import json
+import os
+import subprocess
+import sys
+
+from absl.testing import absltest
+from absl.testing import parameterized
+
+from privacy.analysis import compute_dp_sgd_privacy
+from privacy.analysis import rdp_accountant
+
+_CSV_CONFIGS = ('N,batch_size,noise_multiplier,epochs,delta\n'
+                '60000,256,1.12,60,1e-5\n'
+                '60000,256,1.1,,1e-5\n')
+
+_JSONL_CONFIGS = ('{"N": 60000, "batch_size": 256, "noise_multiplier": 1.12, '
+                  '"epochs": 60, "delta": 1e-5}\n'
+                  '\n'
+                  '{"N": 60000, "batch_size": 256, "noise_multiplier": 1.1, '
+                  '"steps": 1000, "delta": 1e-5}\n')
+
+
+def _single_config_eps(n, batch_size, noise_multiplier, steps, delta):
+  """The epsilon the script computes for one configuration given by flags."""
+  q = batch_size / n
+  rdp = rdp_accountant.compute_rdp(q, noise_multiplier, steps,
+                                   compute_dp_sgd_privacy.ORDERS)
+  return rdp_accountant.get_privacy_spent(
+      compute_dp_sgd_privacy.ORDERS, rdp, target_delta=delta)[0]
+
+
+class ComputeDpSgdPrivacyBatchTest(parameterized.TestCase):
+
+  @parameterized.named_parameters(
+      ('in_process', 1),
+      ('pool', 2))
+  def test_csv(self, num_workers):
+    configs = compute_dp_sgd_privacy.read_configs(
+        io.StringIO(_CSV_CONFIGS), 'csv', {'epochs': 10})
+    results = sorted(
+        compute_dp_sgd_privacy.run_batch(configs, num_workers),
+        key=lambda result: result['index'])
+
+    self.assertLen(results, 2)
+    # 60 epochs of 60000 examples in batches of 256.
+    self.assertEqual(results[0]['steps'], 14063)
+    self.assertAlmostEqual(results[0]['eps'],
+                           _single_config_eps(60000, 256, 1.12, 14063, 1e-5))
+    # No epochs, so the default is used.
+    self.assertEqual(results[1]['steps'], 2344)
+    self.assertAlmostEqual(results[1]['eps'],
+                           _single_config_eps(60000, 256, 1.1, 2344, 1e-5))
+    for result in results:
+      self.assertNotIn('error', result)
+      self.assertIsInstance(result['N'], int)
+
+  def test_jsonl(self):
+    configs = compute_dp_sgd_privacy.read_configs(
+        io.StringIO(_JSONL_CONFIGS), 'jsonl')
+    results = sorted(compute_dp_sgd_privacy.run_batch(configs),
+                     key=lambda result: result['index'])
+
+    self.assertEqual([result['index'] for result in results], [0, 1])
+    self.assertAlmostEqual(results[0]['eps'],
+                           _single_config_eps(60000, 256, 1.12, 14063, 1e-5))
+    self.assertAlmostEqual(results[1]['eps'],
+                           _single_config_eps(60000, 256, 1.1, 1000, 1e-5))
+
+  def test_invalid_config_reports_error(self):
+    configs = compute_dp_sgd_privacy.read_configs(
+        io.StringIO('N,batch_size,noise_multiplier,steps,delta\n'
+                    '100,256,1.1,10,1e-5\n'
+                    'x,256,1.1,10,1e-5\n'), 'csv')
+    results = list(compute_dp_sgd_privacy.run_batch(configs))
+    self.assertLen(results, 2)
+    for result in results:
+      self.assertIn('error', result)
+      self.assertNotIn('eps', result)
+
+  def test_stdin(self):
+    package_dir = os.path.dirname(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [package_dir] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+    process = subprocess.Popen(
+        [sys.executable, compute_dp_sgd_privacy.__file__, '--batch=-',
+         '--batch_format=csv', '--epochs=10', '--num_workers=2'],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env,
+        universal_newlines=True)
+    output, _ = process.communicate(_CSV_CONFIGS)
+    self.assertEqual(process.returncode, 0)
+
+    results = sorted((json.loads(line) for line in output.splitlines()),
+                     key=lambda result: result['index'])
+    self.assertEqual([result['index'] for result in results], [0, 1])
+    self.assertAlmostEqual(results[0]['eps'],
+                           _single_config_eps(60000, 256, 1.12, 14063, 1e-5))
+    self.assertAlmostEqual(results[1]['eps'],
+                           _single_config_eps(60000, 256, 1.1, 2344, 1e-5))
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -37,9 +37,13 @@ import sys
 
 from absl import app
 from absl import flags
+import numpy as np
 import pandas as pd
 import random
+from scipy import stats
 import committee_analysis
+import committee_sampler
+import stake_map as stake_map_lib
 
 
 #Output file
@@ -52,6 +56,9 @@ sys.skip_tf_privacy_import = True
 
 from privacy.analysis.rdp_accountant import compute_rdp  # pylint: disable=g-import-not-at-top
 from privacy.analysis.rdp_accountant import get_privacy_spent
+from privacy.analysis.rdp_accountant import epsilon_trajectory
+from privacy.analysis.rdp_accountant import schedule_epsilon_trajectory
+from privacy.analysis.rdp_accountant import split_epsilon
 
 # flags.mark_flag_as_required('epochs')
 
@@ -111,6 +118,10 @@ def main(argv):
   flags.DEFINE_float('delta', 1e-6, 'Target delta')
   flags.DEFINE_integer('committee_size', 30, 'Target delta')
   flags.DEFINE_float('adversarial_client_control', 0.3, 'Adversarial Client Control')
+  flags.DEFINE_enum('stake_distribution', 'uniform', ['uniform', 'zipf', 'pareto', 'empirical'], 'Distribution of client stakes')
+  flags.DEFINE_float('stake_parameter', 2., 'Exponent (zipf) or shape (pareto) of the stake distribution')
+  flags.DEFINE_string('stake_csv', None, 'CSV file of stakes for the empirical distribution')
+  flags.DEFINE_string('stake_file', None, 'If set, stakes are written to this .npy file and memory-mapped')
 
   flags.mark_flag_as_required('N')
   flags.mark_flag_as_required('batch_size')
@@ -136,44 +147,36 @@ def main(argv):
   if steps == 0:
     steps = int(math.ceil(FLAGS.epochs * FLAGS.N / FLAGS.batch_size))
 
-  round_eps = []
-
   # For federated learning
-  for rounds in xrange(1,steps+1):
-
-      this_round_eps = apply_dp_sgd_analysis(q, FLAGS.noise_multiplier, rounds, orders, FLAGS.delta)
+  round_eps, round_opt_orders = epsilon_trajectory(q, FLAGS.noise_multiplier, steps, orders, FLAGS.delta)
 
-      results_df = results_df.append({'system': 'fed_learn', 'round': rounds, 'epsilon':this_round_eps},ignore_index=True)
+  if max(round_opt_orders) == max(orders) or min(round_opt_orders) == min(orders):
+    print('The privacy estimate is likely to be improved by expanding '
+          'the set of orders.')
 
-      round_eps.append(this_round_eps)
+  results_df = results_df.append(pd.DataFrame({'system': 'fed_learn', 'round': range(1, steps+1), 'epsilon': round_eps}), ignore_index=True)
 
   # For biscotti
-  stake_map = generate_stake_map(FLAGS.N)
+  stake_map = generate_stake_map(FLAGS.N, FLAGS.stake_distribution, FLAGS.stake_parameter, FLAGS.stake_csv, FLAGS.stake_file)
   adversarial_clients = get_adversarial_clients(ADVERSARIAL_CLIENT_STAKE,stake_map)
 
   secure_agg = True
-  prev_rdp=0
   sigma = FLAGS.noise_multiplier
   sigma_agg = FLAGS.noise_multiplier*math.sqrt(FLAGS.batch_size)
   observation_list = get_observation_list(steps, FLAGS.adversarial_client_stake, FLAGS.committee_size, FLAGS.N)
 
-  for rounds in xrange(1,steps+1):
-
-    this_round_eps = 1
-
-    if observation_list[rounds-1] == "no_adv" :      
-      noise_multiplier = sigma_agg
-    else:
-      noise_multiplier = sigma
+  biscotti_eps, _ = get_observation_epsilon_list(q, sigma, sigma_agg, observation_list, orders, FLAGS.delta)
 
-    this_round_eps, prev_rdp = apply_dp_sgd_analysis_biscotti(q, noise_multiplier, rounds, orders, FLAGS.delta, prev_rdp)
-
-    results_df = results_df.append({'system': 'biscotti', 'round': rounds, 'epsilon':this_round_eps},ignore_index=True)  
+  results_df = results_df.append(pd.DataFrame({'system': 'biscotti', 'round': range(1, steps+1), 'epsilon': biscotti_eps}), ignore_index=True)
 
   results_df.to_csv(OUTPUT_FILE)
 
 def get_adversarial_clients(adversarial_client_stake, stake_map):
 
+  # The adversary controls the lowest-stake clients.
+  if isinstance(stake_map, stake_map_lib.StakeMap):
+    return stake_map.lowest_stake_nodes(adversarial_client_stake)
+
   sorted_map = sorted(stake_map.items(), key=lambda x: x[1])
   adversarial_clients = []
 
@@ -202,17 +205,17 @@ def get_observation_list(rounds, adversary_control_nodes, committee_size, total_
   return observation_list  
 
 
-def check_if_adversary_observes_dep(stake_map, committee_size, num_clients, adversarial_clients):
+def check_if_adversary_observes_dep(sampler, committee_size, num_clients, adversarial_clients, num_committees=None):
 
-  committee = select_committee(stake_map, committee_size)
+  # sampler comes from get_committee_sampler, built once for all rounds. Pass
+  # num_committees to check a whole batch of rounds at once.
+  committees = select_committee(sampler, committee_size, num_committees)
 
-  set_committee = set(committee)
-  set_adversarial = set(adversarial_clients)
+  observed = np.isin(committees, adversarial_clients).any(axis=-1)
 
-  if (set_committee & set_adversarial):
-     return True
-  else:
-     return False 
+  if num_committees is None:
+    return bool(observed)
+  return observed
 
 
 def get_privacy_adversarial_guarantee(num_users, num_samples, steps, noise_multiplier, delta, committee_size, adversarial_client_control):
@@ -220,85 +223,103 @@ def get_privacy_adversarial_guarantee(num_users, num_samples, steps, noise_multi
   q = num_samples / num_users 
 
   secure_agg = True
-  prev_rdp=0
   
   sigma_agg = noise_multiplier*math.sqrt(num_samples)
   epsilon = 0
-  adversary_observes = 0
 
   observation_list = get_observation_list(steps, adversarial_client_control, committee_size , num_users)
 
-  epsilon_list = []
+  epsilon_list, _ = get_observation_epsilon_list(q, noise_multiplier, sigma_agg, observation_list, orders, delta)
 
-  for rounds in xrange(1,steps+1):
+  if steps > 0:
+    epsilon = epsilon_list[-1]
 
-      this_round_eps = 1
+  return epsilon, observation_list.count('adv'), epsilon_list.tolist()
 
-      if observation_list[rounds-1] == "no_adv" :      
-        sigma = sigma_agg
-      else:
-        sigma = noise_multiplier
-        adversary_observes+=1
 
-      this_round_eps, prev_rdp = apply_dp_sgd_analysis_biscotti(q, sigma, rounds, orders, delta, prev_rdp)
+def get_privacy_adversarial_distribution(num_users, num_samples, steps, noise_multiplier, delta, committee_size, adversarial_client_control, quantiles=(0.5, 0.9, 0.99, 0.999)):
 
-      epsilon = this_round_eps
+  # Exact alternative to get_privacy_adversarial_guarantee: the final epsilon
+  # only depends on how many rounds k the adversary observes, and k is
+  # Binomial(steps, prob_observe). Evaluates the final epsilon for every k at
+  # once and weights it by the probability of k.
 
-      epsilon_list.append(this_round_eps)
+  q = num_samples / num_users
 
+  sigma_agg = noise_multiplier*math.sqrt(num_samples)
 
-  return epsilon, observation_list.count('adv'), epsilon_list 
+  prob_adversary = adversarial_client_control/num_users
 
+  prob_observe = committee_analysis.get_prob_observe_one_round(prob_adversary, committee_size, num_users)
 
+  epsilon_by_rounds, _ = split_epsilon((q, sigma_agg), (q, noise_multiplier), steps, orders, delta)
 
-def select_committee(stake_map, committee_size):
+  prob_by_rounds = stats.binom.pmf(np.arange(steps + 1), steps, prob_observe)
 
-  sumStake = sum(stake_map.values())
-  
-  prob_stake = {node: (stake/sumStake) for node, stake in stake_map.iteritems()}
+  expected_epsilon = np.dot(prob_by_rounds, epsilon_by_rounds)
 
-  cum_prob = 0
-  cum_prob_stake = {}
+  epsilon_quantiles = get_weighted_quantiles(epsilon_by_rounds, prob_by_rounds, quantiles)
 
-  for node,node_prob in prob_stake.iteritems():
+  return expected_epsilon, epsilon_quantiles, epsilon_by_rounds, prob_by_rounds
 
-    cum_prob = cum_prob + node_prob    
-    cum_prob_stake[node]= cum_prob
 
-  # Select nodes
-  committee = []
-  for x in xrange(0,committee_size):
-    rand_value = random.uniform(0,1)
-    selected_node = get_node(rand_value,cum_prob_stake)
-    committee.append(selected_node)
+def get_weighted_quantiles(values, weights, quantiles):
 
-  return committee
+  # Values of zero weight (e.g. binomial probabilities that underflow) are
+  # never returned, not even for the 0-quantile.
+  values, weights = values[weights > 0], weights[weights > 0]
 
-def get_node(rand_value, cum_prob_stake):
+  sorted_idx = np.argsort(values, kind='mergesort')
+  cum_weights = np.cumsum(weights[sorted_idx])
+  cum_weights /= cum_weights[-1]
 
-  node_selected = 0
+  quantile_idx = np.searchsorted(cum_weights, quantiles)
 
-  prev_prob = 0.0
-  
-  for node,node_prob in cum_prob_stake.iteritems():
+  return values[sorted_idx][np.minimum(quantile_idx, len(values) - 1)]
 
-    if (rand_value > prev_prob) and (rand_value <= node_prob):
-      node_selected = node
-      break
 
-    prev_prob = node_prob
+def get_observation_epsilon_list(q, sigma, sigma_agg, observation_list, orders, delta):
+
+  # Rounds the adversary observes only get the per-client noise (sigma), the
+  # others are protected by secure aggregation (sigma_agg).
+  mechanisms = [(q, sigma_agg), (q, sigma)]
+  schedule = [0 if observation == "no_adv" else 1 for observation in observation_list]
+
+  epsilon_list, opt_orders = schedule_epsilon_trajectory(mechanisms, schedule, orders, delta)
+
+  if len(opt_orders) and (max(opt_orders) == max(orders) or min(opt_orders) == min(orders)):
+    print('The privacy estimate is likely to be improved by expanding '
+          'the set of orders.')
+
+  return epsilon_list, opt_orders
+
+
+
+def select_committee(sampler, committee_size, num_committees=None, replace=True):
+
+  # Draws from a committee_sampler.CommitteeSampler, so the stake distribution
+  # is built once by the caller (see get_committee_sampler) and not per round.
+  return sampler.sample(committee_size, num_committees, replace=replace)
+
 
-  return node_selected
+def get_committee_sampler(stake_map, seed=None):
 
+  # seed (an int or np.random.Generator) makes the committees reproducible.
+  return committee_sampler.CommitteeSampler(stake_map, seed=seed)
 
-def generate_stake_map(numClients):
 
-  stakeMap = {} 
+def generate_stake_map(numClients, distribution='uniform', parameter=None, csv_file=None, path=None):
 
-  for node_id in xrange(0,numClients):   
-    stakeMap[node_id] = 1
+  if distribution == 'uniform':
+    return stake_map_lib.uniform_stakes(numClients, path=path)
+  elif distribution == 'zipf':
+    return stake_map_lib.zipf_stakes(numClients, parameter, path=path)
+  elif distribution == 'pareto':
+    return stake_map_lib.pareto_stakes(numClients, parameter, path=path)
+  elif distribution == 'empirical':
+    return stake_map_lib.empirical_stakes(csv_file, numClients, path=path)
 
-  return stakeMap
+  raise ValueError('Unknown stake distribution: {}'.format(distribution))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,131 @@
+# Copyright 2019 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the adversarial epsilon distribution in compute_fed_biscotti_sgd_privacy.py."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import math
+import os
+import random
+import sys
+
+from absl.testing import absltest
+from absl.testing import parameterized
+import numpy as np
+from scipy import stats
+
+# The PAL scripts import their siblings as top-level modules.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import committee_analysis  # pylint: disable=g-import-not-at-top
+import compute_fed_biscotti_sgd_privacy as privacy_analysis
+from privacy.analysis import rdp_accountant
+
+# num_users, num_samples, steps, noise_multiplier, delta, committee_size,
+# adversarial_client_control
+_CONFIGURATION = (20, 2, 8, 1.1, 1e-5, 3, 4)
+
+
+class WeightedQuantilesTest(parameterized.TestCase):
+
+  @parameterized.named_parameters(
+      ('uniform', [3., 1., 2.], [1., 1., 1.], [0.1, 1. / 3, 0.5, 1.],
+       [1., 1., 2., 3.]),
+      ('weighted', [1., 2., 3.], [0.7, 0.2, 0.1], [0.5, 0.7, 0.8, 0.95],
+       [1., 1., 2., 3.]),
+      ('ties', [2., 1., 2., 1.], [1., 2., 3., 4.], [0.5, 0.6, 0.65, 1.],
+       [1., 1., 2., 2.]),
+      ('zero_weights', [5., 1., 3., 4., 0.], [0., 1., 0., 1., 0.],
+       [0., 0.5, 0.6, 1.], [1., 1., 4., 4.]))
+  def test_known_quantiles(self, values, weights, quantiles, expected):
+    np.testing.assert_array_equal(
+        privacy_analysis.get_weighted_quantiles(
+            np.array(values), np.array(weights), quantiles), expected)
+
+  def test_matches_repeated_values(self):
+    # Integer weights are the same as repeating every value that many times.
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 10, size=30).astype(float)
+    weights = rng.integers(0, 4, size=30)
+    repeated = np.repeat(values, weights)
+    quantiles = np.arange(1, 100) / 100
+    np.testing.assert_array_equal(
+        privacy_analysis.get_weighted_quantiles(values, weights.astype(float),
+                                                quantiles),
+        np.quantile(repeated, quantiles, method='inverted_cdf'))
+
+
+class AdversarialDistributionTest(absltest.TestCase):
+
+  def test_distribution(self):
+    (num_users, num_samples, steps, noise_multiplier, delta, committee_size,
+     adversarial_client_control) = _CONFIGURATION
+    expected_epsilon, epsilon_quantiles, epsilon_by_rounds, prob_by_rounds = (
+        privacy_analysis.get_privacy_adversarial_distribution(
+            *_CONFIGURATION, quantiles=(0., 0.5, 1.)))
+
+    # Entry k composes k rounds observed by the adversary (per-client noise)
+    # with steps - k rounds under secure aggregation.
+    q = num_samples / num_users
+    orders = privacy_analysis.orders
+    rdp_agg = rdp_accountant.compute_rdp(
+        q, noise_multiplier * math.sqrt(num_samples), 1, orders)
+    rdp_observed = rdp_accountant.compute_rdp(q, noise_multiplier, 1, orders)
+    self.assertLen(epsilon_by_rounds, steps + 1)
+    for k in range(steps + 1):
+      eps, _, _ = rdp_accountant.get_privacy_spent(
+          orders, (steps - k) * rdp_agg + k * rdp_observed, target_delta=delta)
+      self.assertAlmostEqual(epsilon_by_rounds[k], eps)
+    self.assertTrue(np.all(np.diff(epsilon_by_rounds) > 0))
+
+    prob_observe = committee_analysis.get_prob_observe_one_round(
+        adversarial_client_control / num_users, committee_size, num_users)
+    np.testing.assert_allclose(
+        prob_by_rounds,
+        stats.binom.pmf(np.arange(steps + 1), steps, prob_observe))
+    self.assertAlmostEqual(np.sum(prob_by_rounds), 1.)
+    self.assertAlmostEqual(expected_epsilon,
+                           np.dot(prob_by_rounds, epsilon_by_rounds))
+
+    # Epsilon increases with k, so its quantiles are those of k.
+    np.testing.assert_array_equal(
+        epsilon_quantiles,
+        epsilon_by_rounds[[0, int(stats.binom.median(steps, prob_observe)),
+                           steps]])
+
+  def test_agrees_with_sampled_observations(self):
+    expected_epsilon, _, epsilon_by_rounds, prob_by_rounds = (
+        privacy_analysis.get_privacy_adversarial_distribution(*_CONFIGURATION))
+
+    # get_privacy_adversarial_guarantee observes the expected number of rounds
+    # in a random order, which does not change the final epsilon.
+    random.seed(0)
+    epsilon, num_observed, _ = (
+        privacy_analysis.get_privacy_adversarial_guarantee(*_CONFIGURATION))
+    self.assertAlmostEqual(epsilon, epsilon_by_rounds[num_observed])
+
+    # The mean over sampled numbers of observed rounds converges to the
+    # expected epsilon.
+    steps = _CONFIGURATION[2]
+    rng = np.random.default_rng(0)
+    num_rounds = rng.choice(steps + 1, size=10**5, p=prob_by_rounds)
+    self.assertAlmostEqual(np.mean(epsilon_by_rounds[num_rounds]),
+                           expected_epsilon, delta=0.01 * expected_epsilon)
+
+
+if __name__ == '__main__':
+  absltest.main()
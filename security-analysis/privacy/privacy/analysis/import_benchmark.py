@@ -0,0 +1,81 @@
+# Copyright 2019 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Benchmark for the import time of the accounting tools.
+
+Each case is imported in a fresh interpreter. 'lazy' imports
+privacy.analysis.rdp_accountant, which no longer loads TensorFlow; 'eager'
+also touches the TensorFlow-dependent symbols of the privacy package, which is
+what every import of the package used to cost.
+
+Example:
+  python import_benchmark.py --repeats=5
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+
+from absl import app
+from absl import flags
+import numpy as np
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_integer('repeats', 5, 'Number of fresh interpreters per case')
+
+_CASES = [
+    ('lazy', 'import privacy.analysis.rdp_accountant'),
+    ('eager', 'import privacy.analysis.rdp_accountant; import privacy; '
+              'privacy.PrivacyLedger'),
+]
+
+_TIMER = ('import sys, time\n'
+          't = time.time()\n'
+          '{}\n'
+          'print(time.time() - t, "tensorflow" in sys.modules)\n')
+
+
+def _time_import(statement):
+  """Returns the import time in a fresh interpreter and if it loaded TF."""
+  root = os.path.dirname(os.path.dirname(os.path.dirname(
+      os.path.abspath(__file__))))
+  env = dict(os.environ)
+  env['PYTHONPATH'] = os.pathsep.join(
+      [root] + [p for p in [env.get('PYTHONPATH')] if p])
+  with open(os.devnull, 'w') as devnull:
+    output = subprocess.check_output(
+        [sys.executable, '-c', _TIMER.format(statement)], env=env,
+        stderr=devnull)
+  seconds, loaded_tf = output.decode().split()[-2:]
+  return float(seconds), loaded_tf == 'True'
+
+
+def main(argv):
+  del argv  # argv is not used.
+
+  for name, statement in _CASES:
+    runs = [_time_import(statement) for _ in range(FLAGS.repeats)]
+    print('{:6s} median {:.3f} s, min {:.3f} s over {} runs; '
+          'TensorFlow loaded: {}'.format(
+              name, np.median([t for t, _ in runs]), min(t for t, _ in runs),
+              len(runs), runs[0][1]))
+
+
+if __name__ == '__main__':
+  app.run(main)
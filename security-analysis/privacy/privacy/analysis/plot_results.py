@@ -4,6 +4,7 @@ import matplotlib.lines as mlines
 from absl import flags
 from absl import app
 import sys
+import utils
 
 # IMPORTANT: MAKE SURE COLUMN NAMES AND FLAGS ARE CONSISTENT
 
@@ -35,6 +36,8 @@ flags.DEFINE_string('legend', None, 'Legend')
 
 flags.DEFINE_string('data_file', None, 'Data file to read results from')
 
+flags.DEFINE_string('trajectory_dir', None, 'Directory of the epsilon trajectories, if epsilon_list holds trajectory IDs')
+
 flags.mark_flag_as_required('ind_var')
 flags.mark_flag_as_required('legend')
 flags.mark_flag_as_required('data_file')
@@ -52,7 +55,12 @@ def main(argv):
 	legends = FLAGS.legend 
 
 	# results
-	results = pd.read_csv(FLAGS.data_file)	
+	if utils.is_result_store(FLAGS.data_file):
+		results = utils.ResultStore(FLAGS.data_file).read(**get_flags_passed(FLAGS))
+	else:
+		results = pd.read_csv(FLAGS.data_file)	
+
+	results = utils.resolve_epsilon_lists(results, FLAGS.trajectory_dir)
 
 	# create filter maps
 	filter_map = create_filter_map(FLAGS, results)
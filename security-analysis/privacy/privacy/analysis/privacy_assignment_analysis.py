@@ -2,19 +2,22 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import hashlib
+import itertools
+import json
 import math
+import multiprocessing
 import sys
 
 from absl import app
 from absl import flags
-import pandas as pd
-import random
 import committee_analysis
 
 sys.skip_tf_privacy_import = True
 
-from privacy.analysis.rdp_accountant import get_privacy_spent
 from privacy.analysis.rdp_accountant import compute_rdp
+from privacy.analysis.rdp_accountant import RdpCache
+from privacy.analysis.rdp_accountant import set_rdp_cache
 import compute_fed_biscotti_sgd_privacy as privacy_analysis
 import utils
 
@@ -28,31 +31,205 @@ flags.DEFINE_float('delta', None, 'Target delta')
 flags.DEFINE_integer('committee_size', None, 'Committee Size')
 flags.DEFINE_float('adversarial_client_control', None, 'Number of clients controlled by adversary')
 
-flags.DEFINE_string('output_file', 'results.csv', 'Output file to append results to')
+flags.DEFINE_string('output_file', 'results.csv', 'Output file to append results to; .db, .sqlite and .sqlite3 files use the indexed result store')
+flags.DEFINE_string('rdp_cache', None, 'Optional SQLite file caching RDP values across runs')
+flags.DEFINE_boolean('epsilon_distribution', False, 'Also print the exact distribution of the final epsilon over the number of rounds the adversary observes')
 
-flags.mark_flag_as_required('U')
-flags.mark_flag_as_required('sample_ratio')
-flags.mark_flag_as_required('steps')
-flags.mark_flag_as_required('noise_multiplier')
-flags.mark_flag_as_required('delta')
-flags.mark_flag_as_required('committee_size')
-flags.mark_flag_as_required('adversarial_client_control')
+flags.DEFINE_string('sweep', None, 'JSON file mapping configuration flags to lists of values; runs the whole grid in this process and appends the missing configurations to output_file')
+flags.DEFINE_integer('num_workers', 1, 'Number of processes running --sweep configurations')
+flags.DEFINE_string('trajectory_dir', None, 'If set, per-round epsilon trajectories are stored in this directory, and the epsilon_list column holds their ID')
+
+# The configuration flags are required unless --sweep is set.
+CONFIG_FIELDS = ['U', 'sample_ratio', 'steps', 'noise_multiplier', 'delta', 'committee_size', 'adversarial_client_control']
 
 FLAGS = flags.FLAGS
 
+
+def analyze_configuration(config):
+
+	num_samples = config['U'] * config['sample_ratio']
+	num_adversaries = config['U'] * config['adversarial_client_control']
+
+	final_epsilon, adversary_observes, epsilon_list = privacy_analysis.get_privacy_adversarial_guarantee(config['U'], num_samples, config['steps'], config['noise_multiplier'], config['delta'], config['committee_size'], num_adversaries)
+
+	adversary_majority = committee_analysis.get_num_rounds_adversary_majority(config['steps'], num_adversaries, config['committee_size'], config['U'])
+
+	# In the order of utils.COLUMNS.
+	fields = [config['U'], config['sample_ratio'], config['adversarial_client_control'], config['noise_multiplier'], config['delta'], config['committee_size'], final_epsilon, adversary_observes, adversary_majority, epsilon_list]
+
+	return fields
+
+
+def get_config_hash(config):
+
+	# Ints and floats of equal value hash the same, so 100 and 100.0 are one
+	# configuration.
+	key = json.dumps([(field, repr(float(config[field]))) for field in CONFIG_FIELDS])
+
+	return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def get_grid_configs(grid):
+
+	values = [grid[field] if isinstance(grid[field], list) else [grid[field]] for field in CONFIG_FIELDS]
+
+	for combination in itertools.product(*values):
+		yield dict(zip(CONFIG_FIELDS, combination))
+
+
+def get_rdp_mechanisms(configs):
+
+	# The (q, sigma) pairs get_privacy_adversarial_guarantee composes, computed
+	# the same way so that cache keys match bit for bit. Invalid configurations
+	# are skipped here; they fail, and are reported, when they run.
+	mechanisms = set()
+
+	for config in configs:
+		try:
+			num_samples = config['U'] * config['sample_ratio']
+			q = num_samples / config['U']
+			mechanisms.add((q, config['noise_multiplier']))
+			mechanisms.add((q, config['noise_multiplier']*math.sqrt(num_samples)))
+		except (ArithmeticError, ValueError):
+			continue
+
+	return mechanisms
+
+
+def _init_sweep_worker(rdp_vectors, rdp_cache_path):
+
+	cache = RdpCache(rdp_cache_path, max_memory_entries=max(2**16, 2 * len(rdp_vectors) * len(privacy_analysis.orders)))
+
+	for (q, sigma), rdp in rdp_vectors.items():
+		cache.store(q, sigma, privacy_analysis.orders, rdp)
+
+	set_rdp_cache(cache)
+
+
+def _run_sweep_configuration(hashed_config):
+
+	# A failing configuration is reported back instead of raised, so that it
+	# does not abort the rest of the sweep.
+	config_hash, config = hashed_config
+
+	try:
+		return config_hash, analyze_configuration(config), None
+	except Exception as e:  # pylint: disable=broad-except
+		return config_hash, None, '{}: {}'.format(type(e).__name__, e)
+
+
+def run_sweep(grid, output_file, num_workers=1, rdp_cache_path=None, trajectory_dir=None):
+
+	# Finished configurations are recorded by content hash (in the result store,
+	# or in a side file next to a CSV output_file), so an interrupted sweep
+	# resumes where it stopped. Results are written by this process only.
+	# Configurations that raise are not recorded, so a rerun retries them; they
+	# are returned as (config, error) pairs along with the number that ran.
+	results_output = utils.open_results(output_file)
+
+	pending = []
+	seen = set()
+	for config in get_grid_configs(grid):
+		config_hash = get_config_hash(config)
+		if config_hash not in seen and not results_output.contains(config_hash):
+			seen.add(config_hash)
+			pending.append((config_hash, config))
+
+	if not pending:
+		results_output.close()
+		return 0, []
+
+	rdp_vectors = {}
+	for q, sigma in get_rdp_mechanisms(config for _, config in pending):
+		try:
+			rdp_vectors[(q, sigma)] = compute_rdp(q, sigma, 1, privacy_analysis.orders)
+		except (ArithmeticError, ValueError):
+			continue
+
+	if num_workers <= 1:
+		previous_cache = set_rdp_cache(None)
+		_init_sweep_worker(rdp_vectors, rdp_cache_path)
+		results = map(_run_sweep_configuration, pending)
+	else:
+		pool = multiprocessing.Pool(num_workers, _init_sweep_worker, (rdp_vectors, rdp_cache_path))
+		results = pool.imap_unordered(_run_sweep_configuration, pending)
+
+	trajectories = None
+	if trajectory_dir:
+		trajectories = utils.TrajectoryStore(trajectory_dir)
+
+	# With a trajectory store, rows are held back until the chunk holding their
+	# trajectories is on disk, so a resumed sweep never skips a configuration
+	# whose trajectory was lost.
+	pending_rows = []
+	configs = dict(pending)
+	failed = []
+
+	def write_pending_rows():
+		trajectories.flush()
+		for row_fields, row_hash in pending_rows:
+			results_output.write(row_fields, row_hash)
+		del pending_rows[:]
+
+	try:
+		for config_hash, fields, error in results:
+			if error is not None:
+				failed.append((configs[config_hash], error))
+				continue
+
+			if trajectories is None:
+				results_output.write(fields, config_hash)
+				continue
+
+			trajectories.write(config_hash, fields[-1])
+			pending_rows.append((fields[:-1] + [config_hash], config_hash))
+
+			if trajectories.pending_size >= trajectories.chunk_size:
+				write_pending_rows()
+	finally:
+		if trajectories is not None:
+			write_pending_rows()
+		if num_workers <= 1:
+			set_rdp_cache(previous_cache)
+		else:
+			pool.terminate()
+		results_output.close()
+
+	return len(pending) - len(failed), failed
+
+
 def main(argv):
 
 	del argv  # argv is not used.
 
+	if FLAGS.sweep:
+		with open(FLAGS.sweep) as grid_file:
+			grid = json.load(grid_file)
+		num_run, failed = run_sweep(grid, FLAGS.output_file, FLAGS.num_workers, FLAGS.rdp_cache, FLAGS.trajectory_dir)
+		print('Ran {} configurations.'.format(num_run))
+		for config, error in failed:
+			print('Failed {}: {}'.format(json.dumps(config, sort_keys=True), error), file=sys.stderr)
+		if failed:
+			sys.exit('{} configurations failed; rerun the sweep to retry them.'.format(len(failed)))
+		return
+
+	for field in CONFIG_FIELDS:
+		if FLAGS[field].value is None:
+			raise app.UsageError('--{} is required without --sweep.'.format(field))
+
 	num_samples = FLAGS.U * FLAGS.sample_ratio
 	num_adversaries = FLAGS.U * FLAGS.adversarial_client_control
 
-	utils.write_header_if_file_empty(FLAGS.output_file)	
+	if FLAGS.rdp_cache:
+		set_rdp_cache(RdpCache(FLAGS.rdp_cache))
+
+	results_output = utils.open_results(FLAGS.output_file)
 
 	#Get privacy guarantees
-	final_epsilon, adversary_observes,epsilon_list = privacy_analysis.get_privacy_adversarial_guarantee(FLAGS.U, num_samples , FLAGS.steps, FLAGS.noise_multiplier, FLAGS.delta, FLAGS.committee_size, num_adversaries)
-	
-	adversary_majority=committee_analysis.get_num_rounds_adversary_majority(FLAGS.steps, num_adversaries, FLAGS.committee_size, FLAGS.U)
+	config = {field: FLAGS[field].value for field in CONFIG_FIELDS}
+	fields = analyze_configuration(config)
+
+	final_epsilon, adversary_observes, adversary_majority = fields[6:9]
 
 	print('DP-SGD with sampling rate = {:.3g}% , noise_multiplier = {}, nodes = {}, committee_size = {}, adversarial_client_control = {}  iterated'
 	    ' over {} steps satisfies'.format(FLAGS.sample_ratio, FLAGS.noise_multiplier, FLAGS.U, FLAGS.committee_size, FLAGS.adversarial_client_control,  FLAGS.steps), end=' ')
@@ -63,10 +240,26 @@ def main(argv):
 	print('The adversary observes rounds = {:.3g} and has a majority in = {}.'.format(
       adversary_observes, adversary_majority))
 	
+	if FLAGS.epsilon_distribution:
+
+		quantiles = [0.5, 0.9, 0.99, 0.999]
+
+		expected_epsilon, epsilon_quantiles, _, _ = privacy_analysis.get_privacy_adversarial_distribution(FLAGS.U, num_samples , FLAGS.steps, FLAGS.noise_multiplier, FLAGS.delta, FLAGS.committee_size, num_adversaries, quantiles)
+
+		print('Expected eps = {:.3g}; quantiles {}.'.format(expected_epsilon, ', '.join(
+		    '{}: {:.3g}'.format(quantile, eps) for quantile, eps in zip(quantiles, epsilon_quantiles))))
+
 	# Write results
-	fields = [FLAGS.U, FLAGS.sample_ratio, FLAGS.adversarial_client_control, FLAGS.committee_size, FLAGS.noise_multiplier,  FLAGS.delta, final_epsilon, adversary_observes, adversary_majority, epsilon_list]
+	config_hash = get_config_hash(config)
+
+	if FLAGS.trajectory_dir:
+		trajectories = utils.TrajectoryStore(FLAGS.trajectory_dir)
+		trajectories.write(config_hash, fields[-1])
+		trajectories.close()
+		fields = fields[:-1] + [config_hash]
 
-	utils.write_output_to_file(FLAGS.output_file, fields)
+	results_output.write(fields, config_hash)
+	results_output.close()
 
 if __name__ == '__main__':
   app.run(main)
@@ -28,35 +28,23 @@ do	case "$o" in
 	esac
 done
 
-> $outputFile
-
-for numRound in $numRounds; do
-	for numUser in $numUsers
-	do
-
-		for sampleRatio in $sampleRatios
-		do
-
-			for adversaryRatio in $adversaryRatios; do
-
-				for sigma in $sigmas; do
-
-					for committeeSize in $committeeSizes; do
-
-						python privacy_assignment_analysis.py -U=$numUser --steps=$numRound --delta=$delta --committee_size=$committeeSize --adversarial_client_control=$adversaryRatio --noise_multiplier=$sigma --sample_ratio=$sampleRatio --output_file=$outputFile						
-
-						# exit
-
-					done
-
-				done
-
-			done
-			
-		done
-
-	done
-done
-
-
-					
\ No newline at end of file
+toList() {
+	echo "[$(echo $1 | sed 's/ /, /g')]"
+}
+
+gridFile=$(mktemp)
+cat > $gridFile <<EOF
+{
+	"U": $(toList "$numUsers"),
+	"sample_ratio": $(toList "$sampleRatios"),
+	"steps": $(toList "$numRounds"),
+	"noise_multiplier": $(toList "$sigmas"),
+	"delta": $delta,
+	"committee_size": $(toList "$committeeSizes"),
+	"adversarial_client_control": $(toList "$adversaryRatios")
+}
+EOF
+
+python privacy_assignment_analysis.py --sweep=$gridFile --output_file=$outputFile --num_workers=$(nproc)
+
+rm -f $gridFile
@@ -0,0 +1,156 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the sweep runner in privacy_assignment_analysis.py."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+
+from absl.testing import absltest
+from absl.testing import parameterized
+
+# The PAL scripts import their siblings as top-level modules.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import privacy_assignment_analysis  # pylint: disable=g-import-not-at-top
+import utils
+
+# 100 and 100.0 are the same number of users, so the grid has four distinct
+# configurations.
+_GRID = {
+    'U': [100, 100.0],
+    'sample_ratio': 0.1,
+    'steps': 5,
+    'noise_multiplier': 1.1,
+    'delta': 1e-5,
+    'committee_size': [5, 7],
+    'adversarial_client_control': [0.1, 0.2],
+}
+
+
+class SweepTest(parameterized.TestCase):
+
+  def setUp(self):
+    super(SweepTest, self).setUp()
+    self.directory = self.create_tempdir().full_path
+
+  def _read(self, output_file):
+    results_output = utils.open_results(output_file)
+    try:
+      return results_output.read()
+    finally:
+      results_output.close()
+
+  def _run_interrupted(self, output_file, trajectory_dir, num_configs):
+    """Runs the sweep until it is interrupted after num_configs results."""
+    analyze_configuration = privacy_assignment_analysis.analyze_configuration
+    calls = []
+
+    def interrupted_analysis(config):
+      if len(calls) == num_configs:
+        raise KeyboardInterrupt()
+      calls.append(config)
+      return analyze_configuration(config)
+
+    privacy_assignment_analysis.analyze_configuration = interrupted_analysis
+    try:
+      with self.assertRaises(KeyboardInterrupt):
+        privacy_assignment_analysis.run_sweep(
+            _GRID, output_file, trajectory_dir=trajectory_dir)
+    finally:
+      privacy_assignment_analysis.analyze_configuration = analyze_configuration
+
+  def test_config_hash(self):
+    config = dict(next(privacy_assignment_analysis.get_grid_configs(_GRID)))
+    config_hash = privacy_assignment_analysis.get_config_hash(config)
+    config['U'] = float(config['U'])
+    self.assertEqual(privacy_assignment_analysis.get_config_hash(config),
+                     config_hash)
+    config['committee_size'] += 1
+    self.assertNotEqual(privacy_assignment_analysis.get_config_hash(config),
+                        config_hash)
+
+  def test_grid_configs(self):
+    configs = list(privacy_assignment_analysis.get_grid_configs(_GRID))
+    self.assertLen(configs, 8)
+    self.assertEqual(
+        sorted(configs[0]), sorted(privacy_assignment_analysis.CONFIG_FIELDS))
+    self.assertLen(
+        set(map(privacy_assignment_analysis.get_config_hash, configs)), 4)
+
+  @parameterized.named_parameters(
+      ('csv', 'results.csv', False, 1),
+      ('result_store', 'results.db', False, 2),
+      ('csv_trajectories', 'results.csv', True, 1),
+      ('result_store_trajectories', 'results.db', True, 2))
+  def test_resume_after_interruption(self, output_name, use_trajectories,
+                                     num_workers):
+    output_file = os.path.join(self.directory, output_name)
+    trajectory_dir = None
+    if use_trajectories:
+      trajectory_dir = os.path.join(self.directory, 'trajectories')
+
+    self._run_interrupted(output_file, trajectory_dir, 2)
+    self.assertLen(self._read(output_file), 2)
+
+    num_run, failed = privacy_assignment_analysis.run_sweep(
+        _GRID, output_file, num_workers, trajectory_dir=trajectory_dir)
+    self.assertEqual((num_run, failed), (2, []))
+
+    results = self._read(output_file)
+    self.assertLen(results, 4)
+    self.assertLen(results.drop_duplicates(utils.CONFIG_COLUMNS), 4)
+    # Columns are in the order of the header.
+    self.assertEqual(sorted(results['committee_size']), [5, 5, 7, 7])
+    self.assertEqual(sorted(results['noise_multiplier']), [1.1] * 4)
+
+    if use_trajectories:
+      trajectories = utils.TrajectoryStore(trajectory_dir)
+      self.assertCountEqual(results['epsilon_list'], trajectories.ids())
+      # One epsilon per round.
+      for trajectory_id in results['epsilon_list']:
+        self.assertLen(trajectories.load(trajectory_id), 5)
+
+    # Everything is done, so a rerun does nothing.
+    self.assertEqual(
+        privacy_assignment_analysis.run_sweep(
+            _GRID, output_file, num_workers, trajectory_dir=trajectory_dir),
+        (0, []))
+    self.assertLen(self._read(output_file), 4)
+
+  def test_failed_configurations_are_retried(self):
+    output_file = os.path.join(self.directory, 'results.db')
+    grid = dict(_GRID, U=[0, 100], committee_size=5,
+                adversarial_client_control=0.1)
+
+    num_run, failed = privacy_assignment_analysis.run_sweep(grid, output_file)
+    self.assertEqual(num_run, 1)
+    self.assertLen(failed, 1)
+    config, error = failed[0]
+    self.assertEqual(config['U'], 0)
+    self.assertStartsWith(error, 'ZeroDivisionError')
+    self.assertLen(self._read(output_file), 1)
+
+    # The failure was not recorded, so the rerun tries it again.
+    num_run, failed = privacy_assignment_analysis.run_sweep(grid, output_file)
+    self.assertEqual(num_run, 0)
+    self.assertLen(failed, 1)
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -18,11 +18,13 @@ from __future__ import division
 from __future__ import print_function
 
 import collections
+import threading
 
 from distutils.version import LooseVersion
 import numpy as np
 import tensorflow as tf
 
+from privacy.analysis import rdp_accountant
 from privacy.analysis import tensor_buffer
 from privacy.dp_query import dp_query
 
@@ -37,23 +39,111 @@ SampleEntry = collections.namedtuple(  # pylint: disable=invalid-name
 GaussianSumQueryEntry = collections.namedtuple(  # pylint: disable=invalid-name
     'GaussianSumQueryEntry', ['l2_norm_bound', 'noise_stddev'])
 
+# RDP orders used by StreamingRdpLedger unless others are given.
+DEFAULT_ORDERS = ([1.25, 1.5, 1.75, 2., 2.25, 2.5, 3., 3.5, 4., 4.5] +
+                  list(range(5, 64)) + [128, 256, 512])
+
+
+class ColumnarLedger(object):
+  """A formatted ledger stored as NumPy columns.
+
+  Sample fields are arrays with one entry per sample, query fields arrays with
+  one entry per query (in sample order). Per-sample quantities such as the
+  effective noise multiplier are computed with segment operations over the
+  queries, without creating Python objects per entry. The ledger can still be
+  used as a sequence of SampleEntries, which are built on access.
+  """
+
+  def __init__(self, sample_array, query_array):
+    """Initializes the ColumnarLedger.
+
+    Args:
+      sample_array: An array of [population_size, selection_probability,
+        num_queries] rows, one per sample.
+      query_array: An array of [sample_index, l2_norm_bound, noise_stddev]
+        rows, one per query, in sample order.
+
+    Raises:
+      ValueError: If the queries do not match the query counts of the
+        samples.
+    """
+    sample_array = np.reshape(sample_array, [-1, 3])
+    query_array = np.reshape(query_array, [-1, 3])
+    self.population_size = sample_array[:, 0]
+    self.selection_probability = sample_array[:, 1]
+    self.num_queries = sample_array[:, 2].astype(np.int64)
+    self.l2_norm_bound = query_array[:, 1]
+    self.noise_stddev = query_array[:, 2]
+
+    self.query_sample = np.repeat(np.arange(len(sample_array)),
+                                  self.num_queries)
+    if not np.array_equal(self.query_sample, query_array[:, 0]):
+      raise ValueError('Queries do not match the query counts of the samples.')
+    self.query_start = np.cumsum(self.num_queries) - self.num_queries
+    self._samples = None
+
+  @property
+  def effective_z(self):
+    """The effective noise multiplier of each sample.
+
+    See https://arxiv.org/pdf/1812.06210.pdf for derivation of this formula.
+    """
+    terms = (self.noise_stddev.astype(np.float64) /
+             self.l2_norm_bound.astype(np.float64))**-2
+    sums = np.zeros(len(self))
+    has_queries = self.num_queries > 0
+    if np.any(has_queries):
+      sums[has_queries] = np.add.reduceat(
+          terms, self.query_start[has_queries])
+    with np.errstate(divide='ignore'):
+      return sums**-0.5
+
+  def __len__(self):
+    return len(self.population_size)
+
+  def __getitem__(self, index):
+    if self._samples is not None:
+      return self._samples[index]
+    if isinstance(index, slice):
+      return [self[i] for i in range(*index.indices(len(self)))]
+    if index < 0:
+      index += len(self)
+    if not 0 <= index < len(self):
+      raise IndexError('ledger index out of range')
+    start = self.query_start[index]
+    end = start + self.num_queries[index]
+    queries = [GaussianSumQueryEntry(*query) for query in zip(
+        self.l2_norm_bound[start:end].tolist(),
+        self.noise_stddev[start:end].tolist())]
+    return SampleEntry(self.population_size[index].item(),
+                       self.selection_probability[index].item(), queries)
+
+  def __iter__(self):
+    if self._samples is not None:
+      return iter(self._samples)
+    return (self[i] for i in range(len(self)))
+
+  @property
+  def samples(self):
+    """The ledger as a list of SampleEntries, built once on first access."""
+    if self._samples is None:
+      l2_norm_bounds = self.l2_norm_bound.tolist()
+      noise_stddevs = self.noise_stddev.tolist()
+      bounds = np.append(self.query_start, len(l2_norm_bounds)).tolist()
+      self._samples = [
+          SampleEntry(population_size, selection_probability, [
+              GaussianSumQueryEntry(*query)
+              for query in zip(l2_norm_bounds[start:end],
+                               noise_stddevs[start:end])])
+          for population_size, selection_probability, start, end in zip(
+              self.population_size.tolist(),
+              self.selection_probability.tolist(), bounds[:-1], bounds[1:])]
+    return self._samples
+
 
 def format_ledger(sample_array, query_array):
   """Converts array representation into a list of SampleEntries."""
-  samples = []
-  query_pos = 0
-  sample_pos = 0
-  for sample in sample_array:
-    population_size, selection_probability, num_queries = sample
-    queries = []
-    for _ in range(int(num_queries)):
-      query = query_array[query_pos]
-      assert int(query[0]) == sample_pos
-      queries.append(GaussianSumQueryEntry(*query[1:]))
-      query_pos += 1
-    samples.append(SampleEntry(population_size, selection_probability, queries))
-    sample_pos += 1
-  return samples
+  return ColumnarLedger(sample_array, query_array).samples
 
 
 class PrivacyLedger(object):
@@ -67,7 +157,8 @@ class PrivacyLedger(object):
                population_size,
                selection_probability=None,
                max_samples=None,
-               max_queries=None):
+               max_queries=None,
+               num_samples=None):
     """Initialize the PrivacyLedger.
 
     Args:
@@ -79,6 +170,11 @@ class PrivacyLedger(object):
         than this many samples are recorded.
       max_queries: The maximum number of queries. An exception is thrown if more
         than this many queries are recorded.
+      num_samples: The expected number of samples, e.g. the known number of
+        training steps. If given, samples and queries are recorded in
+        SegmentedTensorBuffers with this capacity hint instead of in
+        TensorBuffers of max_samples and max_queries entries. Queries past the
+        hint (several per sample) go to the overflow of the query buffer.
     """
     self._population_size = population_size
     self._selection_probability = selection_probability
@@ -87,15 +183,19 @@ class PrivacyLedger(object):
     if max_queries is None:
       max_queries = 1000 * population_size
 
+    if num_samples is None:
+      make_buffer = tensor_buffer.TensorBuffer
+    else:
+      max_samples = max_queries = num_samples
+      make_buffer = tensor_buffer.SegmentedTensorBuffer
+
     # The query buffer stores rows corresponding to GaussianSumQueryEntries.
-    self._query_buffer = tensor_buffer.TensorBuffer(max_queries, [3],
-                                                    tf.float32, 'query')
+    self._query_buffer = make_buffer(max_queries, [3], tf.float32, 'query')
     self._sample_var = tf.Variable(
         initial_value=tf.zeros([3]), trainable=False, name='sample')
 
     # The sample buffer stores rows corresponding to SampleEntries.
-    self._sample_buffer = tensor_buffer.TensorBuffer(max_samples, [3],
-                                                     tf.float32, 'sample')
+    self._sample_buffer = make_buffer(max_samples, [3], tf.float32, 'sample')
     self._sample_count = tf.Variable(
         initial_value=0.0, trainable=False, name='sample_count')
     self._query_count = tf.Variable(
@@ -168,11 +268,383 @@ class PrivacyLedger(object):
 
     return format_ledger(sample_array, query_array)
 
+  def get_columnar_ledger(self, sess):
+    """Gets the query ledger as a ColumnarLedger.
+
+    Args:
+      sess: The tensorflow session in which the ledger was created.
+
+    Returns:
+      The query ledger as a ColumnarLedger.
+    """
+    sample_array = sess.run(self._sample_buffer.values)
+    query_array = sess.run(self._query_buffer.values)
+
+    return ColumnarLedger(sample_array, query_array)
+
+  def get_columnar_ledger_eager(self):
+    """Gets the query ledger as a ColumnarLedger.
+
+    Returns:
+      The query ledger as a ColumnarLedger.
+    """
+    sample_array = self._sample_buffer.values.numpy()
+    query_array = self._query_buffer.values.numpy()
+
+    return ColumnarLedger(sample_array, query_array)
+
+  def set_sample_size(self, batch_size):
+    self._selection_probability = tf.cast(batch_size,
+                                          tf.float32) / self._population_size
+
+
+class HostPrivacyLedger(object):
+  """A PrivacyLedger that keeps its records in host memory.
+
+  Records are appended through tf.numpy_function calls (or directly in eager
+  mode) to NumPy arrays, instead of through TensorBuffers serialized by a
+  CriticalSection. Storage is run-length encoded: each distinct
+  (l2_norm_bound, noise_stddev) pair and each distinct list of queries of a
+  sample are stored once, and consecutive samples with the same population
+  size, selection probability and queries are stored as one run. Memory grows
+  with the number of distinct configurations rather than with the number of
+  steps. The queries of a sample are kept sorted, so the order in which they
+  arrive does not matter, and NestedQuery records all the queries of its
+  subqueries with one record_sum_queries op.
+
+  It can be used in place of a PrivacyLedger.
+  """
+
+  _QUERY_DTYPE = np.dtype([('l2_norm_bound', np.float64),
+                           ('noise_stddev', np.float64)])
+  _RUN_DTYPE = np.dtype([('population_size', np.float64),
+                         ('selection_probability', np.float64),
+                         ('query_list', np.int64),
+                         ('count', np.int64)])
+
+  def __init__(self,
+               population_size,
+               selection_probability=None,
+               initial_capacity=64):
+    """Initialize the HostPrivacyLedger.
+
+    Args:
+      population_size: An integer (may be variable) specifying the size of the
+        population, i.e. size of the training data used in each epoch.
+      selection_probability: A float (may be variable) specifying the
+        probability each record is included in a sample.
+      initial_capacity: The number of distinct queries and of sample runs
+        preallocated; both arrays double when full.
+    """
+    self._population_size = population_size
+    self._selection_probability = selection_probability
+    self._lock = threading.Lock()
+
+    self._queries = np.zeros(initial_capacity, dtype=self._QUERY_DTYPE)
+    self._query_ids = {}
+    self._query_lists = []
+    self._query_list_ids = {}
+    self._runs = np.zeros(initial_capacity, dtype=self._RUN_DTYPE)
+    self._num_runs = 0
+    self._pending_queries = []
+
+  def _host_record_sum_queries(self, l2_norm_bounds, noise_stddevs):
+    """Records queries of the current sample."""
+    l2_norm_bounds = np.atleast_1d(l2_norm_bounds).tolist()
+    noise_stddevs = np.atleast_1d(noise_stddevs).tolist()
+    with self._lock:
+      for query in zip(l2_norm_bounds, noise_stddevs):
+        query_id = self._query_ids.get(query)
+        if query_id is None:
+          query_id = len(self._query_ids)
+          if query_id == len(self._queries):
+            self._queries = np.resize(self._queries, 2 * len(self._queries))
+          self._queries[query_id] = query
+          self._query_ids[query] = query_id
+        self._pending_queries.append(query_id)
+      return np.int64(len(self._pending_queries))
+
+  def _host_finalize_sample(self, population_size, selection_probability):
+    """Closes the current sample."""
+    with self._lock:
+      # Queries recorded by separate ops may arrive in any order, so the
+      # list is sorted to encode the same queries the same way.
+      query_list = tuple(sorted(self._pending_queries))
+      self._pending_queries = []
+      query_list_id = self._query_list_ids.get(query_list)
+      if query_list_id is None:
+        query_list_id = len(self._query_lists)
+        self._query_lists.append(query_list)
+        self._query_list_ids[query_list] = query_list_id
+
+      population_size = float(population_size)
+      selection_probability = float(selection_probability)
+      if self._num_runs:
+        last = self._runs[self._num_runs - 1]
+        if (last['population_size'] == population_size and
+            last['selection_probability'] == selection_probability and
+            last['query_list'] == query_list_id):
+          last['count'] += 1
+          return np.int64(self._num_runs)
+
+      if self._num_runs == len(self._runs):
+        self._runs = np.resize(self._runs, 2 * len(self._runs))
+      self._runs[self._num_runs] = (population_size, selection_probability,
+                                    query_list_id, 1)
+      self._num_runs += 1
+      return np.int64(self._num_runs)
+
+  def record_sum_query(self, l2_norm_bound, noise_stddev):
+    """Records that a query was issued.
+
+    Args:
+      l2_norm_bound: The maximum l2 norm of the tensor group in the query.
+      noise_stddev: The standard deviation of the noise applied to the sum.
+
+    Returns:
+      An operation recording the sum query to the ledger.
+    """
+    return self.record_sum_queries(l2_norm_bound, noise_stddev)
+
+  def record_sum_queries(self, l2_norm_bounds, noise_stddevs):
+    """Records several queries of the current sample at once.
+
+    Args:
+      l2_norm_bounds: A vector of the maximum l2 norms of the queries.
+      noise_stddevs: A vector of the standard deviations of their noise.
+
+    Returns:
+      An operation recording the sum queries to the ledger.
+    """
+    return _numpy_function(
+        self._host_record_sum_queries,
+        [tf.cast(l2_norm_bounds, tf.float64),
+         tf.cast(noise_stddevs, tf.float64)], tf.int64)
+
+  def finalize_sample(self):
+    """Finalizes sample and records sample ledger entry."""
+    return _numpy_function(
+        self._host_finalize_sample,
+        [tf.cast(self._population_size, tf.float64),
+         tf.cast(self._selection_probability, tf.float64)], tf.int64)
+
+  def get_sample_runs(self):
+    """Gets the run-length encoded ledger.
+
+    Returns:
+      A structured array of sample runs, with fields population_size,
+      selection_probability, query_list and count; a structured array of the
+      distinct queries, with fields l2_norm_bound and noise_stddev; and a list
+      with, for every query_list id, the tuple of query ids of the samples.
+    """
+    with self._lock:
+      return (self._runs[:self._num_runs].copy(),
+              self._queries[:len(self._query_ids)].copy(),
+              list(self._query_lists))
+
+  def get_unformatted_ledger(self):
+    """Gets the ledger as sample and query arrays, like PrivacyLedger."""
+    runs, queries, query_lists = self.get_sample_runs()
+    counts = runs['count']
+    list_lengths = np.array([len(query_lists[i]) for i in runs['query_list']],
+                            dtype=np.int64)
+    num_queries = np.repeat(list_lengths, counts)
+    sample_array = np.stack([
+        np.repeat(runs['population_size'], counts),
+        np.repeat(runs['selection_probability'], counts),
+        num_queries], axis=1)
+
+    query_ids = np.concatenate([np.zeros(0, dtype=np.int64)] + [
+        np.tile(np.array(query_lists[query_list], dtype=np.int64), count)
+        for query_list, count in zip(runs['query_list'], counts)])
+    query_array = np.stack([
+        np.repeat(np.arange(len(num_queries)), num_queries),
+        queries['l2_norm_bound'][query_ids],
+        queries['noise_stddev'][query_ids]], axis=1)
+    return sample_array, query_array
+
+  def get_columnar_ledger(self, sess=None):
+    """Gets the query ledger as a ColumnarLedger."""
+    del sess
+    return ColumnarLedger(*self.get_unformatted_ledger())
+
+  def get_columnar_ledger_eager(self):
+    return self.get_columnar_ledger()
+
+  def get_formatted_ledger(self, sess=None):
+    """Gets the formatted query ledger.
+
+    Args:
+      sess: Unused; the records are already on the host.
+
+    Returns:
+      The query ledger as a list of SampleEntries.
+    """
+    return self.get_columnar_ledger(sess).samples
+
+  def get_formatted_ledger_eager(self):
+    """Gets the formatted query ledger.
+
+    Returns:
+      The query ledger as a list of SampleEntries.
+    """
+    return self.get_formatted_ledger()
+
   def set_sample_size(self, batch_size):
     self._selection_probability = tf.cast(batch_size,
                                           tf.float32) / self._population_size
 
 
+class StreamingRdpLedger(object):
+  """A privacy ledger that keeps only the running RDP of the samples.
+
+  Instead of recording every sample and query for compute_rdp_from_ledger,
+  finalize_sample converts the queries of the current sample into their
+  effective noise multiplier (see compute_rdp_from_ledger) and adds the RDP of
+  one step of the sampled Gaussian mechanism to a running total. The RDP of
+  each distinct (selection_probability, effective noise) pair is computed once
+  and looked up afterwards, in an LRU of at most max_cached_mechanisms pairs,
+  so memory does not grow with the number of steps and the privacy spent so
+  far can be queried at any time in O(orders).
+
+  The accounting runs on the host, through numpy_function ops, so that it is
+  exactly that of compute_rdp_from_ledger.
+
+  It can be used in place of a PrivacyLedger wherever the ledger itself is not
+  needed.
+  """
+
+  def __init__(self, population_size, selection_probability=None,
+               orders=None, max_cached_mechanisms=2**10):
+    """Initialize the StreamingRdpLedger.
+
+    Args:
+      population_size: An integer (may be variable) specifying the size of the
+        population, i.e. size of the training data used in each epoch.
+      selection_probability: A float (may be variable) specifying the
+        probability each record is included in a sample.
+      orders: An array of RDP orders. Defaults to DEFAULT_ORDERS.
+      max_cached_mechanisms: The maximum number of (selection_probability,
+        effective noise) pairs whose RDP is kept.
+    """
+    self._population_size = population_size
+    self._selection_probability = selection_probability
+    self._accountant = rdp_accountant.RdpAccountant(
+        DEFAULT_ORDERS if orders is None else orders, max_cached_mechanisms)
+    self._lock = threading.Lock()
+    # Sum of (noise_stddev / l2_norm_bound)**-2 over the current sample.
+    self._pending_terms = 0.0
+    self._num_empty_samples = 0
+
+  def precompute(self, mechanisms):
+    """Fills the RDP lookup ahead of training.
+
+    Args:
+      mechanisms: An iterable of (selection_probability, effective noise
+        multiplier) pairs. They must be the exact values seen by
+        finalize_sample to be hit, e.g. selection probabilities rounded to
+        float32 if they are given as float32 tensors.
+    """
+    with self._lock:
+      for q, noise_multiplier in mechanisms:
+        self._accountant.mechanism_rdp(float(q), float(noise_multiplier))
+
+  def _host_record_sum_queries(self, l2_norm_bounds, noise_stddevs):
+    """Adds queries to the current sample."""
+    terms = (np.atleast_1d(noise_stddevs) / np.atleast_1d(l2_norm_bounds))**-2
+    with self._lock:
+      self._pending_terms += float(np.sum(terms))
+      return np.int64(self._accountant.steps)
+
+  def _host_finalize_sample(self, population_size, selection_probability):
+    """Composes the current sample into the running RDP."""
+    del population_size
+    with self._lock:
+      terms, self._pending_terms = self._pending_terms, 0.0
+      if terms:
+        self._accountant.step(float(selection_probability), terms**-0.5)
+      else:
+        # A sample without queries releases nothing.
+        self._num_empty_samples += 1
+      return np.int64(self._accountant.steps)
+
+  def record_sum_query(self, l2_norm_bound, noise_stddev):
+    """Records that a query was issued.
+
+    Args:
+      l2_norm_bound: The maximum l2 norm of the tensor group in the query.
+      noise_stddev: The standard deviation of the noise applied to the sum.
+
+    Returns:
+      An operation recording the sum query to the ledger.
+    """
+    return self.record_sum_queries(l2_norm_bound, noise_stddev)
+
+  def record_sum_queries(self, l2_norm_bounds, noise_stddevs):
+    """Records several queries of the current sample at once.
+
+    Args:
+      l2_norm_bounds: A vector of the maximum l2 norms of the queries.
+      noise_stddevs: A vector of the standard deviations of their noise.
+
+    Returns:
+      An operation recording the sum queries to the ledger.
+    """
+    return _numpy_function(
+        self._host_record_sum_queries,
+        [tf.cast(l2_norm_bounds, tf.float64),
+         tf.cast(noise_stddevs, tf.float64)], tf.int64)
+
+  def finalize_sample(self):
+    """Finalizes sample and adds its RDP to the running total."""
+    return _numpy_function(
+        self._host_finalize_sample,
+        [tf.cast(self._population_size, tf.float64),
+         tf.cast(self._selection_probability, tf.float64)], tf.int64)
+
+  def get_privacy_spent(self, target_eps=None, target_delta=None):
+    """Returns eps, delta, opt_order of the samples so far.
+
+    See rdp_accountant.get_privacy_spent for the meaning of the arguments.
+    """
+    with self._lock:
+      return self._accountant.get_privacy_spent(target_eps, target_delta)
+
+  def epsilon(self, delta):
+    """Returns the epsilon of the samples so far for the given delta."""
+    with self._lock:
+      return self._accountant.epsilon(delta)
+
+  @property
+  def orders(self):
+    return self._accountant.orders
+
+  @property
+  def rdp(self):
+    """Returns a copy of the accumulated RDP at all orders."""
+    with self._lock:
+      return self._accountant.rdp
+
+  @property
+  def num_samples(self):
+    """Returns the number of samples finalized so far."""
+    with self._lock:
+      return self._accountant.steps + self._num_empty_samples
+
+  def set_sample_size(self, batch_size):
+    self._selection_probability = tf.cast(batch_size,
+                                          tf.float32) / self._population_size
+
+
+def _numpy_function(func, inp, tout):
+  """Runs func on the host, as an op in graph mode and directly in eager."""
+  try:
+    return tf.numpy_function(func, inp, tout)
+  except AttributeError:
+    # Older versions of TF
+    return tf.py_func(func, inp, tout)
+
+
 class DummyLedger(object):
   """A ledger that records nothing.
 
@@ -18,9 +18,11 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import numpy as np
 import tensorflow as tf
 
 from privacy.analysis import privacy_ledger
+from privacy.analysis import rdp_accountant
 from privacy.dp_query import gaussian_query
 from privacy.dp_query import nested_query
 from privacy.dp_query import test_utils
@@ -45,6 +47,21 @@ class PrivacyLedgerTest(tf.test.TestCase):
     self.assertAllClose(sample.selection_probability, 0.1)
     self.assertAllClose(sorted(sample.queries), sorted(expected_queries))
 
+  def test_segmented_buffers(self):
+    ledger = privacy_ledger.PrivacyLedger(10, 0.1, num_samples=2)
+    for i in range(3):
+      ledger.record_sum_query(5.0, 1.0 + i)
+      ledger.record_sum_query(2.0, 0.5)
+      ledger.finalize_sample()
+
+    formatted = ledger.get_formatted_ledger_eager()
+    self.assertLen(formatted, 3)
+    for i, sample in enumerate(formatted):
+      self.assertAllClose(sample.population_size, 10.0)
+      self.assertAllClose(sample.selection_probability, 0.1)
+      self.assertAllClose(sorted(sample.queries),
+                          sorted([[5.0, 1.0 + i], [2.0, 0.5]]))
+
   def test_sum_query(self):
     record1 = tf.constant([2.0, 0.0])
     record2 = tf.constant([-1.0, 1.0])
@@ -129,6 +146,133 @@ class PrivacyLedgerTest(tf.test.TestCase):
     self.assertAllClose(sample_2.selection_probability, 0.2)
     self.assertAllClose(sorted(sample_2.queries), sorted(expected_queries))
 
+  def test_columnar_ledger(self):
+    sample_array = [[10.0, 0.1, 2.0], [10.0, 0.2, 0.0], [10.0, 0.1, 1.0]]
+    query_array = [[0.0, 5.0, 1.0], [0.0, 2.0, 0.5], [2.0, 1.0, 3.0]]
+    ledger = privacy_ledger.ColumnarLedger(sample_array, query_array)
+
+    self.assertAllEqual(ledger.num_queries, [2, 0, 1])
+    self.assertAllClose(ledger.effective_z,
+                        [(5.0**2 + 4.0**2)**-0.5, np.inf, 3.0])
+    self.assertEqual(list(ledger), ledger.samples)
+    self.assertEqual(
+        ledger.samples,
+        privacy_ledger.format_ledger(sample_array, query_array))
+    self.assertEqual(ledger[0].queries, [
+        privacy_ledger.GaussianSumQueryEntry(5.0, 1.0),
+        privacy_ledger.GaussianSumQueryEntry(2.0, 0.5)])
+
+    with self.assertRaises(ValueError):
+      privacy_ledger.ColumnarLedger(sample_array, query_array[1:])
+
+  def test_host_ledger(self):
+    ledger = privacy_ledger.HostPrivacyLedger(10, 0.1, initial_capacity=1)
+    ledger.record_sum_query(5.0, 1.0)
+    ledger.record_sum_query(2.0, 0.5)
+    ledger.finalize_sample()
+    for _ in range(3):
+      ledger.record_sum_queries([5.0, 2.0], [1.0, 0.5])
+      ledger.finalize_sample()
+    ledger.record_sum_query(3.0, 1.0)
+    ledger.finalize_sample()
+
+    runs, queries, query_lists = ledger.get_sample_runs()
+    self.assertAllEqual(runs['count'], [4, 1])
+    self.assertAllEqual(queries['l2_norm_bound'], [5.0, 2.0, 3.0])
+    self.assertEqual(query_lists, [(0, 1), (2,)])
+
+    formatted = ledger.get_formatted_ledger_eager()
+    self.assertLen(formatted, 5)
+    for sample in formatted[:4]:
+      self.assertEqual(sample.population_size, 10)
+      self.assertAllClose(sample.selection_probability, 0.1)
+      self.assertEqual(sample.queries, [
+          privacy_ledger.GaussianSumQueryEntry(5.0, 1.0),
+          privacy_ledger.GaussianSumQueryEntry(2.0, 0.5)])
+    self.assertEqual(formatted[4].queries,
+                     [privacy_ledger.GaussianSumQueryEntry(3.0, 1.0)])
+
+  def test_host_ledger_encodes_query_permutations_once(self):
+    ledger = privacy_ledger.HostPrivacyLedger(10, 0.1)
+    ledger.record_sum_queries([5.0, 2.0], [1.0, 0.5])
+    ledger.finalize_sample()
+    ledger.record_sum_queries([2.0, 5.0], [0.5, 1.0])
+    ledger.finalize_sample()
+
+    runs, _, query_lists = ledger.get_sample_runs()
+    self.assertAllEqual(runs['count'], [2])
+    self.assertEqual(query_lists, [(0, 1)])
+
+  def test_nested_query_batches_host_ledger(self):
+    ledger = privacy_ledger.HostPrivacyLedger(10, 0.1)
+    batches = []
+    record_sum_queries = ledger.record_sum_queries
+
+    def counting_record_sum_queries(l2_norm_bounds, noise_stddevs):
+      batches.append(len(l2_norm_bounds))
+      return record_sum_queries(l2_norm_bounds, noise_stddevs)
+
+    ledger.record_sum_queries = counting_record_sum_queries
+
+    query1 = gaussian_query.GaussianSumQuery(4.0, 2.0, ledger=ledger)
+    query2 = gaussian_query.GaussianAverageQuery(
+        l2_norm_clip=5.0, sum_stddev=1.0, denominator=5.0, ledger=ledger)
+    query = nested_query.NestedQuery([query1, query2])
+    query = privacy_ledger.QueryWithLedger(query, ledger)
+    test_utils.run_query(query, [[1.0, [12.0, 9.0]], [5.0, [1.0, 2.0]]])
+
+    self.assertEqual(batches, [2])
+    formatted = ledger.get_formatted_ledger_eager()
+    self.assertLen(formatted, 1)
+    self.assertAllClose(formatted[0].queries, [[4.0, 2.0], [5.0, 1.0]])
+
+  def test_streaming_rdp_ledger(self):
+    orders = [2.0, 8.0, 32.0]
+    ledger = privacy_ledger.StreamingRdpLedger(10, 0.1, orders)
+    ledger.precompute([(np.float32(0.1), 2.0)])
+    ledger.record_sum_query(5.0, 1.0)
+    ledger.record_sum_query(2.0, 0.5)
+    ledger.finalize_sample()
+    ledger.finalize_sample()
+    for _ in range(3):
+      ledger.record_sum_queries([1.0], [2.0])
+      ledger.finalize_sample()
+
+    # The sample without queries adds no RDP.
+    samples = [
+        privacy_ledger.SampleEntry(10, np.float32(0.1), [
+            privacy_ledger.GaussianSumQueryEntry(5.0, 1.0),
+            privacy_ledger.GaussianSumQueryEntry(2.0, 0.5)])
+    ] + 3 * [
+        privacy_ledger.SampleEntry(
+            10, np.float32(0.1),
+            [privacy_ledger.GaussianSumQueryEntry(1.0, 2.0)])
+    ]
+    expected_rdp = rdp_accountant.compute_rdp_from_ledger(samples, orders)
+    self.assertEqual(ledger.num_samples, 5)
+    self.assertAllClose(ledger.rdp, expected_rdp)
+    self.assertAllClose(
+        ledger.get_privacy_spent(target_delta=1e-5),
+        rdp_accountant.get_privacy_spent(orders, expected_rdp,
+                                         target_delta=1e-5))
+
+  def test_streaming_rdp_ledger_changing_noise(self):
+    # Every sample has its own effective noise, so the cache keeps evicting.
+    orders = [2.0, 8.0, 32.0]
+    ledger = privacy_ledger.StreamingRdpLedger(
+        10, 0.1, orders, max_cached_mechanisms=1)
+    samples = []
+    for noise_stddev in [1.0, 2.0, 1.0, 3.0]:
+      ledger.record_sum_query(1.0, noise_stddev)
+      ledger.finalize_sample()
+      samples.append(privacy_ledger.SampleEntry(
+          10, np.float32(0.1),
+          [privacy_ledger.GaussianSumQueryEntry(1.0, noise_stddev)]))
+
+    self.assertEqual(ledger.num_samples, 4)
+    self.assertAllClose(ledger.rdp,
+                        rdp_accountant.compute_rdp_from_ledger(samples, orders))
+
 
 if __name__ == '__main__':
   tf.test.main()
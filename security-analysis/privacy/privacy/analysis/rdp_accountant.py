@@ -15,12 +15,20 @@
 """RDP analysis of the Sampled Gaussian Mechanism.
 
 Functionality for computing Renyi differential privacy (RDP) of an additive
-Sampled Gaussian Mechanism (SGM). Its public interface consists of two methods:
+Sampled Gaussian Mechanism (SGM). Its main public methods are:
   compute_rdp(q, noise_multiplier, T, orders) computes RDP for SGM iterated
                                    T times.
+  compute_rdp_grid(qs, noise_multipliers, T, orders) computes the same RDP
+                                   for every pair on a grid of sampling rates
+                                   and noise multipliers.
   get_privacy_spent(orders, rdp, target_eps, target_delta) computes delta
                                    (or eps) given RDP at multiple orders and
                                    a target value for eps (or delta).
+  epsilon_trajectory(q, noise_multiplier, T, orders, delta) computes eps after
+                                   each of T rounds of a fixed SGM at once.
+  schedule_epsilon_trajectory(mechanisms, schedule, orders, delta) does the
+                                   same for rounds that switch between a few
+                                   (q, noise_multiplier) mechanisms.
 
 Example use:
 
@@ -40,7 +48,13 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
+import itertools
 import math
+import operator
+import os
+import sqlite3
+import struct
 import sys
 
 import numpy as np
@@ -77,6 +91,16 @@ def _log_sub(logx, logy):
     return logx
 
 
+def _log_sum_exp(logx, axis=-1):
+  """Sum numbers in the log space along an axis of an array."""
+  logx = np.asarray(logx, dtype=float)
+  m = np.max(logx, axis=axis, keepdims=True)
+  m = np.where(np.isfinite(m), m, 0.)  # Rows that are all -inf (or hold inf).
+  with np.errstate(divide='ignore'):
+    s = np.log(np.sum(np.exp(logx - m), axis=axis))
+  return s + np.squeeze(m, axis=axis)
+
+
 def _log_print(logx):
   """Pretty print."""
   if logx < math.log(sys.float_info.max):
@@ -103,6 +127,61 @@ def _compute_log_a_int(q, sigma, alpha):
   return float(log_a)
 
 
+# Upper bound on the number of log-terms materialized at once by the grid kernel.
+_GRID_CHUNK_TERMS = 2**22
+
+
+def _compute_log_a_int_grid(qs, sigmas, alphas):
+  """Compute log(A_alpha) over a grid of rates, noises and integer alphas.
+
+  Vectorized equivalent of _compute_log_a_int. The binomial expansion of every
+  order is laid out as one row of a [len(alphas), max(alphas) + 1] matrix of
+  log-terms and each row is reduced with a single log-sum-exp. The
+  log-binomials (from a gammaln factorial table) are shared by the whole grid,
+  and the q-dependent part of every row is shared by all noise multipliers.
+  Entries with i > alpha are masked out as log(0).
+
+  Args:
+    qs: An array of sampling rates, each 0 < q < 1.
+    sigmas: An array of noise multipliers.
+    alphas: An array of integer orders.
+
+  Returns:
+    An array of shape [len(qs), len(sigmas), len(alphas)].
+  """
+  qs = np.atleast_1d(np.asarray(qs, dtype=float))
+  sigmas = np.atleast_1d(np.asarray(sigmas, dtype=float))
+  alphas = np.atleast_1d(np.asarray(alphas, dtype=np.int64))
+  log_a = np.empty((len(qs), len(sigmas), len(alphas)))
+  if not log_a.size:
+    return log_a
+
+  i = np.arange(alphas.max() + 1)
+  a = alphas[:, np.newaxis]
+
+  # log(n!) for n = 0..max(alphas), looked up instead of re-evaluated per term.
+  log_fact = special.gammaln(i + 1)
+  log_binom = np.where(
+      i <= a, log_fact[a] - log_fact[i] - log_fact[np.maximum(a - i, 0)],
+      -np.inf)
+  half_i_sq = (i * i - i) / 2.
+
+  chunk = max(1, _GRID_CHUNK_TERMS // log_binom.size)
+  for q_idx, q in enumerate(qs):
+    log_coef = log_binom + i * math.log(q) + (a - i) * math.log1p(-q)
+    for start in range(0, len(sigmas), chunk):
+      var = sigmas[start:start + chunk, np.newaxis, np.newaxis]**2
+      log_terms = log_coef + half_i_sq / var
+      log_a[q_idx, start:start + chunk] = _log_sum_exp(log_terms, axis=-1)
+
+  return log_a
+
+
+def _compute_log_a_int_vec(q, sigma, alphas):
+  """Compute log(A_alpha) for a vector of integer alphas. 0 < q < 1."""
+  return _compute_log_a_int_grid(q, sigma, alphas)[0, 0]
+
+
 def _compute_log_a_frac(q, sigma, alpha):
   """Compute log(A_alpha) for fractional alpha. 0 < q < 1."""
   # The two parts of A_alpha, integrals over (-inf,z0] and [z0, +inf), are
@@ -140,6 +219,82 @@ def _compute_log_a_frac(q, sigma, alpha):
   return _log_add(log_a0, log_a1)
 
 
+# Number of series terms evaluated per vectorized step by the fractional kernel.
+_FRAC_CHUNK_TERMS = 64
+
+
+def _compute_log_a_frac_grid(qs, sigmas, alpha):
+  """Compute log(A_alpha) over a grid of rates and noises for fractional alpha.
+
+  Vectorized equivalent of _compute_log_a_frac. The series of every
+  (q, sigma) pair is evaluated _FRAC_CHUNK_TERMS terms at a time, and each
+  pair stops after the same term as the scalar loop. Positive and negative
+  terms are summed separately in the log space and subtracted at the end.
+
+  Args:
+    qs: An array of sampling rates, each 0 < q < 1.
+    sigmas: An array of noise multipliers.
+    alpha: A fractional order.
+
+  Returns:
+    An array of shape [len(qs), len(sigmas)].
+  """
+  qs = np.atleast_1d(np.asarray(qs, dtype=float))
+  sigmas = np.atleast_1d(np.asarray(sigmas, dtype=float))
+  q, sigma = [arg.ravel() for arg in np.meshgrid(qs, sigmas, indexing='ij')]
+
+  log_q, log_1mq = np.log(q), np.log1p(-q)
+  var = sigma**2
+  z0 = var * np.log(1 / q - 1) + .5
+  scale = math.sqrt(2) * sigma
+
+  # Log-sums of the positive and negative terms of both parts of A_alpha.
+  log_pos = np.full((2, len(q)), -np.inf)
+  log_neg = np.full((2, len(q)), -np.inf)
+
+  active = np.arange(len(q))
+  start = 0
+  while active.size:
+    i = np.arange(start, start + _FRAC_CHUNK_TERMS, dtype=float)
+    coef = special.binom(alpha, i)
+    log_coef = np.log(np.abs(coef))
+    j = alpha - i
+
+    a_log_q, a_log_1mq = log_q[active, None], log_1mq[active, None]
+    a_var, a_z0 = var[active, None], z0[active, None]
+    a_scale = scale[active, None]
+
+    log_t0 = log_coef + i * a_log_q + j * a_log_1mq
+    log_t1 = log_coef + j * a_log_q + i * a_log_1mq
+
+    log_e0 = math.log(.5) + _log_erfc_vec((i - a_z0) / a_scale)
+    log_e1 = math.log(.5) + _log_erfc_vec((a_z0 - j) / a_scale)
+
+    log_s = np.stack([log_t0 + (i * i - i) / (2 * a_var) + log_e0,
+                      log_t1 + (j * j - j) / (2 * a_var) + log_e1])
+
+    # Every pair keeps its terms up to and including the first one below the
+    # cutoff.
+    small = np.max(log_s, axis=0) < -30
+    done = np.any(small, axis=1)
+    last = np.where(done, np.argmax(small, axis=1), _FRAC_CHUNK_TERMS - 1)
+    keep = np.arange(_FRAC_CHUNK_TERMS) <= last[:, None]
+
+    positive = keep & (coef > 0)
+    negative = keep & (coef < 0)
+    log_pos[:, active] = np.logaddexp(
+        log_pos[:, active], _log_sum_exp(np.where(positive, log_s, -np.inf)))
+    log_neg[:, active] = np.logaddexp(
+        log_neg[:, active], _log_sum_exp(np.where(negative, log_s, -np.inf)))
+
+    active = active[~done]
+    start += _FRAC_CHUNK_TERMS
+
+  with np.errstate(divide='ignore'):
+    log_parts = log_pos + np.log(-np.expm1(log_neg - log_pos))
+  return np.logaddexp(*log_parts).reshape(len(qs), len(sigmas))
+
+
 def _compute_log_a(q, sigma, alpha):
   """Compute log(A_alpha) for any positive finite alpha."""
   if float(alpha).is_integer():
@@ -166,6 +321,11 @@ def _log_erfc(x):
       return math.log(r)
 
 
+def _log_erfc_vec(x):
+  """Compute log(erfc(x)) elementwise with high accuracy for large x."""
+  return math.log(2) + special.log_ndtr(-x * 2**.5)
+
+
 def _compute_delta(orders, rdp, eps):
   """Compute delta given a list of RDP values and target epsilon.
 
@@ -242,6 +402,231 @@ def _compute_rdp(q, sigma, alpha):
   return _compute_log_a(q, sigma, alpha) / (alpha - 1)
 
 
+def _compute_rdp_grid(qs, sigmas, orders):
+  """Compute RDP of the Sampled Gaussian mechanism over a parameter grid.
+
+  All finite integer orders of all interior (0 < q < 1) rates are evaluated in
+  one pass of _compute_log_a_int_grid, and every fractional order in one pass
+  of _compute_log_a_frac_grid.
+
+  Args:
+    qs: An array of sampling rates.
+    sigmas: An array of noise multipliers.
+    orders: An array of orders at which RDP is computed.
+
+  Returns:
+    RDP of shape [len(qs), len(sigmas), len(orders)], can be np.inf.
+  """
+  qs = np.atleast_1d(np.asarray(qs, dtype=float))
+  sigmas = np.atleast_1d(np.asarray(sigmas, dtype=float))
+  orders_vec = np.atleast_1d(np.asarray(orders, dtype=float))
+  rdp = np.empty((len(qs), len(sigmas), len(orders_vec)))
+
+  rdp[qs == 0] = 0
+  rdp[qs == 1.] = orders_vec / (2 * sigmas[:, np.newaxis]**2)
+
+  interior = np.flatnonzero((qs != 0) & (qs != 1.))
+  if not interior.size:
+    return rdp
+
+  is_int = np.isfinite(orders_vec) & (orders_vec == np.floor(orders_vec))
+  if np.any(is_int):
+    int_orders = orders_vec[is_int]
+    log_a = _compute_log_a_int_grid(qs[interior], sigmas, int_orders)
+    rdp[np.ix_(interior, np.arange(len(sigmas)), np.flatnonzero(is_int))] = (
+        log_a / (int_orders - 1))
+  for order_idx in np.flatnonzero(~is_int):
+    alpha = orders_vec[order_idx]
+    if np.isinf(alpha):
+      rdp[interior, :, order_idx] = np.inf
+    else:
+      rdp[interior, :, order_idx] = (
+          _compute_log_a_frac_grid(qs[interior], sigmas, alpha) / (alpha - 1))
+
+  return rdp
+
+
+def _compute_rdp_vec(q, sigma, orders):
+  """Compute RDP of the Sampled Gaussian mechanism at a vector of orders."""
+  return _compute_rdp_grid(q, sigma, orders)[0, 0]
+
+
+#############
+# RDP CACHE #
+#############
+
+CacheStats = collections.namedtuple(  # pylint: disable=invalid-name
+    'CacheStats', ['hits', 'misses', 'memory_hits', 'disk_hits'])
+
+
+def _float_bits(x):
+  """Returns the IEEE-754 bit pattern of a float as a signed 64-bit integer."""
+  return struct.unpack('<q', struct.pack('<d', float(x)))[0]
+
+
+class RdpCache(object):
+  """Memoizes per-order RDP values of the Sampled Gaussian Mechanism.
+
+  Values are keyed on the exact float bits of (q, sigma, order). Lookups go
+  through an in-process LRU first and, if a path is given, through an SQLite
+  store that can be shared by several processes (it runs in WAL mode, and every
+  process opens its own connection). Both layers are bounded: the LRU evicts
+  the least recently used entries, the disk store evicts the oldest inserts.
+
+  The cache is opt-in; install it with set_rdp_cache to make compute_rdp use
+  it.
+  """
+
+  def __init__(self,
+               path=None,
+               max_memory_entries=2**16,
+               max_disk_entries=None,
+               timeout=60.):
+    """Initializes the RdpCache.
+
+    Args:
+      path: Optional path of the SQLite file backing the cache. If None, the
+        cache only lives in memory.
+      max_memory_entries: The maximum number of entries kept in memory.
+      max_disk_entries: The maximum number of entries kept on disk, or None for
+        no limit.
+      timeout: Seconds to wait for a lock held by another process.
+    """
+    self._path = path
+    self._max_memory_entries = max_memory_entries
+    self._max_disk_entries = max_disk_entries
+    self._timeout = timeout
+    self._memory = collections.OrderedDict()
+    self._conn = None
+    self._pid = None
+    self._memory_hits = 0
+    self._disk_hits = 0
+    self._misses = 0
+    if path is not None:
+      self._connection()
+
+  def _connection(self):
+    """Returns an SQLite connection owned by the current process."""
+    if self._conn is None or self._pid != os.getpid():
+      conn = sqlite3.connect(
+          self._path, timeout=self._timeout, isolation_level=None)
+      conn.execute('PRAGMA journal_mode=WAL')
+      conn.execute('CREATE TABLE IF NOT EXISTS rdp ('
+                   'q INTEGER, sigma INTEGER, alpha INTEGER, rdp REAL, '
+                   'PRIMARY KEY (q, sigma, alpha))')
+      self._conn, self._pid = conn, os.getpid()
+    return self._conn
+
+  def _remember(self, key, value):
+    self._memory.pop(key, None)
+    self._memory[key] = value
+    while len(self._memory) > self._max_memory_entries:
+      self._memory.popitem(last=False)
+
+  def lookup(self, q, sigma, orders):
+    """Looks up cached RDP values.
+
+    Args:
+      q: The sampling rate.
+      sigma: The std of the additive Gaussian noise.
+      orders: An array of RDP orders.
+
+    Returns:
+      An array of RDP values at orders, with np.nan where the cache misses.
+    """
+    q_bits, sigma_bits = _float_bits(q), _float_bits(sigma)
+    order_bits = [_float_bits(order) for order in orders]
+    rdp = np.full(len(order_bits), np.nan)
+
+    for idx, alpha_bits in enumerate(order_bits):
+      key = (q_bits, sigma_bits, alpha_bits)
+      value = self._memory.get(key)
+      if value is not None:
+        self._remember(key, value)
+        rdp[idx] = value
+        self._memory_hits += 1
+
+    missing = np.flatnonzero(np.isnan(rdp))
+    if missing.size and self._path is not None:
+      stored = dict(self._connection().execute(
+          'SELECT alpha, rdp FROM rdp WHERE q = ? AND sigma = ?',
+          (q_bits, sigma_bits)).fetchall())
+      for idx in missing:
+        value = stored.get(order_bits[idx])
+        if value is not None:
+          self._remember((q_bits, sigma_bits, order_bits[idx]), value)
+          rdp[idx] = value
+          self._disk_hits += 1
+
+    self._misses += int(np.sum(np.isnan(rdp)))
+    return rdp
+
+  def store(self, q, sigma, orders, rdp):
+    """Stores RDP values computed at the given orders."""
+    q_bits, sigma_bits = _float_bits(q), _float_bits(sigma)
+    rows = [(q_bits, sigma_bits, _float_bits(order), float(value))
+            for order, value in zip(orders, rdp)]
+    for row in rows:
+      self._remember(row[:3], row[3])
+
+    if self._path is not None:
+      conn = self._connection()
+      with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.executemany('INSERT OR IGNORE INTO rdp VALUES (?, ?, ?, ?)', rows)
+        if self._max_disk_entries is not None:
+          conn.execute(
+              'DELETE FROM rdp WHERE rowid <= '
+              '(SELECT MAX(rowid) FROM rdp) - ?', (self._max_disk_entries,))
+
+  def clear(self):
+    """Removes all entries and resets the statistics."""
+    self._memory.clear()
+    self._memory_hits = self._disk_hits = self._misses = 0
+    if self._path is not None:
+      self._connection().execute('DELETE FROM rdp')
+
+  def close(self):
+    """Closes the connection to the disk store, if any."""
+    if self._conn is not None and self._pid == os.getpid():
+      self._conn.close()
+    self._conn = None
+
+  @property
+  def stats(self):
+    """Returns the hit and miss counts of this cache as CacheStats."""
+    return CacheStats(self._memory_hits + self._disk_hits, self._misses,
+                      self._memory_hits, self._disk_hits)
+
+
+_rdp_cache = None
+
+
+def set_rdp_cache(cache):
+  """Installs an RdpCache used by compute_rdp (None disables caching).
+
+  Args:
+    cache: An RdpCache, or None.
+
+  Returns:
+    The previously installed cache, or None.
+  """
+  global _rdp_cache
+  previous, _rdp_cache = _rdp_cache, cache
+  return previous
+
+
+def _compute_rdp_cached(q, sigma, orders):
+  """Computes RDP at a vector of orders, going through the installed cache."""
+  orders_vec = np.atleast_1d(np.asarray(orders, dtype=float))
+  rdp = _rdp_cache.lookup(q, sigma, orders_vec)
+  missing = np.isnan(rdp)
+  if np.any(missing):
+    rdp[missing] = _compute_rdp_vec(q, sigma, orders_vec[missing])
+    _rdp_cache.store(q, sigma, orders_vec[missing], rdp[missing])
+  return rdp
+
+
 def compute_rdp(q, noise_multiplier, steps, orders):
   """Compute RDP of the Sampled Gaussian Mechanism.
 
@@ -255,15 +640,38 @@ def compute_rdp(q, noise_multiplier, steps, orders):
   Returns:
     The RDPs at all orders, can be np.inf.
   """
-  if np.isscalar(orders):
+  if _rdp_cache is not None:
+    rdp = _compute_rdp_cached(q, noise_multiplier, orders)
+    if np.isscalar(orders):
+      rdp = rdp[0]
+  elif np.isscalar(orders):
     rdp = _compute_rdp(q, noise_multiplier, orders)
   else:
-    rdp = np.array([_compute_rdp(q, noise_multiplier, order)
-                    for order in orders])
+    rdp = _compute_rdp_vec(q, noise_multiplier, orders)
 
   return rdp * steps
 
 
+def compute_rdp_grid(q, noise_multiplier, steps, orders):
+  """Compute RDP of the Sampled Gaussian Mechanism over a parameter grid.
+
+  Equivalent to calling compute_rdp for every (q, noise_multiplier) pair, but
+  terms that only depend on the orders or on q are computed once for the whole
+  grid.
+
+  Args:
+    q: An array (or a scalar) of sampling rates.
+    noise_multiplier: An array (or a scalar) of noise multipliers.
+    steps: The number of steps.
+    orders: An array (or a scalar) of RDP orders.
+
+  Returns:
+    The RDPs as an array of shape [len(q), len(noise_multiplier), len(orders)],
+    can be np.inf.
+  """
+  return _compute_rdp_grid(q, noise_multiplier, orders) * steps
+
+
 def get_privacy_spent(orders, rdp, target_eps=None, target_delta=None):
   """Compute delta (or eps) for given eps (or delta) from RDP values.
 
@@ -297,9 +705,336 @@ def get_privacy_spent(orders, rdp, target_eps=None, target_delta=None):
     return eps, target_delta, opt_order
 
 
+# Number of rounds whose RDP is materialized at once by the trajectory functions.
+_TRAJECTORY_CHUNK_ROUNDS = 2**16
+
+
+def _compute_eps_trajectory(orders, rdp, delta):
+  """Compute epsilon for every row of a [rounds, len(orders)] RDP array.
+
+  Args:
+    orders: An array of orders.
+    rdp: A 2-D array of RDP guarantees, one row per round.
+    delta: The target delta.
+
+  Returns:
+    Pair of arrays (eps, optimal_order), one entry per row.
+  """
+  orders_vec = np.atleast_1d(orders)
+  eps = rdp - math.log(delta) / (orders_vec - 1)
+  idx_opt = np.nanargmin(eps, axis=1)  # Ignore NaNs
+  return eps[np.arange(len(eps)), idx_opt], orders_vec[idx_opt]
+
+
+def iter_epsilon_trajectory(q, noise_multiplier, steps, orders, delta,
+                            chunk_size=_TRAJECTORY_CHUNK_ROUNDS):
+  """Streams epsilon after each of steps rounds of a fixed SGM in chunks.
+
+  After t rounds the RDP is t times the RDP of one round, so every chunk is a
+  single broadcast over a [chunk_size, len(orders)] array.
+
+  Args:
+    q: The sampling rate.
+    noise_multiplier: The ratio of the standard deviation of the Gaussian noise
+      to the l2-sensitivity of the function to which it is added.
+    steps: The number of rounds.
+    orders: An array of RDP orders.
+    delta: The target delta.
+    chunk_size: The maximum number of rounds per chunk.
+
+  Yields:
+    Pairs of arrays (eps, opt_order) for consecutive chunks of rounds.
+  """
+  rdp = compute_rdp(q, noise_multiplier, 1, orders)
+  for start in range(0, steps, chunk_size):
+    rounds = np.arange(start + 1, min(start + chunk_size, steps) + 1)
+    yield _compute_eps_trajectory(orders, rounds[:, np.newaxis] * rdp, delta)
+
+
+def epsilon_trajectory(q, noise_multiplier, steps, orders, delta,
+                       chunk_size=_TRAJECTORY_CHUNK_ROUNDS):
+  """Compute epsilon after each of steps rounds of a fixed SGM.
+
+  Equivalent to calling get_privacy_spent on compute_rdp(q, noise_multiplier,
+  t, orders) for t = 1..steps. See iter_epsilon_trajectory for the arguments.
+
+  Returns:
+    Pair of arrays (eps, opt_order) of length steps; entry t - 1 holds the
+    guarantee after t rounds.
+  """
+  return _collect_trajectory(
+      iter_epsilon_trajectory(q, noise_multiplier, steps, orders, delta,
+                              chunk_size), steps, orders)
+
+
+def iter_schedule_epsilon_trajectory(mechanisms, schedule, orders, delta,
+                                     chunk_size=_TRAJECTORY_CHUNK_ROUNDS):
+  """Streams epsilon after each round of a schedule of SGMs in chunks.
+
+  The RDP of every distinct mechanism is computed once; the running RDP of
+  the schedule is then a cumulative sum over per-round rows of that table.
+
+  Args:
+    mechanisms: A sequence of (q, noise_multiplier) pairs.
+    schedule: A sequence of indices into mechanisms, one per round.
+    orders: An array of RDP orders.
+    delta: The target delta.
+    chunk_size: The maximum number of rounds per chunk.
+
+  Yields:
+    Pairs of arrays (eps, opt_order) for consecutive chunks of rounds.
+  """
+  rdp_table = np.array([
+      np.atleast_1d(compute_rdp(q, noise_multiplier, 1, orders))
+      for q, noise_multiplier in mechanisms])
+  schedule = np.asarray(schedule, dtype=np.intp)
+  total_rdp = np.zeros(len(np.atleast_1d(orders)))
+  for start in range(0, len(schedule), chunk_size):
+    rdp = rdp_table[schedule[start:start + chunk_size]]
+    rdp[0] += total_rdp
+    rdp = np.cumsum(rdp, axis=0)
+    total_rdp = rdp[-1]
+    yield _compute_eps_trajectory(orders, rdp, delta)
+
+
+def schedule_epsilon_trajectory(mechanisms, schedule, orders, delta,
+                                chunk_size=_TRAJECTORY_CHUNK_ROUNDS):
+  """Compute epsilon after each round of a schedule of SGMs.
+
+  Equivalent to composing compute_rdp(*mechanisms[i], 1, orders) for each
+  index i of schedule and calling get_privacy_spent after every round. See
+  iter_schedule_epsilon_trajectory for the arguments.
+
+  Returns:
+    Pair of arrays (eps, opt_order) of length len(schedule); entry t - 1 holds
+    the guarantee after t rounds.
+  """
+  return _collect_trajectory(
+      iter_schedule_epsilon_trajectory(mechanisms, schedule, orders, delta,
+                                       chunk_size), len(schedule), orders)
+
+
+def iter_split_epsilon(mechanism_a, mechanism_b, steps, orders, delta,
+                       chunk_size=_TRAJECTORY_CHUNK_ROUNDS):
+  """Streams epsilon for every split of steps rounds between two SGMs.
+
+  RDP composition does not depend on the order of the rounds, so the guarantee
+  after k rounds of mechanism_b and steps - k rounds of mechanism_a is
+  determined by k alone.
+
+  Args:
+    mechanism_a: A (q, noise_multiplier) pair.
+    mechanism_b: A (q, noise_multiplier) pair.
+    steps: The total number of rounds.
+    orders: An array of RDP orders.
+    delta: The target delta.
+    chunk_size: The maximum number of splits per chunk.
+
+  Yields:
+    Pairs of arrays (eps, opt_order) for consecutive chunks of k = 0..steps.
+  """
+  rdp_a = compute_rdp(mechanism_a[0], mechanism_a[1], 1, orders)
+  rdp_b = compute_rdp(mechanism_b[0], mechanism_b[1], 1, orders)
+  for start in range(0, steps + 1, chunk_size):
+    k = np.arange(start, min(start + chunk_size, steps + 1))[:, np.newaxis]
+    rdp = k * rdp_b + (steps - k) * rdp_a
+    yield _compute_eps_trajectory(orders, rdp, delta)
+
+
+def split_epsilon(mechanism_a, mechanism_b, steps, orders, delta,
+                  chunk_size=_TRAJECTORY_CHUNK_ROUNDS):
+  """Compute epsilon for every split of steps rounds between two SGMs.
+
+  See iter_split_epsilon for the arguments.
+
+  Returns:
+    Pair of arrays (eps, opt_order) of length steps + 1; entry k holds the
+    guarantee when k rounds use mechanism_b and the rest use mechanism_a.
+  """
+  return _collect_trajectory(
+      iter_split_epsilon(mechanism_a, mechanism_b, steps, orders, delta,
+                         chunk_size), steps + 1, orders)
+
+
+def _collect_trajectory(chunks, steps, orders):
+  """Concatenates streamed (eps, opt_order) chunks into two arrays."""
+  eps = np.empty(steps)
+  opt_order = np.empty(steps, dtype=np.atleast_1d(orders).dtype)
+  start = 0
+  for eps_chunk, order_chunk in chunks:
+    eps[start:start + len(eps_chunk)] = eps_chunk
+    opt_order[start:start + len(eps_chunk)] = order_chunk
+    start += len(eps_chunk)
+  return eps, opt_order
+
+
+class RdpAccountant(object):
+  """Keeps a running RDP total of a sequence of Sampled Gaussian Mechanisms.
+
+  The RDP vector of every distinct (q, noise_multiplier) pair is computed once
+  and kept in a bounded LRU, so each call to step costs a vector add and each
+  privacy query a minimum over the orders. Mechanisms that change every step
+  (e.g. with adaptive clipping) are evicted instead of piling up.
+
+  Example use:
+
+    accountant = rdp_accountant.RdpAccountant(orders)
+    for _ in range(rounds):
+      accountant.step(q, noise_multiplier)
+      eps = accountant.epsilon(delta)
+  """
+
+  def __init__(self, orders, max_cached_mechanisms=2**10):
+    """Initializes the RdpAccountant.
+
+    Args:
+      orders: An array (or a scalar) of RDP orders.
+      max_cached_mechanisms: The maximum number of (q, noise_multiplier) pairs
+        whose RDP is kept; the least recently used ones are evicted.
+    """
+    self._orders = np.atleast_1d(orders)
+    self._orders_minus_one = self._orders.astype(float) - 1
+    self._rdp = np.zeros(len(self._orders))
+    self._mechanism_rdp = collections.OrderedDict()
+    self._max_cached_mechanisms = max_cached_mechanisms
+    self._steps = 0
+
+  def mechanism_rdp(self, q, noise_multiplier):
+    """Returns the (cached) RDP of one step of the given mechanism."""
+    key = (q, noise_multiplier)
+    rdp = self._mechanism_rdp.pop(key, None)
+    if rdp is None:
+      rdp = compute_rdp(q, noise_multiplier, 1, self._orders)
+    self._mechanism_rdp[key] = rdp
+    while len(self._mechanism_rdp) > self._max_cached_mechanisms:
+      self._mechanism_rdp.popitem(last=False)
+    return rdp
+
+  def step(self, q, noise_multiplier, n=1):
+    """Composes n steps of the Sampled Gaussian Mechanism into the total.
+
+    Args:
+      q: The sampling rate.
+      noise_multiplier: The ratio of the standard deviation of the Gaussian
+        noise to the l2-sensitivity of the function to which it is added.
+      n: The number of steps.
+    """
+    rdp = self.mechanism_rdp(q, noise_multiplier)
+    if n == 1:
+      self._rdp += rdp
+    else:
+      self._rdp += n * rdp
+    self._steps += n
+
+  def get_privacy_spent(self, target_eps=None, target_delta=None):
+    """Returns eps, delta, opt_order of the steps so far.
+
+    See get_privacy_spent for the meaning of the arguments.
+    """
+    return get_privacy_spent(self._orders, self._rdp, target_eps, target_delta)
+
+  def epsilon(self, delta):
+    """Returns the epsilon of the steps so far for the given delta."""
+    # Same as _compute_eps, without re-validating the orders on every call.
+    eps = self._rdp - math.log(delta) / self._orders_minus_one
+    return eps[np.nanargmin(eps)]
+
+  def delta(self, eps):
+    """Returns the delta of the steps so far for the given epsilon."""
+    return _compute_delta(self._orders, self._rdp, eps)[0]
+
+  @property
+  def orders(self):
+    return self._orders
+
+  @property
+  def rdp(self):
+    """Returns a copy of the accumulated RDP at all orders."""
+    return self._rdp.copy()
+
+  @property
+  def steps(self):
+    """Returns the number of steps composed so far."""
+    return self._steps
+
+
+def _ledger_effective_z(ledger):
+  """Returns the selection probability and effective z of every ledger sample.
+
+  Args:
+    ledger: A formatted privacy ledger: a privacy_ledger.ColumnarLedger, or a
+      sequence of SampleEntry tuples whose queries are GaussianSumQueryEntry
+      tuples.
+
+  Returns:
+    A pair of arrays, each with one entry per sample.
+  """
+  if hasattr(ledger, 'effective_z'):
+    return (np.asarray(ledger.selection_probability, dtype=float),
+            ledger.effective_z)
+
+  num_samples = len(ledger)
+  selection_probabilities = np.fromiter(
+      map(operator.itemgetter(1), ledger), dtype=float, count=num_samples)
+  queries = list(map(operator.itemgetter(2), ledger))
+  num_queries = np.fromiter(map(len, queries), dtype=np.intp,
+                            count=num_samples)
+  # (l2_norm_bound, noise_stddev) of every query, in ledger order.
+  query_values = np.fromiter(
+      itertools.chain.from_iterable(itertools.chain.from_iterable(queries)),
+      dtype=float, count=2 * int(np.sum(num_queries))).reshape(-1, 2)
+
+  # Compute equivalent z from l2_clip_bounds and noise stddevs in sample.
+  # See https://arxiv.org/pdf/1812.06210.pdf for derivation of this formula.
+  # bincount adds up each sample's terms in order, like the scalar sum did.
+  terms = (query_values[:, 1] / query_values[:, 0])**-2
+  sample_ids = np.repeat(np.arange(num_samples), num_queries)
+  with np.errstate(divide='ignore'):
+    effective_z = np.bincount(
+        sample_ids, weights=terms, minlength=num_samples)**-0.5
+  return selection_probabilities, effective_z
+
+
+def _group_mechanisms(selection_probabilities, effective_z):
+  """Groups samples by their exact (selection probability, effective z).
+
+  Args:
+    selection_probabilities: An array with one entry per sample.
+    effective_z: An array with one entry per sample.
+
+  Returns:
+    Arrays of the distinct selection probabilities and effective z, and of
+    the number of samples with each pair.
+  """
+  if not len(selection_probabilities):
+    return np.zeros(0), np.zeros(0), np.zeros(0, dtype=np.int64)
+  # Ledgers mostly repeat the same pair, so runs are collapsed before the
+  # distinct pairs are sorted out. Samples without queries have an infinite
+  # effective z, so the pairs are compared as they are rather than packed
+  # into a single key.
+  run_starts = np.flatnonzero(np.concatenate([
+      [True],
+      (selection_probabilities[1:] != selection_probabilities[:-1]) |
+      (effective_z[1:] != effective_z[:-1])]))
+  run_lengths = np.diff(np.append(run_starts, len(selection_probabilities)))
+  run_qs = selection_probabilities[run_starts]
+  run_zs = effective_z[run_starts]
+  order = np.lexsort((run_zs, run_qs))
+  run_qs, run_zs = run_qs[order], run_zs[order]
+  group_starts = np.concatenate([
+      [True], (run_qs[1:] != run_qs[:-1]) | (run_zs[1:] != run_zs[:-1])])
+  steps = np.bincount(np.cumsum(group_starts) - 1,
+                      weights=run_lengths[order]).astype(np.int64)
+  return run_qs[group_starts], run_zs[group_starts], steps
+
+
 def compute_rdp_from_ledger(ledger, orders):
   """Compute RDP of Sampled Gaussian Mechanism from ledger.
 
+  Samples are grouped by their exact (selection probability, effective z)
+  pair, and the RDP of each distinct pair is computed once, for as many steps
+  as there are samples in its group. Samples without queries add no RDP.
+
   Args:
     ledger: A formatted privacy ledger.
     orders: An array (or a scalar) of RDP orders.
@@ -307,12 +1042,12 @@ def compute_rdp_from_ledger(ledger, orders):
   Returns:
     RDP at all orders, can be np.inf.
   """
+  qs, zs, steps = _group_mechanisms(*_ledger_effective_z(ledger))
+
   total_rdp = 0
-  for sample in ledger:
-    # Compute equivalent z from l2_clip_bounds and noise stddevs in sample.
-    # See https://arxiv.org/pdf/1812.06210.pdf for derivation of this formula.
-    effective_z = sum([
-        (q.noise_stddev / q.l2_norm_bound)**-2 for q in sample.queries])**-0.5
-    total_rdp += compute_rdp(
-        sample.selection_probability, effective_z, 1, orders)
+  for q, z, count in zip(qs, zs, steps):
+    if np.isinf(z):
+      # A sample without queries releases nothing.
+      continue
+    total_rdp += compute_rdp(float(q), float(z), int(count), orders)
   return total_rdp
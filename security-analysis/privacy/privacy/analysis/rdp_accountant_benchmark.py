@@ -0,0 +1,95 @@
+# Copyright 2019 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Benchmark for the integer-order RDP kernels in rdp_accountant.py.
+
+Compares the per-order scalar loop of _compute_log_a_int against the
+vectorized _compute_log_a_int_vec over the default list of integer orders, and
+times compute_rdp_grid on a grid of sampling rates and noise multipliers, with
+integer orders only and with the fractional orders the analysis scripts add.
+
+Example:
+  python rdp_accountant_benchmark.py --q=0.01 --noise_multiplier=1.1
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import timeit
+
+from absl import app
+from absl import flags
+import numpy as np
+
+# Opting out of loading all sibling packages and their dependencies.
+sys.skip_tf_privacy_import = True
+
+from privacy.analysis import rdp_accountant  # pylint: disable=g-import-not-at-top
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_float('q', 0.01, 'Sampling rate')
+flags.DEFINE_float('noise_multiplier', 1.1, 'Noise multiplier')
+flags.DEFINE_integer('max_order', 512, 'Largest integer RDP order')
+flags.DEFINE_integer('repeats', 5, 'Number of timing repeats')
+flags.DEFINE_integer('grid_size', 100,
+                     'Number of sampling rates (and of noise multipliers) in '
+                     'the compute_rdp_grid benchmark')
+
+
+def _time(fn, repeats):
+  """Returns the best wall time of fn over the given number of repeats."""
+  return min(timeit.repeat(fn, number=1, repeat=repeats))
+
+
+def main(argv):
+  del argv  # argv is not used.
+
+  q, sigma = FLAGS.q, FLAGS.noise_multiplier
+  orders = list(range(2, 64)) + [
+      order for order in (128, 256, 512, 1024) if order <= FLAGS.max_order]
+
+  scalar = lambda: [rdp_accountant._compute_log_a_int(q, sigma, order)  # pylint: disable=protected-access
+                    for order in orders]
+  vectorized = lambda: rdp_accountant._compute_log_a_int_vec(q, sigma, orders)  # pylint: disable=protected-access
+
+  max_err = np.max(np.abs(np.array(scalar()) - vectorized()))
+  t_scalar = _time(scalar, FLAGS.repeats)
+  t_vectorized = _time(vectorized, FLAGS.repeats)
+
+  print('{} integer orders up to {}, q = {}, noise_multiplier = {}'.format(
+      len(orders), max(orders), q, sigma))
+  print('scalar:     {:.3f} ms'.format(1e3 * t_scalar))
+  print('vectorized: {:.3f} ms'.format(1e3 * t_vectorized))
+  print('speedup:    {:.1f}x (max abs difference {:.2e})'.format(
+      t_scalar / t_vectorized, max_err))
+
+  qs = np.linspace(1e-3, 0.5, FLAGS.grid_size)
+  sigmas = np.linspace(0.5, 10, FLAGS.grid_size)
+  t_grid = _time(lambda: rdp_accountant.compute_rdp_grid(qs, sigmas, 1, orders),
+                 1)
+  print('grid:       {:.3f} s for {} (q, noise_multiplier) pairs'.format(
+      t_grid, len(qs) * len(sigmas)))
+
+  frac_orders = [1.25, 1.5, 1.75, 2.25, 2.5, 3.5, 4.5] + orders
+  t_frac_grid = _time(
+      lambda: rdp_accountant.compute_rdp_grid(qs, sigmas, 1, frac_orders), 1)
+  print('grid:       {:.3f} s with {} fractional orders added'.format(
+      t_frac_grid, len(frac_orders) - len(orders)))
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -118,6 +118,86 @@ class TestGaussianMoments(parameterized.TestCase):
     log_a_mp = self._log_float_mp(self._compute_a_mp(sigma, q, order))
     np.testing.assert_allclose(log_a, log_a_mp, rtol=1e-4)
 
+  @parameterized.parameters((1e-6, .5), (1e-3, 1.), (.01, 4.), (.1, 10.),
+                            (.5, 2.), (.99, .1))
+  def test_compute_log_a_int_vec_matches_scalar(self, q, sigma):
+    orders = list(range(2, 64)) + [128, 256, 512]
+    log_a_vec = rdp_accountant._compute_log_a_int_vec(q, sigma, orders)
+    log_a = [rdp_accountant._compute_log_a_int(q, sigma, order)
+             for order in orders]
+    np.testing.assert_allclose(log_a_vec, log_a, rtol=1e-12, atol=1e-12)
+
+  def test_compute_rdp_mixed_orders_matches_scalar(self):
+    orders = [1.25, 1.5, 2., 3, 4.5, 32, 256, np.inf]
+    rdp_vec = rdp_accountant.compute_rdp(0.05, 1.3, 1, orders)
+    rdp = [rdp_accountant.compute_rdp(0.05, 1.3, 1, order) for order in orders]
+    np.testing.assert_allclose(rdp_vec, rdp, rtol=1e-12, atol=1e-12)
+
+  def test_compute_rdp_grid_matches_compute_rdp(self):
+    qs = [0, 1e-4, .01, .3, 1]
+    sigmas = [.7, 1.1, 4.]
+    orders = [1.5, 2, 5, 32., 256, np.inf]
+    rdp_grid = rdp_accountant.compute_rdp_grid(qs, sigmas, 20, orders)
+    self.assertEqual(rdp_grid.shape, (len(qs), len(sigmas), len(orders)))
+    for q_idx, q in enumerate(qs):
+      for sigma_idx, sigma in enumerate(sigmas):
+        np.testing.assert_allclose(
+            rdp_grid[q_idx, sigma_idx],
+            rdp_accountant.compute_rdp(q, sigma, 20, orders), rtol=1e-12)
+
+  def test_compute_log_a_frac_grid_matches_scalar(self):
+    qs = [1e-4, .01, .3, .9]
+    sigmas = [.3, 1.1, 4., 100.]
+    for alpha in [1.25, 1.5, 3.5, 20.5]:
+      log_a = rdp_accountant._compute_log_a_frac_grid(qs, sigmas, alpha)  # pylint: disable=protected-access
+      for q_idx, q in enumerate(qs):
+        for sigma_idx, sigma in enumerate(sigmas):
+          # Only the summation order differs, so the results agree up to the
+          # rounding of log-sums near 0.
+          self.assertAlmostEqual(
+              log_a[q_idx, sigma_idx],
+              rdp_accountant._compute_log_a_frac(q, sigma, alpha),  # pylint: disable=protected-access
+              delta=1e-13 + 1e-12 * abs(log_a[q_idx, sigma_idx]))
+
+  def test_rdp_cache_hits_and_misses(self):
+    orders = [1.5, 2, 32, 256]
+    cache = rdp_accountant.RdpCache()
+    previous = rdp_accountant.set_rdp_cache(cache)
+    try:
+      rdp = rdp_accountant.compute_rdp(0.01, 1.1, 10, orders)
+      self.assertEqual(cache.stats.misses, len(orders))
+      rdp_cached = rdp_accountant.compute_rdp(0.01, 1.1, 10, orders)
+      self.assertEqual(cache.stats.hits, len(orders))
+    finally:
+      rdp_accountant.set_rdp_cache(previous)
+    np.testing.assert_array_equal(rdp, rdp_cached)
+    np.testing.assert_array_equal(
+        rdp, rdp_accountant.compute_rdp(0.01, 1.1, 10, orders))
+
+  def test_rdp_cache_shared_on_disk(self):
+    path = self.create_tempfile().full_path
+    orders = [2, 3, 4, np.inf]
+    writer = rdp_accountant.RdpCache(path)
+    writer.store(0.1, 2., orders, [1., 2., 3., np.inf])
+    reader = rdp_accountant.RdpCache(path)
+    np.testing.assert_array_equal(
+        reader.lookup(0.1, 2., [4, 2, 5, np.inf]), [3., 1., np.nan, np.inf])
+    self.assertEqual(reader.stats,
+                     rdp_accountant.CacheStats(3, 1, 0, 3))
+    # Keys are exact float bits: a nearby rate is a different entry.
+    self.assertTrue(np.isnan(reader.lookup(np.nextafter(0.1, 1), 2., [2])[0]))
+
+  def test_rdp_cache_bounded(self):
+    path = self.create_tempfile().full_path
+    cache = rdp_accountant.RdpCache(
+        path, max_memory_entries=2, max_disk_entries=3)
+    cache.store(0.1, 2., [2, 3, 4, 5], [1., 2., 3., 4.])
+    self.assertEqual(cache.lookup(0.1, 2., [4, 5]).tolist(), [3., 4.])
+    self.assertEqual(cache.stats.memory_hits, 2)
+    fresh = rdp_accountant.RdpCache(path)
+    np.testing.assert_array_equal(
+        fresh.lookup(0.1, 2., [2, 3, 4, 5]), [np.nan, 2., 3., 4.])
+
   def test_get_privacy_spent_check_target_delta(self):
     orders = range(2, 33)
     rdp = rdp_accountant.compute_rdp(0.01, 4, 10000, orders)
@@ -155,6 +235,82 @@ class TestGaussianMoments(parameterized.TestCase):
     self.assertAlmostEqual(eps, 8.509656, places=5)
     self.assertEqual(opt_order, 2.5)
 
+  def test_epsilon_trajectory_matches_get_privacy_spent(self):
+    orders = [1.25, 1.5, 2., 3, 8, 32, 256]
+    # Chunk size smaller than steps exercises the streaming path.
+    eps, opt_order = rdp_accountant.epsilon_trajectory(
+        0.05, 1.3, 25, orders, 1e-5, chunk_size=7)
+    self.assertLen(eps, 25)
+    for t in range(1, 26):
+      rdp = rdp_accountant.compute_rdp(0.05, 1.3, t, orders)
+      eps_t, _, opt_order_t = rdp_accountant.get_privacy_spent(
+          orders, rdp, target_delta=1e-5)
+      self.assertAlmostEqual(eps[t - 1], eps_t, places=12)
+      self.assertEqual(opt_order[t - 1], opt_order_t)
+
+  def test_schedule_epsilon_trajectory_matches_composition(self):
+    orders = [1.5, 2., 3, 8, 32, np.inf]
+    mechanisms = [(0.4, 6.), (0.4, 1.)]
+    schedule = [0, 1, 1, 0, 0, 0, 1, 0, 1, 1, 0]
+    eps, opt_order = rdp_accountant.schedule_epsilon_trajectory(
+        mechanisms, schedule, orders, 1e-6, chunk_size=4)
+    rdp = 0
+    for t, idx in enumerate(schedule):
+      rdp += rdp_accountant.compute_rdp(
+          mechanisms[idx][0], mechanisms[idx][1], 1, orders)
+      eps_t, _, opt_order_t = rdp_accountant.get_privacy_spent(
+          orders, rdp, target_delta=1e-6)
+      self.assertAlmostEqual(eps[t], eps_t, places=12)
+      self.assertEqual(opt_order[t], opt_order_t)
+
+  def test_split_epsilon_matches_composition(self):
+    orders = [1.5, 2., 3, 8, 32]
+    eps, opt_order = rdp_accountant.split_epsilon(
+        (0.4, 6.), (0.4, 1.), 12, orders, 1e-6, chunk_size=5)
+    self.assertLen(eps, 13)
+    for k in range(13):
+      rdp = (rdp_accountant.compute_rdp(0.4, 6., 12 - k, orders) +
+             rdp_accountant.compute_rdp(0.4, 1., k, orders))
+      eps_k, _, opt_order_k = rdp_accountant.get_privacy_spent(
+          orders, rdp, target_delta=1e-6)
+      self.assertAlmostEqual(eps[k], eps_k, places=10)
+      self.assertEqual(opt_order[k], opt_order_k)
+
+  def test_rdp_accountant_matches_composition(self):
+    orders = [1.5, 2., 4, 16, 64]
+    accountant = rdp_accountant.RdpAccountant(orders)
+    accountant.step(0.01, 1.1, n=1000)
+    for _ in range(10):
+      accountant.step(0.1, 2.)
+    accountant.step(0.01, 1.1, n=500)
+
+    rdp = (rdp_accountant.compute_rdp(0.01, 1.1, 1500, orders) +
+           rdp_accountant.compute_rdp(0.1, 2., 10, orders))
+    np.testing.assert_allclose(accountant.rdp, rdp, rtol=1e-12)
+    self.assertEqual(accountant.steps, 1510)
+
+    eps, _, _ = rdp_accountant.get_privacy_spent(orders, rdp, target_delta=1e-5)
+    self.assertAlmostEqual(accountant.epsilon(1e-5), eps)
+    self.assertAlmostEqual(accountant.delta(eps), 1e-5)
+    self.assertEqual(accountant.get_privacy_spent(target_delta=1e-5)[2],
+                     rdp_accountant.get_privacy_spent(
+                         orders, rdp, target_delta=1e-5)[2])
+
+  def test_rdp_accountant_cache_is_bounded(self):
+    orders = [1.5, 2., 4, 16, 64]
+    accountant = rdp_accountant.RdpAccountant(orders, max_cached_mechanisms=2)
+    noise_multipliers = [1.1, 1.2, 1.3, 1.1, 1.3, 1.4]
+    for noise_multiplier in noise_multipliers:
+      accountant.step(0.01, noise_multiplier)
+
+    # Only the two most recently used mechanisms are kept.
+    self.assertEqual(
+        list(accountant._mechanism_rdp),  # pylint: disable=protected-access
+        [(0.01, 1.3), (0.01, 1.4)])
+    rdp = sum(rdp_accountant.compute_rdp(0.01, noise_multiplier, 1, orders)
+              for noise_multiplier in noise_multipliers)
+    np.testing.assert_allclose(accountant.rdp, rdp, rtol=1e-12)
+
   def test_compute_rdp_from_ledger(self):
     orders = range(2, 33)
     q = 0.1
@@ -172,6 +328,43 @@ class TestGaussianMoments(parameterized.TestCase):
     rdp_from_ledger = rdp_accountant.compute_rdp_from_ledger(ledger, orders)
     self.assertSequenceAlmostEqual(rdp, rdp_from_ledger)
 
+  def test_compute_rdp_from_mixed_ledger(self):
+    orders = [1.5, 2., 8., 32.]
+    rng = np.random.RandomState(0)
+    ledger = []
+    for _ in range(50):
+      queries = [privacy_ledger.GaussianSumQueryEntry(1., rng.choice([1., 2.])),
+                 privacy_ledger.GaussianSumQueryEntry(2., 3.)]
+      ledger.append(privacy_ledger.SampleEntry(
+          1000, rng.choice([0.01, 0.1]), queries[:rng.randint(1, 3)]))
+
+    rdp = 0
+    for sample in ledger:
+      z = sum((query.noise_stddev / query.l2_norm_bound)**-2
+              for query in sample.queries)**-0.5
+      rdp += rdp_accountant.compute_rdp(
+          sample.selection_probability, z, 1, orders)
+    rdp_from_ledger = rdp_accountant.compute_rdp_from_ledger(ledger, orders)
+    self.assertSequenceAlmostEqual(rdp, rdp_from_ledger, places=10)
+
+  def test_compute_rdp_from_ledger_with_empty_sample(self):
+    orders = [1.5, 2., 8., 32.]
+    queries = [privacy_ledger.GaussianSumQueryEntry(1., 2.)]
+    ledger = [
+        privacy_ledger.SampleEntry(1000, 0.01, queries),
+        privacy_ledger.SampleEntry(1000, 0.01, []),
+        privacy_ledger.SampleEntry(1000, 0.01, queries),
+    ]
+    rdp = rdp_accountant.compute_rdp(0.01, 2., 2, orders)
+    self.assertSequenceAlmostEqual(
+        rdp, rdp_accountant.compute_rdp_from_ledger(ledger, orders))
+    self.assertSequenceAlmostEqual(
+        rdp, rdp_accountant.compute_rdp_from_ledger(
+            privacy_ledger.ColumnarLedger(
+                [[1000, 0.01, 1], [1000, 0.01, 0], [1000, 0.01, 1]],
+                [[0, 1., 2.], [2, 1., 2.]]),
+            orders))
+
 
 if __name__ == '__main__':
   absltest.main()
@@ -0,0 +1,255 @@
+"""Array-backed stake maps.
+
+A StakeMap holds the stake of nodes 0..N-1 in a single NumPy vector, which can
+be backed by a memory-mapped .npy file so that stake-skew experiments over
+very large populations do not need to fit in RAM. Generators are provided for
+uniform, Zipf, Pareto and empirical (CSV) stake distributions; each of them
+fills the vector in chunks, and writes it straight to disk if given a path.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+
+# Number of nodes generated or scanned at once.
+_CHUNK_NODES = 2**20
+
+# Number of histogram bins per pass when searching for a stake threshold.
+_HISTOGRAM_BINS = 1024
+
+
+class StakeMap(object):
+  """The stakes of nodes 0..N-1, stored in a NumPy vector."""
+
+  def __init__(self, stakes):
+    """Initializes the StakeMap.
+
+    Args:
+      stakes: A 1-D array (or np.memmap) of non-negative stakes, indexed by
+        node id.
+
+    Raises:
+      ValueError: If stakes is not 1-D.
+    """
+    if np.ndim(stakes) != 1:
+      raise ValueError('Stakes must be a 1-D array.')
+    self._stakes = stakes if isinstance(stakes, np.ndarray) else np.asarray(
+        stakes, dtype=float)
+
+  @classmethod
+  def load(cls, path, mmap=True):
+    """Loads a StakeMap saved with save(), memory-mapped by default."""
+    return cls(np.load(path, mmap_mode='r' if mmap else None))
+
+  def save(self, path):
+    np.save(path, self._stakes)
+
+  @property
+  def stakes(self):
+    return self._stakes
+
+  @property
+  def total_stake(self):
+    return sum(float(np.sum(self._stakes[start:start + _CHUNK_NODES],
+                            dtype=np.float64))
+               for start in range(0, len(self), _CHUNK_NODES))
+
+  def __len__(self):
+    return len(self._stakes)
+
+  def __getitem__(self, node):
+    return self._stakes[node]
+
+  def __array__(self, dtype=None, copy=None):
+    return np.asarray(self._stakes, dtype=dtype)
+
+  def items(self):
+    """Iterates over (node, stake) pairs, like dict.items()."""
+    for node in range(len(self)):
+      yield node, self._stakes[node]
+
+  def lowest_stake_nodes(self, stake):
+    """Returns the lowest-stake nodes that together hold at least `stake`.
+
+    Nodes are taken in order of increasing stake (ties by node id) until their
+    total reaches `stake`. The stake of the last node taken is found first,
+    with chunked passes over the stakes (see _stake_threshold); then one more
+    pass collects the nodes below it, and only those are sorted.
+
+    Args:
+      stake: The stake to cover.
+
+    Returns:
+      An array of node ids, in the order in which they were taken. It holds
+      at least one node, and all nodes if their total stake is below `stake`.
+    """
+    if self.total_stake < stake:
+      threshold, num_tied = np.inf, 0
+    else:
+      threshold, stake_below = self._stake_threshold(stake)
+      # Nodes holding exactly the threshold stake are taken by node id.
+      num_tied = 1
+      if threshold > 0:
+        num_tied = max(1, int(np.ceil((stake - stake_below) / threshold)))
+        while num_tied > 1 and stake_below + (num_tied - 1) * threshold >= stake:
+          num_tied -= 1
+        while stake_below + num_tied * threshold < stake:
+          num_tied += 1
+
+    below = []
+    tied = []
+    for start, chunk in self._chunks():
+      below.append(start + np.flatnonzero(chunk < threshold))
+      if num_tied > 0:
+        tied.append(start + np.flatnonzero(chunk == threshold)[:num_tied])
+        num_tied -= len(tied[-1])
+
+    below = np.concatenate(below)
+    # Node ids are already increasing, so a stable sort breaks ties by id.
+    below = below[np.argsort(self._stakes[below], kind='stable')]
+    return np.concatenate([below] + tied)
+
+  def _chunks(self, lower=None, upper=None):
+    """Yields (start, chunk) pairs, optionally keeping lower <= stake < upper.
+
+    With bounds, the chunk holds the stakes in that range, not their ids.
+    """
+    for start in range(0, len(self), _CHUNK_NODES):
+      chunk = self._stakes[start:start + _CHUNK_NODES]
+      if lower is not None:
+        chunk = chunk[(chunk >= lower) & (chunk < upper)]
+      yield start, chunk
+
+  def _stake_threshold(self, stake):
+    """Finds the stake of the last node lowest_stake_nodes takes.
+
+    The range of stakes that can hold it is narrowed with histograms of
+    _HISTOGRAM_BINS bins computed chunk by chunk, until it holds a single
+    stake value or few enough stakes to be sorted in memory. Memory use is
+    therefore bounded by the chunk size, not by the number of nodes, except
+    when the range is down to two adjacent floats: it cannot be split further,
+    and the nodes left in it are partitioned in memory.
+
+    Args:
+      stake: The stake to cover; at most total_stake.
+
+    Returns:
+      The threshold stake, and the total stake of the nodes below it.
+    """
+    lower, upper = -np.inf, np.inf
+    # Total stake of the nodes below `lower`.
+    stake_below = 0.
+    while True:
+      min_stake, max_stake, count = np.inf, -np.inf, 0
+      for _, chunk in self._chunks(lower, upper):
+        if chunk.size:
+          min_stake = min(min_stake, chunk.min())
+          max_stake = max(max_stake, chunk.max())
+          count += chunk.size
+
+      if min_stake == max_stake:
+        return float(min_stake), stake_below
+
+      edges = np.unique(np.linspace(min_stake, max_stake, _HISTOGRAM_BINS + 1))
+      if count <= _CHUNK_NODES or len(edges) == 2:
+        values = np.concatenate(
+            [chunk for _, chunk in self._chunks(lower, upper)])
+        if len(edges) == 2:
+          # min_stake and max_stake are adjacent floats, so a histogram would
+          # have a single bin and the range would stop shrinking. No stake
+          # lies between them, so partitioning around the first max_stake
+          # sorts the remaining candidates.
+          values = np.partition(values, np.count_nonzero(values == min_stake))
+        else:
+          values = np.sort(values)
+        cum_stake = stake_below + np.cumsum(values, dtype=np.float64)
+        taken = min(len(values) - 1,
+                    np.searchsorted(cum_stake, stake, side='left'))
+        threshold = values[taken]
+        first = np.searchsorted(values, threshold, side='left')
+        if first:
+          stake_below = cum_stake[first - 1]
+        return float(threshold), stake_below
+
+      # Bin i holds edges[i] <= stake < edges[i + 1], and the last one also
+      # max_stake. There are at least two bins, and every bin leaves out
+      # min_stake or max_stake, so the range shrinks on every iteration.
+      num_bins = len(edges) - 1
+      bin_stake = np.zeros(num_bins)
+      for _, chunk in self._chunks(lower, upper):
+        bins = np.minimum(np.searchsorted(edges, chunk, side='right') - 1,
+                          num_bins - 1)
+        bin_stake += np.bincount(bins, weights=chunk, minlength=num_bins)
+
+      cum_stake = stake_below + np.cumsum(bin_stake)
+      b = min(num_bins - 1, np.searchsorted(cum_stake, stake, side='left'))
+      if b:
+        stake_below = cum_stake[b - 1]
+      lower = edges[b]
+      upper = edges[b + 1] if b < num_bins - 1 else np.nextafter(max_stake,
+                                                                 np.inf)
+
+
+def _fill(num_nodes, draw_chunk, path, dtype):
+  """Builds a StakeMap, filling nodes [start, end) with draw_chunk."""
+  if path is None:
+    stakes = np.empty(num_nodes, dtype=dtype)
+  else:
+    stakes = np.lib.format.open_memmap(
+        path, mode='w+', dtype=dtype, shape=(num_nodes,))
+  for start in range(0, num_nodes, _CHUNK_NODES):
+    end = min(num_nodes, start + _CHUNK_NODES)
+    stakes[start:end] = draw_chunk(start, end)
+  if path is not None:
+    stakes.flush()
+  return StakeMap(stakes)
+
+
+def uniform_stakes(num_nodes, stake=1, path=None, dtype=np.float64):
+  """Every node holds the same stake."""
+  return _fill(num_nodes, lambda start, end: stake, path, dtype)
+
+
+def zipf_stakes(num_nodes, exponent, seed=None, path=None, dtype=np.float64):
+  """Stakes drawn from a Zipf distribution with the given exponent (> 1)."""
+  rng = np.random.default_rng(seed)
+  draw = lambda start, end: rng.zipf(exponent, end - start)
+  return _fill(num_nodes, draw, path, dtype)
+
+
+def pareto_stakes(num_nodes, shape, scale=1., seed=None, path=None,
+                  dtype=np.float64):
+  """Stakes drawn from a Pareto distribution with minimum stake `scale`."""
+  rng = np.random.default_rng(seed)
+  draw = lambda start, end: scale * (1. + rng.pareto(shape, end - start))
+  return _fill(num_nodes, draw, path, dtype)
+
+
+def empirical_stakes(csv_file, num_nodes=None, column=0, seed=None, path=None,
+                     dtype=np.float64):
+  """Stakes loaded from a CSV file.
+
+  Args:
+    csv_file: A CSV file with one row per node and a header row.
+    num_nodes: If given, draws this many stakes from the empirical
+      distribution of the file (with replacement), instead of using the
+      stakes as they are.
+    column: The index of the column that holds the stakes.
+    seed: Seed for the draws when num_nodes is given.
+    path: If given, the stakes are written to this .npy file and
+      memory-mapped.
+    dtype: The dtype of the stakes.
+
+  Returns:
+    A StakeMap.
+  """
+  observed = np.loadtxt(csv_file, delimiter=',', skiprows=1, usecols=column,
+                        ndmin=1, dtype=np.float64)
+  if num_nodes is None:
+    return _fill(len(observed), lambda start, end: observed[start:end], path,
+                 dtype)
+  rng = np.random.default_rng(seed)
+  draw = lambda start, end: rng.choice(observed, end - start)
+  return _fill(num_nodes, draw, path, dtype)
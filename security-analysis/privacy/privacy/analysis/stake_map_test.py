@@ -0,0 +1,115 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for stake_map.py."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+from absl.testing import absltest
+import numpy as np
+
+from privacy.analysis import stake_map
+
+
+class StakeMapTest(absltest.TestCase):
+
+  def _sorted_walk(self, stakes, stake):
+    nodes = []
+    for node in sorted(range(len(stakes)), key=lambda n: stakes[n]):
+      nodes.append(node)
+      stake -= stakes[node]
+      if stake <= 0:
+        break
+    return nodes
+
+  def test_lowest_stake_nodes_matches_sorted_walk(self):
+    rng = np.random.default_rng(0)
+    for _ in range(100):
+      stakes = rng.integers(1, 5, size=rng.integers(1, 200)).astype(float)
+      stake = float(rng.integers(-2, 500))
+      self.assertEqual(
+          list(stake_map.StakeMap(stakes).lowest_stake_nodes(stake)),
+          self._sorted_walk(stakes, stake))
+
+  def test_lowest_stake_nodes_in_chunks(self):
+    # Small chunks, so the threshold is narrowed down by histogram passes.
+    rng = np.random.default_rng(1)
+    path = os.path.join(self.create_tempdir().full_path, 'stakes.npy')
+    chunk_nodes = stake_map._CHUNK_NODES  # pylint: disable=protected-access
+    stake_map._CHUNK_NODES = 16  # pylint: disable=protected-access
+    try:
+      for high in (3, 1000, 10**6):
+        stakes = rng.integers(0, high, size=500).astype(float)
+        np.save(path, stakes)
+        memmapped = stake_map.StakeMap.load(path)
+        for stake in (0., 1., stakes.sum() / 3, stakes.sum(),
+                      stakes.sum() + 1):
+          self.assertEqual(list(memmapped.lowest_stake_nodes(stake)),
+                           self._sorted_walk(stakes, stake))
+    finally:
+      stake_map._CHUNK_NODES = chunk_nodes  # pylint: disable=protected-access
+
+  def test_adjacent_float_stakes_in_chunks(self):
+    # The stakes cannot be split by a histogram, and do not fit in a chunk.
+    rng = np.random.default_rng(2)
+    path = os.path.join(self.create_tempdir().full_path, 'stakes.npy')
+    stake = 1. / 3
+    stakes = rng.choice([stake, np.nextafter(stake, np.inf)], size=100)
+    np.save(path, stakes)
+    chunk_nodes = stake_map._CHUNK_NODES  # pylint: disable=protected-access
+    stake_map._CHUNK_NODES = 16  # pylint: disable=protected-access
+    try:
+      memmapped = stake_map.StakeMap.load(path)
+      # Halfway between node boundaries, so rounding cannot change the answer.
+      for target in (0., 10.5 * stake, 60.5 * stake):
+        self.assertEqual(list(memmapped.lowest_stake_nodes(target)),
+                         self._sorted_walk(stakes, target))
+    finally:
+      stake_map._CHUNK_NODES = chunk_nodes  # pylint: disable=protected-access
+
+  def test_uniform_stakes(self):
+    stakes = stake_map.uniform_stakes(10, stake=2)
+    self.assertLen(stakes, 10)
+    self.assertEqual(stakes.total_stake, 20.)
+    self.assertEqual(list(stakes.lowest_stake_nodes(5)), [0, 1, 2])
+
+  def test_generators_are_seeded(self):
+    for generate in (lambda: stake_map.zipf_stakes(100, 2., seed=1),
+                     lambda: stake_map.pareto_stakes(100, 1.5, seed=1)):
+      stakes = generate().stakes
+      np.testing.assert_array_equal(stakes, generate().stakes)
+      self.assertTrue(np.all(stakes >= 1))
+
+  def test_memory_mapped_round_trip(self):
+    path = os.path.join(self.create_tempdir().full_path, 'stakes.npy')
+    stakes = stake_map.pareto_stakes(1000, 2., seed=0, path=path)
+    loaded = stake_map.StakeMap.load(path)
+    self.assertIsInstance(loaded.stakes, np.memmap)
+    np.testing.assert_array_equal(loaded.stakes, stakes.stakes)
+
+  def test_empirical_stakes(self):
+    csv_file = self.create_tempfile(content='stake\n1\n2\n3\n').full_path
+    np.testing.assert_array_equal(
+        stake_map.empirical_stakes(csv_file).stakes, [1., 2., 3.])
+    resampled = stake_map.empirical_stakes(csv_file, num_nodes=50, seed=0)
+    self.assertLen(resampled, 50)
+    self.assertTrue(set(resampled.stakes) <= {1., 2., 3.})
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -129,3 +129,158 @@ class TensorBuffer(object):
   def capacity(self):
     """Returns the current capacity of the buffer."""
     return self._capacity
+
+
+class SegmentedTensorBuffer(object):
+  """A TensorBuffer that grows by fixed-size segments.
+
+  Like TensorBuffer, but appended tensors are written into a sequence of
+  segments of `segment_size` entries each, so growing the buffer allocates one
+  new segment instead of copying the whole buffer into one twice its size. The
+  segments are concatenated only when `values` is read.
+
+  In eager mode segments are created as they are needed. In graph mode
+  variables cannot be created while the graph runs, so a single variable of
+  `capacity_hint` entries is created up front and appends past it go to an
+  overflow TensorBuffer, which doubles from one segment; with an accurate hint
+  (e.g. the known number of steps) nothing is ever copied, and the graph does
+  not grow with the hint.
+  """
+
+  def __init__(self,
+               capacity_hint,
+               shape,
+               dtype=tf.int32,
+               name=None,
+               segment_size=1024):
+    """Initializes the SegmentedTensorBuffer.
+
+    Args:
+      capacity_hint: Expected number of tensors that will be appended.
+      shape: The shape (as tuple or list) of the tensors to accumulate.
+      dtype: The type of the tensors.
+      name: A string name for the variable_scope used.
+      segment_size: Maximum number of tensors per segment. Reduced to
+        `capacity_hint` if that is smaller. In graph mode, the initial capacity
+        of the overflow buffer.
+
+    Raises:
+      ValueError: If the shape is empty (specifies scalar shape).
+    """
+    shape = list(shape)
+    self._rank = len(shape)
+    self._shape = shape
+    self._name = name
+    self._dtype = dtype
+    if not self._rank:
+      raise ValueError('Shape cannot be scalar.')
+    self._segment_size = max(1, min(segment_size, capacity_hint))
+    self._eager = tf.executing_eagerly()
+
+    with tf.variable_scope(self._name):
+      self._current_size = tf.Variable(
+          initial_value=0, trainable=False, name='current_size')
+      if self._eager:
+        # Python-side copies of the size and of the concatenated full
+        # segments, so appends and reads need no device round trip.
+        self._size = 0
+        self._segments = []
+        self._full_values = tf.zeros([0] + shape, dtype)
+        self._num_full_values = 0
+        self._capacity = tf.Variable(
+            initial_value=0, trainable=False, name='capacity')
+      else:
+        self._preallocated_size = max(1, capacity_hint)
+        self._preallocated = self._new_variable(self._preallocated_size,
+                                                'preallocated')
+        self._overflow = TensorBuffer(
+            self._segment_size, shape, dtype, name='overflow')
+        self._capacity = tf.Variable(
+            initial_value=self._preallocated_size + self._segment_size,
+            trainable=False,
+            name='capacity')
+
+  def _new_variable(self, size, name):
+    return tf.Variable(
+        initial_value=tf.zeros([size] + self._shape, self._dtype),
+        trainable=False,
+        name=name,
+        use_resource=True)
+
+  def _check_shape(self, value):
+    return tf.assert_equal(
+        tf.shape(value),
+        tf.constant(self._shape, tf.int32),
+        message='Appending value of inconsistent shape.')
+
+  def append(self, value):
+    """Appends a new tensor to the end of the buffer.
+
+    Args:
+      value: The tensor to append. Must match the shape specified in the
+        initializer.
+
+    Returns:
+      An op appending the new tensor to the end of the buffer.
+    """
+    value = tf.convert_to_tensor(value, self._dtype)
+    if self._eager:
+      self._check_shape(value)
+      index, offset = divmod(self._size, self._segment_size)
+      if index == len(self._segments):
+        with tf.variable_scope(self._name):
+          self._segments.append(
+              self._new_variable(self._segment_size, 'segment_%d' % index))
+        tf.assign_add(self._capacity, self._segment_size)
+      self._segments[index][offset].assign(value)
+      self._size += 1
+      return tf.assign_add(self._current_size, 1)
+
+    def _write_preallocated():
+      with tf.control_dependencies(
+          [tf.assign(self._preallocated[self._current_size], value)]):
+        return tf.assign_add(self._current_size, 1)
+
+    def _write_overflow():
+      with tf.control_dependencies([self._overflow.append(value)]):
+        update_capacity = tf.assign(
+            self._capacity,
+            self._preallocated_size + self._overflow.capacity.read_value())
+      with tf.control_dependencies([update_capacity]):
+        return tf.assign_add(self._current_size, 1)
+
+    with tf.control_dependencies([self._check_shape(value)]):
+      return tf.cond(
+          tf.less(self._current_size, self._preallocated_size),
+          _write_preallocated, _write_overflow)
+
+  @property
+  def values(self):
+    """Returns the accumulated tensor."""
+    if self._eager:
+      num_full, remainder = divmod(self._size, self._segment_size)
+      if num_full > self._num_full_values:
+        self._full_values = tf.concat(
+            [self._full_values] + [
+                segment.read_value()
+                for segment in self._segments[self._num_full_values:num_full]
+            ], 0)
+        self._num_full_values = num_full
+      if not remainder:
+        return self._full_values
+      return tf.concat(
+          [self._full_values, self._segments[num_full][:remainder]], 0)
+
+    values = tf.concat(
+        [self._preallocated.read_value(), self._overflow.values], 0)
+    return values[:self._current_size]
+
+  @property
+  def current_size(self):
+    """Returns the current number of tensors in the buffer."""
+    return self._current_size
+
+  @property
+  def capacity(self):
+    """Returns the current capacity of the buffer."""
+    return self._capacity
@@ -17,6 +17,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import time
+
 import tensorflow as tf
 
 from privacy.analysis import tensor_buffer
@@ -79,6 +81,60 @@ class TensorBufferTest(tf.test.TestCase):
     # Capacity should have doubled.
     self.assertAllEqual(my_buffer.capacity.numpy(), 4)
 
+  def test_segmented_resize(self):
+    size, shape = 2, [2, 3]
+
+    my_buffer = tensor_buffer.SegmentedTensorBuffer(
+        size, shape, name='my_buffer')
+
+    values = []
+    for i in range(5):
+      values.append([[i, i + 1, i + 2], [i + 3, i + 4, i + 5]])
+      my_buffer.append(values[-1])
+      self.assertAllEqual(my_buffer.values.numpy(), values)
+      self.assertAllEqual(my_buffer.current_size.numpy(), i + 1)
+
+    # A new segment is added each time the last one fills up.
+    self.assertAllEqual(my_buffer.capacity.numpy(), 6)
+
+  def test_segmented_fail_on_inconsistent_shape(self):
+    my_buffer = tensor_buffer.SegmentedTensorBuffer(
+        1, [2, 3], name='my_buffer')
+
+    with self.assertRaisesRegex(
+        tf.errors.InvalidArgumentError,
+        'Appending value of inconsistent shape.'):
+      my_buffer.append(tf.ones(shape=[3, 4], dtype=tf.int32))
+
+
+class TensorBufferBenchmark(tf.test.Benchmark):
+  """Benchmarks for appending to buffers in eager mode.
+
+  Run with `python tensor_buffer_test_eager.py --benchmarks=.`.
+  """
+
+  def _benchmark_append(self, name, buffer_fn, num_appends=4096):
+    my_buffer = buffer_fn()
+    value = tf.ones([3], tf.float32)
+    start = time.time()
+    for _ in range(num_appends):
+      my_buffer.append(value)
+    my_buffer.values.numpy()
+    wall_time = time.time() - start
+    self.report_benchmark(
+        name=name, iters=num_appends, wall_time=wall_time / num_appends)
+
+  def benchmark_append(self):
+    self._benchmark_append(
+        'tensor_buffer_append',
+        lambda: tensor_buffer.TensorBuffer(1, [3], tf.float32, 'buffer'))
+
+  def benchmark_segmented_append(self):
+    self._benchmark_append(
+        'segmented_tensor_buffer_append',
+        lambda: tensor_buffer.SegmentedTensorBuffer(  # pylint: disable=g-long-lambda
+            4096, [3], tf.float32, 'buffer', segment_size=256))
+
 
 if __name__ == '__main__':
   tf.test.main()
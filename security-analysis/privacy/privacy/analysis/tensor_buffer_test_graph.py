@@ -17,6 +17,8 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import time
+
 import tensorflow as tf
 
 from privacy.analysis import tensor_buffer
@@ -67,6 +69,73 @@ class TensorBufferTest(tf.test.TestCase):
       self.assertEqual(cs, 3)
       self.assertEqual(cap, 4)
 
+  def test_segmented_resize(self):
+    """Test segmented buffer appends past its capacity hint."""
+    with self.cached_session() as sess:
+      size, shape = 2, [2, 3]
+
+      my_buffer = tensor_buffer.SegmentedTensorBuffer(
+          size, shape, name='my_buffer', segment_size=2)
+      values = [[[i, i + 1, i + 2], [i + 3, i + 4, i + 5]] for i in range(5)]
+      append = tf.no_op()
+      for value in values:
+        with tf.control_dependencies([append]):
+          append = my_buffer.append(value)
+      self.evaluate(tf.global_variables_initializer())
+
+      # The buffer is read in a separate run, after all appends finished.
+      sess.run(append)
+      v, cs, cap = sess.run(
+          [my_buffer.values, my_buffer.current_size, my_buffer.capacity])
+      self.assertAllEqual(v, values)
+      self.assertEqual(cs, 5)
+      # Two preallocated entries plus an overflow buffer doubled to four (or
+      # three segments of two when run eagerly).
+      self.assertEqual(cap, 6)
+
+
+  def test_segmented_graph_size(self):
+    """Test segmented buffer graph does not grow with the capacity hint."""
+    num_ops = []
+    for capacity_hint in [1000, 100000]:
+      with tf.Graph().as_default() as graph:
+        my_buffer = tensor_buffer.SegmentedTensorBuffer(
+            capacity_hint, [3], name='my_buffer', segment_size=4)
+        my_buffer.append([1, 2, 3])
+        num_ops.append(len(graph.get_operations()))
+    self.assertEqual(num_ops[0], num_ops[1])
+
+
+class TensorBufferBenchmark(tf.test.Benchmark):
+  """Benchmarks for appending to buffers in graph mode.
+
+  Run with `python tensor_buffer_test_graph.py --benchmarks=.`.
+  """
+
+  def _benchmark_append(self, name, buffer_fn, num_appends=4096):
+    with tf.Graph().as_default(), tf.Session() as sess:
+      my_buffer = buffer_fn()
+      append = my_buffer.append(tf.ones([3], tf.float32))
+      sess.run(tf.global_variables_initializer())
+      start = time.time()
+      for _ in range(num_appends):
+        sess.run(append)
+      sess.run(my_buffer.values)
+      wall_time = time.time() - start
+    self.report_benchmark(
+        name=name, iters=num_appends, wall_time=wall_time / num_appends)
+
+  def benchmark_append(self):
+    self._benchmark_append(
+        'tensor_buffer_append',
+        lambda: tensor_buffer.TensorBuffer(1, [3], tf.float32, 'buffer'))
+
+  def benchmark_segmented_append(self):
+    self._benchmark_append(
+        'segmented_tensor_buffer_append',
+        lambda: tensor_buffer.SegmentedTensorBuffer(  # pylint: disable=g-long-lambda
+            4096, [3], tf.float32, 'buffer', segment_size=256))
+
 
 if __name__ == '__main__':
   tf.test.main()
@@ -1,8 +1,19 @@
 import csv
+import json
+import os
+import sqlite3
+import uuid
+
+import numpy as np
 import pandas as pd
 
 COLUMNS = ["number_nodes", "sample_ratio", "adversarial_client_control", "noise_multiplier", "delta", "committee_size", "epsilon", "rounds_adversary_observes", "rounds_adversary_majority", "epsilon_list"]
 
+# The columns that identify a configuration; ResultStore indexes them.
+CONFIG_COLUMNS = COLUMNS[:6]
+
+RESULT_STORE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
 def write_output_to_file(output_file, fields):
 
 	with open(output_file,'a') as output:
@@ -13,11 +24,336 @@ def write_output_to_file(output_file, fields):
 
 def write_header_if_file_empty(output_file):
 
-	try:		
-		df = pd.read_csv(output_file)
-
-	except pd.errors.EmptyDataError:
+	if not os.path.exists(output_file) or os.path.getsize(output_file) == 0:
 
 		with open(output_file,'a') as output:			
 			writer = csv.writer(output)	
-			writer.writerow(COLUMNS)
\ No newline at end of file
+			writer.writerow(COLUMNS)
+
+
+def is_result_store(output_file):
+
+	return output_file.endswith(RESULT_STORE_EXTENSIONS)
+
+
+def open_results(output_file):
+
+	# SQLite files get the indexed ResultStore, anything else the CSV file.
+	if is_result_store(output_file):
+		return ResultStore(output_file)
+
+	return CsvResults(output_file)
+
+
+class CsvResults(object):
+
+	# Appends rows to a CSV file. Configuration hashes are kept in a side file,
+	# <output_file>.done, read once when the object is created.
+
+	def __init__(self, output_file):
+
+		self.output_file = output_file
+		self.done_file = output_file + '.done'
+
+		write_header_if_file_empty(output_file)
+
+		self._done = set()
+		if os.path.exists(self.done_file):
+			with open(self.done_file) as done_input:
+				self._done = set(line.strip() for line in done_input)
+
+	def contains(self, config_hash):
+
+		return config_hash in self._done
+
+	def write(self, fields, config_hash=None):
+
+		write_output_to_file(self.output_file, fields)
+
+		if config_hash is not None:
+			with open(self.done_file, 'a') as done_output:
+				done_output.write(config_hash + '\n')
+			self._done.add(config_hash)
+
+	def read(self, **filters):
+
+		return filter_results(pd.read_csv(self.output_file), filters)
+
+	def close(self):
+		pass
+
+
+class ResultStore(object):
+
+	# Results in an SQLite file in WAL mode, so several processes can write to
+	# it at once (each opens its own connection). Rows have the COLUMNS fields,
+	# with epsilon_list stored as JSON, plus an optional configuration hash.
+	# The hash has a unique index for existence checks, and the configuration
+	# columns have an index for filtered reads.
+
+	def __init__(self, path, timeout=60.):
+
+		self.path = path
+		self._timeout = timeout
+		self._conn = None
+		self._pid = None
+		self._connection()
+
+	def _connection(self):
+
+		if self._conn is None or self._pid != os.getpid():
+			conn = sqlite3.connect(self.path, timeout=self._timeout, isolation_level=None)
+			conn.execute('PRAGMA journal_mode=WAL')
+			conn.execute('CREATE TABLE IF NOT EXISTS results ({}, config_hash TEXT)'.format(
+			    ', '.join('{} {}'.format(column, _column_type(column)) for column in COLUMNS)))
+			conn.execute('CREATE INDEX IF NOT EXISTS results_config ON results ({})'.format(
+			    ', '.join(CONFIG_COLUMNS)))
+			conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS results_hash ON results (config_hash)')
+			self._conn, self._pid = conn, os.getpid()
+
+		return self._conn
+
+	def contains(self, config_hash):
+
+		row = self._connection().execute(
+		    'SELECT 1 FROM results WHERE config_hash = ? LIMIT 1', (config_hash,)).fetchone()
+
+		return row is not None
+
+	def contains_configuration(self, **config):
+
+		where, values = _where_clause(config)
+		row = self._connection().execute(
+		    'SELECT 1 FROM results' + where + ' LIMIT 1', values).fetchone()
+
+		return row is not None
+
+	def write(self, fields, config_hash=None):
+
+		# NumPy scalars are converted to Python ones for sqlite3. epsilon_list
+		# is either the trajectory, or its ID in a TrajectoryStore.
+		row = [getattr(value, 'item', lambda: value)() for value in fields[:-1]]
+		row.append(_encode_epsilon_list(fields[-1]))
+
+		conn = self._connection()
+		with conn:
+			conn.execute('BEGIN IMMEDIATE')
+			conn.execute('INSERT OR REPLACE INTO results VALUES ({})'.format(
+			    ', '.join('?' * (len(COLUMNS) + 1))), row + [config_hash])
+
+	def read(self, **filters):
+
+		# Equality filters on any of the COLUMNS, answered from the index.
+		where, values = _where_clause(filters)
+		results = pd.read_sql_query('SELECT {} FROM results'.format(', '.join(COLUMNS)) + where,
+		    self._connection(), params=values)
+		results["epsilon_list"] = results["epsilon_list"].map(_decode_epsilon_list)
+
+		return results
+
+	def export_csv(self, output_file):
+
+		# Same format as write_output_to_file, epsilon_list included.
+		with open(output_file, 'w') as output:
+			writer = csv.writer(output)
+			writer.writerow(COLUMNS)
+			for row in self._connection().execute('SELECT {} FROM results'.format(', '.join(COLUMNS))):
+				row = list(row)
+				row[-1] = _decode_epsilon_list(row[-1])
+				writer.writerow(row)
+
+	def close(self):
+
+		if self._conn is not None and self._pid == os.getpid():
+			self._conn.close()
+		self._conn = None
+
+
+class TrajectoryStore(object):
+
+	# Per-round epsilon trajectories, kept out of the results as float32 .npy
+	# chunk files in a directory and read back memory-mapped, so a trajectory
+	# loads without parsing and scanning many of them only touches the pages
+	# read. index.jsonl maps each trajectory ID to its chunk, offset and length.
+	#
+	# Trajectories are buffered until flush(), which writes them as one chunk.
+	# Chunk names are unique, so several processes can write to one directory.
+
+	INDEX_FILE = 'index.jsonl'
+
+	def __init__(self, directory, chunk_size=2**20):
+
+		self.directory = directory
+		self.chunk_size = chunk_size
+
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+
+		self._pending_ids = []
+		self._pending = []
+		self.pending_size = 0
+
+		self._index = {}
+		self._index_offset = 0
+		self._chunks = {}
+
+	def write(self, trajectory_id, epsilon_list):
+
+		self._pending_ids.append(trajectory_id)
+		self._pending.append(np.asarray(epsilon_list, dtype=np.float32))
+		self.pending_size += len(self._pending[-1])
+
+	def flush(self):
+
+		if not self._pending:
+			return
+
+		chunk = 'chunk-{}.npy'.format(uuid.uuid4().hex)
+		chunk_path = os.path.join(self.directory, chunk)
+
+		# Written under a temporary name, so the index never points at a partial
+		# chunk.
+		with open(chunk_path + '.tmp', 'wb') as chunk_output:
+			np.save(chunk_output, np.concatenate(self._pending))
+		os.rename(chunk_path + '.tmp', chunk_path)
+
+		entries = []
+		offset = 0
+		for trajectory_id, trajectory in zip(self._pending_ids, self._pending):
+			entries.append(json.dumps([trajectory_id, chunk, offset, len(trajectory)]))
+			offset += len(trajectory)
+
+		with open(os.path.join(self.directory, self.INDEX_FILE), 'a') as index_output:
+			index_output.write(''.join(entry + '\n' for entry in entries))
+
+		self._pending_ids = []
+		self._pending = []
+		self.pending_size = 0
+
+	def _update_index(self):
+
+		# Reads index entries appended since the last call.
+		index_file = os.path.join(self.directory, self.INDEX_FILE)
+		if not os.path.exists(index_file):
+			return
+
+		with open(index_file) as index_input:
+			index_input.seek(self._index_offset)
+			for line in iter(index_input.readline, ''):
+				if not line.endswith('\n'):
+					break
+				trajectory_id, chunk, offset, length = json.loads(line)
+				self._index[trajectory_id] = (chunk, offset, length)
+				self._index_offset = index_input.tell()
+
+	def __contains__(self, trajectory_id):
+
+		if trajectory_id not in self._index:
+			self._update_index()
+
+		return trajectory_id in self._index or trajectory_id in self._pending_ids
+
+	def ids(self):
+
+		self._update_index()
+
+		return list(self._index)
+
+	def load(self, trajectory_id):
+
+		# A read-only memory-mapped view of the trajectory.
+		if trajectory_id in self._pending_ids:
+			return self._pending[self._pending_ids.index(trajectory_id)]
+
+		if trajectory_id not in self._index:
+			self._update_index()
+
+		chunk, offset, length = self._index[trajectory_id]
+		if chunk not in self._chunks:
+			self._chunks[chunk] = np.load(os.path.join(self.directory, chunk), mmap_mode='r')
+
+		return self._chunks[chunk][offset:offset + length]
+
+	def iter_trajectories(self, trajectory_ids=None):
+
+		# Yields (ID, trajectory) pairs in storage order, so chunks are read
+		# sequentially.
+		self._update_index()
+		if trajectory_ids is None:
+			trajectory_ids = list(self._index)
+
+		for trajectory_id in sorted(trajectory_ids, key=lambda x: self._index[x][:2]):
+			yield trajectory_id, self.load(trajectory_id)
+
+	def close(self):
+
+		self.flush()
+		self._chunks = {}
+
+
+def resolve_epsilon_lists(results, trajectory_dir=None):
+
+	# Replaces the epsilon_list column of results read from a CSV file or a
+	# ResultStore by the per-round epsilons: inline JSON lists are parsed, and
+	# trajectory IDs are loaded from the TrajectoryStore in trajectory_dir.
+	trajectories = TrajectoryStore(trajectory_dir) if trajectory_dir else None
+
+	def resolve(value):
+		if isinstance(value, str):
+			value = _decode_epsilon_list(value)
+		if not isinstance(value, str):
+			return value
+		if trajectories is None:
+			raise ValueError('epsilon_list holds trajectory ID {}, but no trajectory directory was given'.format(value))
+		return trajectories.load(value)
+
+	results = results.copy()
+	results["epsilon_list"] = results["epsilon_list"].map(resolve)
+
+	return results
+
+
+def filter_results(results, filters):
+
+	for column, value in filters.items():
+		results = results[results[column] == value]
+
+	return results
+
+
+def _encode_epsilon_list(epsilon_list):
+
+	if isinstance(epsilon_list, str):
+		return epsilon_list
+
+	return json.dumps([float(epsilon) for epsilon in epsilon_list])
+
+
+def _decode_epsilon_list(value):
+
+	if value.startswith('['):
+		return json.loads(value)
+
+	return value
+
+
+def _column_type(column):
+
+	if column in ("number_nodes", "committee_size", "rounds_adversary_observes", "rounds_adversary_majority"):
+		return 'INTEGER'
+	if column == "epsilon_list":
+		return 'TEXT'
+
+	return 'REAL'
+
+
+def _where_clause(filters):
+
+	for column in filters:
+		if column not in COLUMNS:
+			raise ValueError('Unknown result column: {}'.format(column))
+
+	if not filters:
+		return '', []
+
+	return ' WHERE ' + ' AND '.join('{} = ?'.format(column) for column in filters), list(filters.values())
@@ -0,0 +1,225 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for utils.py."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import multiprocessing
+import os
+
+from absl.testing import absltest
+import numpy as np
+import pandas as pd
+
+from privacy.analysis import utils
+
+
+def _fields(number_nodes, committee_size, epsilon_list=(1., 2.)):
+  return [number_nodes, 0.1, 0.2, 1.1, 1e-5, committee_size,
+          epsilon_list[-1], 3, 1, list(epsilon_list)]
+
+
+def _write_rows(args):
+  """Writes a range of rows to a ResultStore from a worker process."""
+  path, start, stop = args
+  store = utils.ResultStore(path)
+  for number_nodes in range(start, stop):
+    store.write(_fields(number_nodes, 5), 'hash-{}'.format(number_nodes))
+  store.close()
+
+
+class ResultStoreTest(absltest.TestCase):
+
+  def setUp(self):
+    super(ResultStoreTest, self).setUp()
+    self.path = os.path.join(self.create_tempdir().full_path, 'results.db')
+
+  def test_open_results_picks_store_by_extension(self):
+    self.assertIsInstance(utils.open_results(self.path), utils.ResultStore)
+    csv_path = os.path.join(self.create_tempdir().full_path, 'results.csv')
+    self.assertIsInstance(utils.open_results(csv_path), utils.CsvResults)
+
+  def test_write_deduplicates_by_hash(self):
+    store = utils.ResultStore(self.path)
+    self.assertFalse(store.contains('a'))
+    store.write(_fields(100, 5), 'a')
+    store.write(_fields(100, 5, [1., 4.]), 'a')
+    store.write(_fields(200, 5), 'b')
+    store.close()
+
+    store = utils.ResultStore(self.path)
+    self.assertTrue(store.contains('a'))
+    self.assertFalse(store.contains('c'))
+    results = store.read()
+    self.assertLen(results, 2)
+    # The later write replaces the earlier one.
+    self.assertEqual(
+        results[results.number_nodes == 100].epsilon_list.iloc[0], [1., 4.])
+    store.close()
+
+  def test_filtered_read(self):
+    store = utils.ResultStore(self.path)
+    for number_nodes in (100, 200):
+      for committee_size in (5, 7):
+        store.write(_fields(number_nodes, committee_size),
+                    '{}-{}'.format(number_nodes, committee_size))
+
+    results = store.read(number_nodes=200, committee_size=7)
+    self.assertLen(results, 1)
+    self.assertEqual(results.number_nodes.iloc[0], 200)
+    self.assertEqual(results.committee_size.iloc[0], 7)
+    self.assertLen(store.read(committee_size=5), 2)
+    self.assertTrue(store.contains_configuration(number_nodes=100))
+    self.assertFalse(store.contains_configuration(number_nodes=300))
+    with self.assertRaises(ValueError):
+      store.read(unknown=1)
+    store.close()
+
+  def test_numpy_scalars_and_trajectory_ids(self):
+    store = utils.ResultStore(self.path)
+    fields = _fields(np.int64(100), np.int64(5))
+    fields[6] = np.float64(2.)
+    fields[-1] = 'trajectory-id'
+    store.write(fields, 'a')
+    results = store.read()
+    self.assertEqual(results.epsilon_list.iloc[0], 'trajectory-id')
+    self.assertEqual(results.epsilon.iloc[0], 2.)
+    store.close()
+
+  def test_export_csv_round_trip(self):
+    store = utils.ResultStore(self.path)
+    store.write(_fields(100, 5, [0.5, 1.5]), 'a')
+    store.write(_fields(200, 7), 'b')
+    csv_path = os.path.join(self.create_tempdir().full_path, 'results.csv')
+    store.export_csv(csv_path)
+
+    exported = pd.read_csv(csv_path)
+    self.assertEqual(list(exported.columns), utils.COLUMNS)
+    expected = store.read()
+    pd.testing.assert_frame_equal(
+        exported.drop(columns='epsilon_list'),
+        expected.drop(columns='epsilon_list'))
+    self.assertEqual(
+        [utils._decode_epsilon_list(value)  # pylint: disable=protected-access
+         for value in exported.epsilon_list],
+        list(expected.epsilon_list))
+    store.close()
+
+  def test_concurrent_writers(self):
+    # Creates the schema first, as a sweep does before starting its workers.
+    utils.ResultStore(self.path).close()
+    pool = multiprocessing.Pool(2)
+    try:
+      pool.map(_write_rows, [(self.path, 0, 50), (self.path, 50, 100)])
+    finally:
+      pool.close()
+      pool.join()
+
+    store = utils.ResultStore(self.path)
+    results = store.read()
+    self.assertEqual(sorted(results.number_nodes), list(range(100)))
+    self.assertTrue(all(store.contains('hash-{}'.format(i))
+                        for i in range(100)))
+    store.close()
+
+
+class CsvResultsTest(absltest.TestCase):
+
+  def setUp(self):
+    super(CsvResultsTest, self).setUp()
+    self.path = os.path.join(self.create_tempdir().full_path, 'results.csv')
+
+  def test_done_file_survives_reopen(self):
+    results = utils.CsvResults(self.path)
+    self.assertFalse(results.contains('a'))
+    results.write(_fields(100, 5), 'a')
+    results.write(_fields(200, 5))
+    results.close()
+
+    with open(self.path + '.done') as done_input:
+      self.assertEqual(done_input.read(), 'a\n')
+
+    results = utils.CsvResults(self.path)
+    self.assertTrue(results.contains('a'))
+    self.assertFalse(results.contains('b'))
+    self.assertLen(results.read(), 2)
+    self.assertLen(results.read(number_nodes=200), 1)
+
+  def test_header_written_once(self):
+    utils.CsvResults(self.path).write(_fields(100, 5), 'a')
+    utils.CsvResults(self.path).write(_fields(200, 5), 'b')
+    with open(self.path) as csv_input:
+      lines = csv_input.read().splitlines()
+    self.assertEqual(lines[0], ','.join(utils.COLUMNS))
+    self.assertLen(lines, 3)
+
+
+class TrajectoryStoreTest(absltest.TestCase):
+
+  def setUp(self):
+    super(TrajectoryStoreTest, self).setUp()
+    self.directory = os.path.join(self.create_tempdir().full_path, 'traj')
+
+  def test_round_trip(self):
+    store = utils.TrajectoryStore(self.directory, chunk_size=4)
+    store.write('a', [1., 2., 3.])
+    store.write('b', [4., 5.])
+    # Pending trajectories are readable before they are flushed.
+    self.assertIn('a', store)
+    np.testing.assert_array_equal(store.load('b'), [4., 5.])
+    self.assertEqual(store.pending_size, 5)
+    store.close()
+    self.assertLen(
+        [name for name in os.listdir(self.directory) if name.endswith('.npy')],
+        1)
+
+    store = utils.TrajectoryStore(self.directory)
+    self.assertCountEqual(store.ids(), ['a', 'b'])
+    trajectory = store.load('a')
+    self.assertIsInstance(trajectory, np.memmap)
+    self.assertEqual(trajectory.dtype, np.float32)
+    np.testing.assert_array_equal(trajectory, [1., 2., 3.])
+
+    # Appending after reopening adds a chunk and keeps the earlier ones.
+    store.write('c', [6.])
+    store.close()
+    store = utils.TrajectoryStore(self.directory)
+    self.assertIn('c', store)
+    self.assertNotIn('d', store)
+    self.assertEqual(
+        [(trajectory_id, list(trajectory))
+         for trajectory_id, trajectory in store.iter_trajectories()],
+        [('a', [1., 2., 3.]), ('b', [4., 5.]), ('c', [6.])])
+    store.close()
+
+  def test_resolve_epsilon_lists(self):
+    store = utils.TrajectoryStore(self.directory)
+    store.write('a', [0.5, 1.5])
+    store.close()
+
+    results = pd.DataFrame({'epsilon_list': ['a', '[0.25, 0.75]', [1., 2.]]})
+    resolved = utils.resolve_epsilon_lists(results, self.directory)
+    np.testing.assert_array_equal(resolved.epsilon_list[0], [0.5, 1.5])
+    self.assertEqual(resolved.epsilon_list[1], [0.25, 0.75])
+    self.assertEqual(resolved.epsilon_list[2], [1., 2.])
+    self.assertEqual(results.epsilon_list[0], 'a')
+    with self.assertRaises(ValueError):
+      utils.resolve_epsilon_lists(results)
+
+
+if __name__ == '__main__':
+  absltest.main()
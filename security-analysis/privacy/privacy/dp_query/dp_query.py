@@ -47,6 +47,8 @@ from __future__ import division
 from __future__ import print_function
 
 import abc
+import collections
+import contextlib
 from distutils.version import LooseVersion
 
 import tensorflow as tf
@@ -194,6 +196,58 @@ class DPQuery(object):
     pass
 
 
+# Sum queries deferred by the active batch_ledger_queries context, if any,
+# as a map from id(ledger) to (ledger, l2_norm_bounds, noise_stddevs).
+_ledger_query_batches = []
+
+
+@contextlib.contextmanager
+def batch_ledger_queries():
+  """Records the sum queries issued in the context with one op per ledger.
+
+  Inside the context, record_sum_query defers the queries of ledgers that
+  support record_sum_queries. On exit they are recorded in the order in which
+  they were issued, and the recording ops are appended to the yielded list.
+  Nested contexts defer to the outermost one.
+
+  Yields:
+    A list of ops, filled when the context exits.
+  """
+  record_ops = []
+  if _ledger_query_batches:
+    yield record_ops
+    return
+
+  _ledger_query_batches.append(collections.OrderedDict())
+  try:
+    yield record_ops
+  finally:
+    batch = _ledger_query_batches.pop()
+  for ledger, l2_norm_bounds, noise_stddevs in batch.values():
+    record_ops.append(ledger.record_sum_queries(
+        tf.stack(l2_norm_bounds), tf.stack(noise_stddevs)))
+
+
+def record_sum_query(ledger, l2_norm_bound, noise_stddev):
+  """Records a sum query to the ledger, or defers it to the active batch.
+
+  Args:
+    ledger: The privacy ledger.
+    l2_norm_bound: The maximum l2 norm of the tensor group in the query.
+    noise_stddev: The standard deviation of the noise applied to the sum.
+
+  Returns:
+    A list of the ops the sample state should depend on.
+  """
+  if _ledger_query_batches and hasattr(ledger, 'record_sum_queries'):
+    _, l2_norm_bounds, noise_stddevs = _ledger_query_batches[-1].setdefault(
+        id(ledger), (ledger, [], []))
+    l2_norm_bounds.append(l2_norm_bound)
+    noise_stddevs.append(noise_stddev)
+    return []
+  return [ledger.record_sum_query(l2_norm_bound, noise_stddev)]
+
+
 def zeros_like(arg):
   """A `zeros_like` function that also works for `tf.TensorSpec`s."""
   try:
@@ -55,9 +55,8 @@ class GaussianSumQuery(dp_query.SumAggregationDPQuery):
 
   def initial_sample_state(self, global_state, template):
     if self._ledger:
-      dependencies = [
-          self._ledger.record_sum_query(self._l2_norm_clip, self._stddev)
-      ]
+      dependencies = dp_query.record_sum_query(
+          self._ledger, self._l2_norm_clip, self._stddev)
     else:
       dependencies = []
     with tf.control_dependencies(dependencies):
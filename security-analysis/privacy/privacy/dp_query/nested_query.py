@@ -71,8 +71,19 @@ class NestedQuery(dp_query.DPQuery):
     return self._map_to_queries('derive_sample_params', global_state)
 
   def initial_sample_state(self, global_state, template):
-    """See base class."""
-    return self._map_to_queries('initial_sample_state', global_state, template)
+    """See base class.
+
+    The sum queries the subqueries record to a ledger that supports
+    record_sum_queries are recorded with a single op, in the order of the
+    query structure.
+    """
+    with dp_query.batch_ledger_queries() as record_ops:
+      sample_state = self._map_to_queries(
+          'initial_sample_state', global_state, template)
+    if not record_ops:
+      return sample_state
+    with tf.control_dependencies(record_ops):
+      return nest.map_structure(tf.identity, sample_state)
 
   def preprocess_record(self, params, record):
     """See base class."""
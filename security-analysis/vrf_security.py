@@ -1,6 +1,9 @@
 import matplotlib
 import numpy as np
-from scipy.special import comb
+from scipy.stats import binom
+from scipy.stats import hypergeom
+from scipy.signal import fftconvolve
+from scipy import fft as scipy_fft
 import matplotlib.pyplot as plt
 import matplotlib.lines as mlines
 
@@ -23,10 +26,14 @@ def main():
 	committee_sizes = binomialWithoutReplacement(num_clients, stake_values, prob_thresholds)
 
 	## Add other probability distributions
+
+	finite_committee_sizes = finitePopulationCommitteeSizes(num_clients, stake_values, prob_thresholds)
 	
 	print(committee_sizes)
 
-	plotStakeVsCommitteeSize(committee_sizes, stake_values, prob_thresholds)
+	print(finite_committee_sizes)
+
+	plotStakeVsCommitteeSize(committee_sizes, stake_values, prob_thresholds, finite_committee_sizes)
 
 # Uses the formula sum(kCi * (adversary_stake)^i * (adversary_stake)^(N-i))
 
@@ -34,38 +41,281 @@ def main():
 
 def binomialWithoutReplacement(num_clients, stake_values, prob_thresholds):
 
-	committee_sizes_by_prob = []
-	
-	for prob_threshold in prob_thresholds:
+	committee_sizes = searchCommitteeSizes(num_clients, stake_values, prob_thresholds, binomialLogMajorityProb)
 
-		committee_sizes = np.array(range(3, num_clients))
+	# Stakes for which no committee size is safe enough are left out.
+	return [[int(size) for size in committee_sizes_row if size > 0] for committee_sizes_row in committee_sizes]
 
-		committee_values = []
+def binomialLogMajorityProb(committee_sizes, stake_values):
 
-		for stake_value in stake_values:
+	# log P(more than half of the committee is adversarial)
+	return binom.logsf(np.floor(committee_sizes / 2), committee_sizes, stake_values)
 
-			for committee_size in committee_sizes:
+# Exact finite-population model: the committee is k distinct clients drawn
+# uniformly from num_clients, round(stake * num_clients) of which are sybils, so
+# the number of sybils on the committee is hypergeometric.
 
-				startSize = int(committee_size/2) + 1
-				# print(startSize)
+def finitePopulationCommitteeSizes(num_clients, stake_values, prob_thresholds):
 
-				majority_idxs = np.array(range(startSize, committee_size+1))
+	log_majority_prob = lambda committee_sizes, stakes: hypergeometricLogMajorityProb(committee_sizes, stakes, num_clients)
 
-				# print(majority_idxs)
+	committee_sizes = searchCommitteeSizes(num_clients, stake_values, prob_thresholds, log_majority_prob)
 
-				committee_probability = np.sum([comb(committee_size, idx, exact=True) * (stake_value)**idx * (1-stake_value)**(committee_size - idx) for idx in majority_idxs]) 
+	return [[int(size) for size in committee_sizes_row if size > 0] for committee_sizes_row in committee_sizes]
 
-				# print(committee_probability)
+def hypergeometricLogMajorityProb(committee_sizes, stake_values, num_clients):
 
-				if committee_probability < prob_threshold:
-					committee_values.append(committee_size)
-					break
+	# Broadcasts over committee sizes, stakes and population sizes.
+	num_sybils = np.rint(np.multiply(stake_values, num_clients))
 
-		committee_sizes_by_prob.append(committee_values)		
-	
-	return committee_sizes_by_prob
+	return hypergeom.logsf(np.floor(np.divide(committee_sizes, 2)), num_clients, num_sybils, committee_sizes)
+
+# Stake-weighted model (VRF sortition): every client is independently selected
+# with probability min(1, k * stake / total_stake), so k is the expected
+# committee size. Sybil and honest seat counts are independent Poisson-binomial
+# variables and the sybils collude successfully if they outnumber honest
+# members. node_stakes holds arbitrary per-client stakes; for each stake value
+# the sybils are the lowest-stake clients that together hold that share.
+
+def stakeWeightedCommitteeSizes(node_stakes, stake_values, prob_thresholds):
+
+	sorted_stakes = np.sort(np.asarray(node_stakes, dtype=float), kind='mergesort')
+
+	num_sybils = [getNumSybils(sorted_stakes, stake_value) for stake_value in stake_values]
+
+	# The sybils of every stake value are a prefix of the sorted clients, so one
+	# committee size is evaluated for all stake values at once and memoized;
+	# the search probes the same size for several stakes and thresholds.
+	memo = {}
+
+	def log_majority_prob(committee_sizes, stakes):
+
+		for committee_size in np.unique(committee_sizes):
+
+			if committee_size not in memo:
+				log_probs = stakeWeightedLogMajorityProbs(committee_size, sorted_stakes, num_sybils)
+				memo[committee_size] = dict(zip(stake_values, log_probs))
+
+		return np.array([memo[committee_size][stake] for committee_size, stake in zip(np.ravel(committee_sizes), np.ravel(stakes))]).reshape(np.shape(committee_sizes))
+
+	committee_sizes = searchCommitteeSizes(len(sorted_stakes), stake_values, prob_thresholds, log_majority_prob)
+
+	return [[int(size) for size in committee_sizes_row if size > 0] for committee_sizes_row in committee_sizes]
+
+def getNumSybils(sorted_stakes, stake_value):
+
+	# Number of lowest-stake clients that together hold at least stake_value.
+	if stake_value <= 0:
+		return 0
+
+	cum_stake = np.cumsum(sorted_stakes) / np.sum(sorted_stakes)
+
+	return min(int(np.searchsorted(cum_stake, stake_value - 1e-12)) + 1, len(sorted_stakes))
+
+def getSybilMask(node_stakes, stake_value):
+
+	order = np.argsort(node_stakes, kind='mergesort')
+
+	sybil_mask = np.zeros(len(node_stakes), dtype=bool)
+	sybil_mask[order[:getNumSybils(node_stakes[order], stake_value)]] = True
+
+	return sybil_mask
+
+def stakeWeightedLogMajorityProb(committee_size, node_stakes, sybil_mask):
+
+	select_probs = np.minimum(1.0, committee_size * node_stakes / np.sum(node_stakes))
+
+	return collusionLogProb(seatCountPmf(select_probs[sybil_mask]), seatCountPmf(select_probs[~sybil_mask]))
+
+def stakeWeightedLogMajorityProbs(committee_size, sorted_stakes, num_sybils):
+
+	# Like stakeWeightedLogMajorityProb for the sybil prefixes num_sybils of the
+	# sorted stakes. The clients between consecutive prefix ends form segments
+	# whose seat-count pmfs are computed once; the sybil pmf of a prefix is the
+	# product of the segments before its end and the honest pmf that of the
+	# segments after it.
+	select_probs = np.minimum(1.0, committee_size * sorted_stakes / np.sum(sorted_stakes))
+
+	ends = np.unique(np.concatenate([[0], num_sybils, [len(sorted_stakes)]]))
+	segment_pmfs = [seatCountPmf(select_probs[start:end]) for start, end in zip(ends[:-1], ends[1:])]
+
+	prefix_pmfs = [np.ones(1)]
+	for pmf in segment_pmfs:
+		prefix_pmfs.append(convolvePmf(prefix_pmfs[-1], pmf))
+
+	suffix_pmfs = [np.ones(1)]
+	for pmf in reversed(segment_pmfs):
+		suffix_pmfs.append(convolvePmf(suffix_pmfs[-1], pmf))
+	suffix_pmfs.reverse()
+
+	split_idx = np.searchsorted(ends, num_sybils)
+
+	return np.array([collusionLogProb(prefix_pmfs[idx], suffix_pmfs[idx]) for idx in split_idx])
+
+def collusionLogProb(sybil_pmf, honest_pmf):
+
+	honest_cdf = np.cumsum(honest_pmf)
+
+	# P(sybils > honest) = sum_a P(sybils = a) * P(honest <= a - 1)
+	num_terms = min(len(sybil_pmf), len(honest_cdf) + 1)
+	collusion_prob = np.dot(sybil_pmf[1:num_terms], honest_cdf[:num_terms - 1])
+	collusion_prob += np.sum(sybil_pmf[num_terms:])
+	collusion_prob = min(collusion_prob, 1.0)
+
+	with np.errstate(divide='ignore'):
+		return np.log(collusion_prob)
+
+def seatCountPmf(select_probs):
+
+	# Nodes that are always (or never) selected only shift the seat count, so
+	# they are kept out of the convolutions.
+	num_sure = np.count_nonzero(select_probs >= 1)
+	uncertain_probs = select_probs[(select_probs > 0) & (select_probs < 1)]
+
+	unique_probs, counts = np.unique(uncertain_probs, return_counts=True)
+
+	if len(unique_probs) <= 16:
+
+		# Few distinct stakes (e.g. uniform): one exact binomial per stake level.
+		pmf = np.ones(1)
+
+		for prob, count in zip(unique_probs, counts):
+			support = seatCountSupport(count * prob, count * prob * (1 - prob), count)
+
+			pmf = convolvePmf(pmf, binom.pmf(np.arange(support + 1), count, prob))
+
+	else:
+		support = seatCountSupport(np.sum(uncertain_probs), np.sum(uncertain_probs * (1 - uncertain_probs)), len(uncertain_probs))
 
-def plotStakeVsCommitteeSize(committee_sizes, stake_values, prob_thresholds):
+		pmf = poissonBinomialPmf(uncertain_probs, support)
+
+	return np.concatenate([np.zeros(num_sure), pmf])
+
+def seatCountSupport(mean, variance, num_nodes):
+
+	# The upper tail beyond 40 standard deviations is negligible; cutting it
+	# keeps the pmfs short when many clients each hold little stake.
+	return min(num_nodes, int(np.ceil(mean + 40 * np.sqrt(variance) + 40)))
+
+def convolvePmf(pmf_a, pmf_b):
+
+	# Direct convolution is exact up to rounding; FFT is only used once both
+	# factors are long, where the direct product gets quadratic.
+	if min(len(pmf_a), len(pmf_b)) <= 2048:
+		return np.convolve(pmf_a, pmf_b)
+
+	return np.maximum(fftconvolve(pmf_a, pmf_b), 0)
+
+def poissonBinomialPmf(probs, support=None):
+
+	# Every node contributes the polynomial (1 - p) + p * x; the product is
+	# taken pairwise in a balanced tree, one batched convolution per level.
+	# Terms above x^support (at most the number of nodes) are dropped after
+	# every level.
+	support = len(probs) if support is None else min(support, len(probs))
+	pmfs = np.stack([1 - probs, probs], axis=1)
+
+	if not len(pmfs):
+		return np.ones(1)
+
+	while len(pmfs) > 1:
+
+		if len(pmfs) % 2:
+			unit = np.zeros((1, pmfs.shape[1]))
+			unit[0, 0] = 1
+			pmfs = np.vstack([pmfs, unit])
+
+		pmfs = convolvePmfs(pmfs[0::2], pmfs[1::2])[:, :support + 1]
+
+	return pmfs[0]
+
+def convolvePmfs(pmfs_a, pmfs_b):
+
+	# Row-wise convolution of two equally shaped batches of pmfs.
+	num_rows, size = pmfs_a.shape
+
+	if size <= 16:
+
+		pmfs = np.zeros((num_rows, 2 * size - 1))
+
+		for shift in range(size):
+			pmfs[:, shift:shift + size] += pmfs_a[:, shift:shift + 1] * pmfs_b
+
+		return pmfs
+
+	# FFT product for long factors; rounding can leave tiny negative values.
+	fft_size = scipy_fft.next_fast_len(2 * size - 1, real=True)
+	pmfs = scipy_fft.irfft(scipy_fft.rfft(pmfs_a, fft_size, axis=1) * scipy_fft.rfft(pmfs_b, fft_size, axis=1), fft_size, axis=1)
+
+	return np.maximum(pmfs[:, :2 * size - 1], 0)
+
+# Finds, for every (prob_threshold, stake_value) pair, the smallest committee
+# size in [3, num_clients) whose majority probability is below the threshold,
+# or 0 if there is none.
+#
+# The majority probability decreases with the committee size along odd sizes
+# and along even sizes separately (an even committee needs one extra vote, so
+# the two sequences interleave), so each is searched for all pairs at once and
+# the smaller result wins. The search gallops up from the smallest size before
+# bisecting, so it never probes sizes far above the answer, which are the
+# expensive ones for the stake-weighted model. log_majority_prob(committee_sizes,
+# stake_values) must broadcast over arrays; it is only called for the pairs
+# still being searched.
+
+def searchCommitteeSizes(num_clients, stake_values, prob_thresholds, log_majority_prob):
+
+	stakes, thresholds = np.meshgrid(np.asarray(stake_values, dtype=float), np.asarray(prob_thresholds, dtype=float))
+	log_thresholds = np.log(thresholds)
+
+	committee_sizes = np.zeros(stakes.shape, dtype=int)
+
+	def is_safe(first_size, idx, active):
+		safe = np.zeros(stakes.shape, dtype=bool)
+		safe[active] = log_majority_prob(first_size + 2 * idx[active], stakes[active]) < log_thresholds[active]
+		return safe
+
+	for first_size in (3, 4):
+
+		# Candidate sizes are first_size + 2 * idx for idx in [0, num_sizes).
+		num_sizes = max(0, (num_clients - first_size + 1) // 2)
+
+		lo = np.zeros(stakes.shape, dtype=int)
+		hi = np.full(stakes.shape, num_sizes, dtype=int)
+
+		# Gallop: probe idx 0, 1, 3, 7, ... until a safe size bounds the answer.
+		probe = np.zeros(stakes.shape, dtype=int)
+		galloping = lo < hi
+
+		while np.any(galloping):
+
+			probe = np.minimum(probe, num_sizes - 1)
+			safe = is_safe(first_size, probe, galloping)
+
+			hi = np.where(galloping & safe, probe, hi)
+			lo = np.where(galloping & ~safe, probe + 1, lo)
+
+			galloping = galloping & ~safe & (lo < hi)
+			probe = 2 * probe + 1
+
+		# Bisect: the answer is in [lo, hi], or not found if lo == num_sizes.
+		while np.any(lo < hi):
+
+			active = lo < hi
+			mid = (lo + hi) // 2
+			safe = is_safe(first_size, mid, active)
+
+			hi = np.where(active & safe, mid, hi)
+			lo = np.where(active & ~safe, mid + 1, lo)
+
+		found = lo < num_sizes
+		sizes = first_size + 2 * lo
+
+		better = found & ((committee_sizes == 0) | (sizes < committee_sizes))
+		committee_sizes = np.where(better, sizes, committee_sizes)
+
+	return committee_sizes
+
+def plotStakeVsCommitteeSize(committee_sizes, stake_values, prob_thresholds, finite_committee_sizes=None):
 
 	fig, ax = plt.subplots(figsize=(10, 5))
 	toplot = np.zeros((2, 102))
@@ -74,7 +324,7 @@ def plotStakeVsCommitteeSize(committee_sizes, stake_values, prob_thresholds):
 
 	line_idx = 0
 
-	stake_values = [stake_value * 100 for stake_value in stake_values
+	stake_values = [stake_value * 100 for stake_value in stake_values]
 
 	for prob_threshold in prob_thresholds:
 
@@ -83,6 +333,13 @@ def plotStakeVsCommitteeSize(committee_sizes, stake_values, prob_thresholds):
 		line = mlines.Line2D(stake_values[:len(committee_sizes[line_idx])], committee_sizes[line_idx], color=line_colors[line_idx], linewidth=3, linestyle='-', label=str(prob_thresholds[line_idx]))
 
 		lines.append(line)
+
+		if finite_committee_sizes is not None:
+
+			finite_line = mlines.Line2D(stake_values[:len(finite_committee_sizes[line_idx])], finite_committee_sizes[line_idx], color=line_colors[line_idx], linewidth=3, linestyle='--', label=str(prob_thresholds[line_idx]) + " (finite population)")
+
+			lines.append(finite_line)
+
 		line_idx = line_idx + 1
 
 	for line in lines:
@@ -0,0 +1,188 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+"""Tests for the collusion models in vrf_security.py against enumeration."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import itertools
+import os
+import sys
+
+from absl.testing import absltest
+from absl.testing import parameterized
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import vrf_security  # pylint: disable=g-import-not-at-top
+
+_STAKE_VALUES = [0.1, 0.2, 0.3, 0.4, 0.5]
+_PROB_THRESHOLDS = [0.01, 0.05, 0.2]
+
+
+def _selection_outcomes(select_probs):
+  """Returns every selection of the nodes as rows of 0/1 and its probability."""
+  num_nodes = len(select_probs)
+  selected = (np.arange(2**num_nodes)[:, None] >> np.arange(num_nodes)) & 1
+  probs = np.prod(np.where(selected, select_probs, 1 - select_probs), axis=1)
+  return selected, probs
+
+
+def _brute_force_seat_count_pmf(select_probs):
+  selected, probs = _selection_outcomes(select_probs)
+  return np.bincount(selected.sum(axis=1), weights=probs,
+                     minlength=len(select_probs) + 1)
+
+
+def _brute_force_finite_population_prob(committee_size, num_sybils,
+                                        num_clients):
+  """P(sybils hold a majority) over all committees of distinct clients."""
+  committees = list(itertools.combinations(range(num_clients), committee_size))
+  num_majority = sum(
+      2 * sum(client < num_sybils for client in committee) > committee_size
+      for committee in committees)
+  return num_majority / len(committees)
+
+
+def _brute_force_stake_weighted_prob(committee_size, node_stakes, sybil_mask):
+  select_probs = np.minimum(
+      1.0, committee_size * node_stakes / np.sum(node_stakes))
+  selected, probs = _selection_outcomes(select_probs)
+  num_sybil_seats = selected[:, sybil_mask].sum(axis=1)
+  num_honest_seats = selected[:, ~sybil_mask].sum(axis=1)
+  return np.sum(probs[num_sybil_seats > num_honest_seats])
+
+
+def _brute_force_committee_sizes(num_clients, stake_values, prob_thresholds,
+                                 majority_prob):
+  """The smallest safe committee size in [3, num_clients) of every pair."""
+  committee_sizes = []
+  for prob_threshold in prob_thresholds:
+    row = []
+    for stake_value in stake_values:
+      for committee_size in range(3, num_clients):
+        if majority_prob(committee_size, stake_value) < prob_threshold:
+          row.append(committee_size)
+          break
+    committee_sizes.append(row)
+  return committee_sizes
+
+
+class VrfSecurityTest(parameterized.TestCase):
+
+  def test_hypergeometric_log_majority_prob(self):
+    num_clients = 10
+    for stake_value in [0.2, 0.4, 0.6]:
+      for committee_size in range(3, num_clients):
+        expected = _brute_force_finite_population_prob(
+            committee_size, int(round(stake_value * num_clients)), num_clients)
+        log_prob = vrf_security.hypergeometricLogMajorityProb(
+            committee_size, stake_value, num_clients)
+        self.assertAlmostEqual(np.exp(log_prob), expected)
+
+  def test_finite_population_committee_sizes(self):
+    num_clients = 14
+
+    def majority_prob(committee_size, stake_value):
+      return _brute_force_finite_population_prob(
+          committee_size, int(round(stake_value * num_clients)), num_clients)
+
+    self.assertEqual(
+        vrf_security.finitePopulationCommitteeSizes(
+            num_clients, _STAKE_VALUES, _PROB_THRESHOLDS),
+        _brute_force_committee_sizes(num_clients, _STAKE_VALUES,
+                                     _PROB_THRESHOLDS, majority_prob))
+
+  @parameterized.named_parameters(
+      # Few distinct probabilities take the exact binomial path, many the
+      # product tree; 0 and 1 are left out of both.
+      ('stake_levels', [0., 0.3, 0.3, 0.3, 0.7, 0.7, 1., 1., 0.5, 0.5]),
+      ('distinct', np.linspace(0.02, 0.98, 17).tolist() + [0., 1.]))
+  def test_seat_count_pmf(self, select_probs):
+    select_probs = np.array(select_probs)
+    expected = _brute_force_seat_count_pmf(select_probs)
+    pmf = vrf_security.seatCountPmf(select_probs)
+    self.assertLessEqual(len(pmf), len(expected))
+    self.assertSequenceAlmostEqual(pmf, expected[:len(pmf)], places=12)
+    self.assertAlmostEqual(np.sum(expected[len(pmf):]), 0.)
+
+  def test_poisson_binomial_pmf_support(self):
+    probs = np.linspace(0.01, 0.2, 40)
+    pmf = vrf_security.poissonBinomialPmf(probs)
+    truncated = vrf_security.poissonBinomialPmf(probs, 10)
+    self.assertLen(pmf, 41)
+    self.assertSequenceAlmostEqual(truncated, pmf[:11], places=14)
+
+  def test_stake_weighted_log_majority_probs(self):
+    rng = np.random.default_rng(0)
+    node_stakes = np.sort(1. + rng.pareto(1.5, 12))
+    num_sybils = [vrf_security.getNumSybils(node_stakes, stake_value)
+                  for stake_value in _STAKE_VALUES]
+    for committee_size in [3, 4, 7, 11]:
+      log_probs = vrf_security.stakeWeightedLogMajorityProbs(
+          committee_size, node_stakes, num_sybils)
+      for stake_value, log_prob in zip(_STAKE_VALUES, log_probs):
+        sybil_mask = vrf_security.getSybilMask(node_stakes, stake_value)
+        expected = _brute_force_stake_weighted_prob(committee_size,
+                                                    node_stakes, sybil_mask)
+        self.assertAlmostEqual(np.exp(log_prob), expected, places=12)
+        self.assertAlmostEqual(
+            vrf_security.stakeWeightedLogMajorityProb(committee_size,
+                                                      node_stakes, sybil_mask),
+            log_prob)
+
+  def test_sybils_hold_the_stake_share(self):
+    node_stakes = np.array([5., 1., 3., 1.])
+    self.assertEqual(
+        vrf_security.getSybilMask(node_stakes, 0.2).tolist(),
+        [False, True, False, True])
+    self.assertEqual(vrf_security.getNumSybils(np.sort(node_stakes), 0.), 0)
+    self.assertEqual(vrf_security.getNumSybils(np.sort(node_stakes), 1.), 4)
+
+  @parameterized.named_parameters(
+      ('uniform', np.ones(14)),
+      ('stake_levels', np.array([1.] * 8 + [2.] * 4 + [4.] * 2)))
+  def test_stake_weighted_committee_sizes(self, node_stakes):
+    num_clients = len(node_stakes)
+
+    def majority_prob(committee_size, stake_value):
+      return _brute_force_stake_weighted_prob(
+          committee_size, node_stakes,
+          vrf_security.getSybilMask(node_stakes, stake_value))
+
+    self.assertEqual(
+        vrf_security.stakeWeightedCommitteeSizes(node_stakes, _STAKE_VALUES,
+                                                 _PROB_THRESHOLDS),
+        _brute_force_committee_sizes(num_clients, _STAKE_VALUES,
+                                     _PROB_THRESHOLDS, majority_prob))
+
+  def test_search_finds_size_below_a_rise(self):
+    # Safe only at sizes 5 to 8: bisecting the whole range would probe the
+    # unsafe large sizes first and miss them.
+    def log_majority_prob(committee_sizes, stakes):
+      del stakes  # Every stake has the same profile.
+      return np.where((committee_sizes >= 5) & (committee_sizes <= 8),
+                      np.log(0.001), 0.)
+
+    self.assertEqual(
+        vrf_security.searchCommitteeSizes(1000, [0.1], [0.01],
+                                          log_majority_prob).tolist(),
+        [[5]])
+
+
+if __name__ == '__main__':
+  absltest.main()